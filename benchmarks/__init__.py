@@ -0,0 +1,12 @@
+# Benchmarks for the conversion core, kept out of the emco package so they
+#   aren't installed with the application. Run from the repository root, e.g.
+#   python -m benchmarks.bench_pipeline
+# Lets them import the emco package from src without installing it
+import os
+import sys
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCHMARKS)
+SRC = os.path.join(ROOT, 'src')
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
@@ -0,0 +1,84 @@
+# Benchmark for inserting blocks into long programs
+# Usage: python -m benchmarks.bench_blocks [--sizes 1000 5000 20000] [--inserts 10]
+# Times the structured editor (parseProgram, Program.edit, render) against the
+#   old line by line renumbering that rebuilt the whole text after every line
+import argparse
+import random
+import sys
+import time
+from emco.blocks import Program, Block, MCODE, parseProgram, COLUMN_HEADER
+
+# Roughing style program of about count blocks: passes calling one subroutine
+def syntheticProgram(count):
+    program = Program()
+    program.text('%\n')
+    program.text(COLUMN_HEADER)
+    passes = max(count // 8, 1)
+    for i in range(passes):
+        program.motion(1, -(i + 1) * 50, 0, 100)
+        program.call('profile')
+        program.motion(0, (i + 1) * 50, 0)
+        program.motion(0, 0, 3000)
+    program.mcode(30)
+    program.label('profile')
+    while program.blockNum < count - 1:
+        program.motion(1, -10, -20, 100)
+    program.mcode(17)
+    program.text('   M\n')
+    return program
+
+# The editor's old insertion, kept to compare against. The text is joined once
+#   per line the way it was set back into the editor inside the loop
+def legacyInsert(text, currentBlock, code):
+    text_to_insert = f"    {currentBlock:02d}  {code}"
+    updated_lines = []
+    block_number = 0
+    for line in text.split('\n'):
+        if line.strip().startswith(("M", "%", "N")) or line == "":
+            updated_lines.append(line)
+        elif int(line[:6]) == currentBlock:
+            updated_lines.append(text_to_insert)
+            block_number += 1
+            updated_lines.append(f"    {block_number:02d}{line[6:]}")
+            block_number += 1
+        else:
+            updated_lines.append(f"    {block_number:02d}{line[6:]}")
+            block_number += 1
+        updated_text = '\n'.join(updated_lines)
+    return updated_text
+
+def structuredInsert(text, numbers):
+    program = parseProgram(text)
+    index = program.indexByNumber()
+    program.edit(insert={index[number]: [Block(MCODE, 0)] for number in numbers})
+    return program.render()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench_blocks')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000, 20000])
+    parser.add_argument('--inserts', type=int, default=10, help='blocks inserted per edit')
+    parser.add_argument('--legacy-limit', type=int, default=20000, help='largest size to time the old editor on')
+    args = parser.parse_args(argv)
+
+    rng = random.Random(1)
+    print(f"{'blocks':>8} {'edit ms':>9} {'per insert':>11} {'legacy ms':>10} {'per insert':>11}")
+    for size in args.sizes:
+        text = syntheticProgram(size).render()
+        numbers = rng.sample(range(1, size - 1), min(args.inserts, size - 2))
+
+        start = time.perf_counter()
+        structuredInsert(text, numbers)
+        elapsed = time.perf_counter() - start
+
+        legacy = ''
+        if size <= args.legacy_limit:
+            # One insert per pass, the old editor had no batching
+            start = time.perf_counter()
+            legacyInsert(text, numbers[0], 'M00')
+            legacy_elapsed = time.perf_counter() - start
+            legacy = f'{legacy_elapsed*1000:>10.1f} {legacy_elapsed*1000:>8.1f} ms'
+        print(f'{size:>8} {elapsed*1000:>9.1f} {elapsed*1000/len(numbers):>8.2f} ms {legacy}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
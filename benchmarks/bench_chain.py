@@ -0,0 +1,46 @@
+# Scaling benchmark for sortParsedData / chainSegments
+# Usage: python -m benchmarks.bench_chain [--sizes 100 1000 10000 100000]
+# Builds a tessellated style profile of n short lines with endpoint noise,
+#   random reversals and shuffled order, then times chaining it
+import argparse
+import math
+import random
+import sys
+import time
+from emco.chain import chainSegments, reverseSegment
+
+# n line segments stepping left from X0 along a wavy profile, like a spline export
+def syntheticProfile(count, noise=0.002, seed=1):
+    rng = random.Random(seed)
+    points = [(-i * 0.05, 10.0 + 2.0 * math.sin(i * 0.01)) for i in range(count + 1)]
+    segments = []
+    for i in range(count):
+        start = points[i]
+        end = (points[i + 1][0] + rng.uniform(-noise, noise), points[i + 1][1] + rng.uniform(-noise, noise))
+        segment = {'type': 'LINE', 'start_point': start, 'end_point': end}
+        if i and rng.random() < 0.3:
+            segment = reverseSegment(segment)
+        segments.append(segment)
+    rng.shuffle(segments)
+    return segments
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench_chain')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000, 100000])
+    parser.add_argument('--tolerance', type=float, default=0.01)
+    args = parser.parse_args(argv)
+
+    print(f"{'segments':>10} {'ms':>10} {'us/segment':>11} {'reversed':>9} warnings")
+    for size in args.sizes:
+        segments = syntheticProfile(size)
+        start = time.perf_counter()
+        result = chainSegments(segments, args.tolerance)
+        elapsed = time.perf_counter() - start
+        print(f'{size:>10} {elapsed*1000:>10.1f} {elapsed*1e6/size:>11.2f} {result.reversed_count:>9} '
+              f'{len(result.warnings())}')
+        if len(result.segments) != size:
+            print(f'  chained only {len(result.segments)} of {size} segments')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
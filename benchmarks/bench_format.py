@@ -0,0 +1,102 @@
+# Microbenchmark for GCode block formatting
+# Usage: python -m benchmarks.bench_format [--sizes 1000 10000 100000]
+# Times the table driven Program.write and the column formatter formatMoves
+#   against formatting every block with blockNumPad / formatMove / formatFeed,
+#   and checks all three agree byte for byte, then checks the golden files in
+#   tests/Test Output Gcode still come out the same
+import argparse
+import os
+import random
+import sys
+import time
+import numpy as np
+from emco.blocks import Program, MOTION, blockNumPad, formatMove, formatFeed, formatMoves
+
+# Profile like program of count motion blocks with repeating moves and feeds
+def syntheticProgram(count, seed=1):
+    rng = random.Random(seed)
+    program = Program()
+    steps = [rng.randint(-400, 400) for _ in range(200)]
+    for i in range(count):
+        opcode = rng.choice((0, 1, 1, 1, 2, 3))
+        feed = None if opcode == 0 else rng.choice((100, 100, 10))
+        program.motion(opcode, rng.choice(steps), rng.choice(steps) * 10, feed)
+    return program
+
+# One format call per block, the way blocks used to be written
+def perBlockFormat(program):
+    lines = []
+    for block in program.blocks:
+        if block.kind != MOTION:
+            continue
+        line = f'{blockNumPad(block.number, 1)}{formatMove(block.x, block.z, f"G{block.opcode:02}")}'
+        if block.feed is not None:
+            line += formatFeed(block.feed)
+        lines.append(line + '\n')
+    return ''.join(lines)
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+# Checks that the golden programs still come out byte for byte
+def checkGolden():
+    from emco.core import parse_dxf_file, generate_gcode_from_dxf
+    tests = os.path.join(os.path.dirname(__file__), '..', 'tests')
+    golden = {
+        'testLinear': ('testLinear.dxf', (50, 100, 10, 10, 2)),
+        'testSubStepover': ('testLinear.dxf', (50, 100, 10, 10, 2)),
+        'testSubFullDepth': ('testLinear.dxf', (50, 100, 0, 2, 0)),
+        'testNegDXF': ('testNegDXF.dxf', (50, 100, 10, 2, 2)),
+        'testVerticalLines1': ('testVerticalLines1.dxf', (50, 100, 10, 10, 2)),
+        'testVerticalLines2': ('testVerticalLines2.dxf', (50, 100, 10, 10, 2)),
+        'testg02hemisphere': ('testg02hemishpere.dxf', (50, 100, 10, 10, 2)),
+        'testg03hemisphere': ('testg03Ghemishpere.dxf', (50, 100, 10, 10, 2)),
+    }
+    failed = []
+    for name, (dxf, params) in golden.items():
+        dxf_path = os.path.join(tests, 'Test DXF files', dxf)
+        golden_path = os.path.join(tests, 'Test Output Gcode', name + '.cnc')
+        if not os.path.isfile(dxf_path) or not os.path.isfile(golden_path):
+            continue
+        with open(golden_path) as f:
+            expected = f.read()
+        if ''.join(generate_gcode_from_dxf(parse_dxf_file(dxf_path), 0, 0, 0, 0, *params)) != expected:
+            failed.append(name)
+    return failed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench_format')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    args = parser.parse_args(argv)
+
+    print(f"{'blocks':>8} {'per block ms':>13} {'write ms':>9} {'columns ms':>11} {'speedup':>8}")
+    for size in args.sizes:
+        program = syntheticProgram(size)
+        expected, per_block = timed(perBlockFormat, program)
+        written, write_time = timed(program.render)
+
+        blocks = program.blocks
+        numbers = np.array([block.number for block in blocks])
+        opcodes = np.array([block.opcode for block in blocks])
+        xs = np.array([block.x for block in blocks])
+        zs = np.array([block.z for block in blocks])
+        feeds = [block.feed for block in blocks]
+        columns, column_time = timed(lambda: ''.join(formatMoves(numbers, opcodes, xs, zs, feeds)))
+
+        if written != expected or columns != expected:
+            print(f'{size:>8} formatter output differs from per block formatting')
+            return 1
+        print(f'{size:>8} {per_block*1000:>13.1f} {write_time*1000:>9.1f} {column_time*1000:>11.1f} '
+              f'{per_block/write_time:>7.1f}x')
+
+    failed = checkGolden()
+    if failed:
+        print(f'golden files differ: {", ".join(failed)}')
+        return 1
+    print('golden files match')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+# Compares the full document reader against the streaming reader
+# Usage: python -m benchmarks.bench_parse [--pad N] <dxf files>
+#   --pad N writes a copy of each file with N extra title block style entities
+#   (text, dimensions lines on other layers, circles) to simulate CAD exports
+# Each reader runs in a fresh process so peak memory isn't shared between runs
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+READERS = ('parse_dxf_file', 'parse_dxf_file_streaming')
+
+# Runs one reader and reports time, Python peak memory and OS peak RSS
+#   timing and tracemalloc use separate runs since tracing slows parsing down
+def measure(reader, file_path):
+    from emco import core
+    start = time.perf_counter()
+    entities = getattr(core, reader)(file_path)
+    elapsed = time.perf_counter() - start
+    rss = None
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == 'darwin':
+            rss //= 1024
+    except ImportError:
+        pass
+    tracemalloc.start()
+    getattr(core, reader)(file_path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'reader': reader, 'seconds': elapsed, 'peak_kb': peak // 1024, 'rss_kb': rss, 'entities': len(entities)}
+
+# Writes a padded copy of file_path with count extra non profile entities
+def padFile(file_path, count, out_dir):
+    import ezdxf
+    doc = ezdxf.readfile(file_path)
+    msp = doc.modelspace()
+    doc.layers.add('TITLE')
+    for i in range(count):
+        x = (i % 100) * 5.0
+        y = 500.0 + (i // 100) * 5.0
+        msp.add_text(f'NOTE {i}', dxfattribs={'layer': 'TITLE', 'insert': (x, y), 'height': 2.5})
+        msp.add_circle((x, y), 1.0, dxfattribs={'layer': 'TITLE'})
+        msp.add_point((x, y), dxfattribs={'layer': 'TITLE'})
+    padded_path = os.path.join(out_dir, f'padded_{count}_' + os.path.basename(file_path))
+    doc.saveas(padded_path)
+    return padded_path
+
+def runChild(reader, file_path):
+    output = subprocess.check_output([sys.executable, '-m', 'benchmarks.bench_parse', '--child', reader, file_path],
+                                     cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return json.loads(output)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench_parse')
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--pad', type=int, default=0, help='add this many filler entity groups to each file')
+    parser.add_argument('--child', choices=READERS, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.files[0])))
+        return 0
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for file_path in args.files:
+            if args.pad:
+                file_path = padFile(file_path, args.pad, temp_dir)
+            size_mb = os.path.getsize(file_path) / 1e6
+            print(f'{os.path.basename(file_path)} ({size_mb:.2f} MB)')
+            for reader in READERS:
+                r = runChild(reader, file_path)
+                rss = f"{r['rss_kb'] / 1024:.1f} MB" if r['rss_kb'] else 'n/a'
+                print(f"  {reader:26} {r['seconds']*1000:9.1f} ms  peak {r['peak_kb'] / 1024:7.1f} MB"
+                      f"  rss {rss:>9}  {r['entities']} entities")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
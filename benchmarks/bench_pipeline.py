@@ -0,0 +1,63 @@
+# Scaling benchmark for the parse -> sort -> generate -> render pipeline
+# Usage: python -m benchmarks.bench_pipeline [--sizes 10 100 1000 10000 100000] [--repeat 3]
+#          [--arcs 0.3] [--noise 0.002] [--clutter 0]
+# Writes an emco.synthetic profile DXF of each size, runs every stage on it and
+#   prints the best of --repeat runs per stage, so a slower release shows up
+#   as a jump in one column
+import argparse
+import os
+import sys
+import tempfile
+import time
+from emco.core import parse_dxf_file, sortParsedData, generate_program_from_dxf
+from emco.synthetic import writeProfileDxf
+
+STAGES = ('parse', 'sort', 'generate', 'render')
+# Stock and feeds the profiles are generated with, the golden file settings
+PARAMS = (50, 100, 10, 10, 2)
+
+# Runs each stage once on file_path, returns {stage: seconds}
+def runStages(file_path):
+    times = {}
+    start = time.perf_counter()
+    entities = parse_dxf_file(file_path)
+    times['parse'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    sortParsedData(entities)
+    times['sort'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    program = generate_program_from_dxf(entities, 0, 0, 0, 0, *PARAMS)
+    times['generate'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    program.render()
+    times['render'] = time.perf_counter() - start
+    return times
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench_pipeline')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--arcs', type=float, default=0.3, help='share of segments that are arcs')
+    parser.add_argument('--noise', type=float, default=0.002, help='endpoint noise (mm)')
+    parser.add_argument('--clutter', type=int, default=0, help='extra non profile entities per file')
+    args = parser.parse_args(argv)
+
+    print(f"{'segments':>9}" + ''.join(f'{stage + " ms":>12}' for stage in STAGES) + f"{'us/segment':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            file_path = os.path.join(tmp, f'synthetic_{size}.dxf')
+            writeProfileDxf(file_path, size, arcs=args.arcs, noise=args.noise, clutter=args.clutter)
+            best = {}
+            for _ in range(max(1, args.repeat)):
+                for stage, seconds in runStages(file_path).items():
+                    best[stage] = min(best.get(stage, seconds), seconds)
+            total = sum(best.values())
+            print(f'{size:>9}' + ''.join(f'{best[stage]*1000:>12.1f}' for stage in STAGES) +
+                  f'{total*1e6/size:>12.1f}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,514 +1,163 @@
 # Required imports
 import sys
-from PyQt5.QtWidgets import QApplication, QWidget, QPushButton, QFileDialog, QVBoxLayout, QGraphicsView, QMainWindow, QGraphicsScene, QTextBrowser, QScrollArea, QLineEdit, QLabel, QHBoxLayout, QGridLayout, QCheckBox, QTextEdit, QMessageBox, QGraphicsPathItem
-from PyQt5.QtGui import QPen, QColor, QPainterPath
-from PyQt5.QtCore import Qt, QRectF
-import ezdxf
+from PyQt5.QtWidgets import QApplication, QWidget, QPushButton, QFileDialog, QVBoxLayout, QGraphicsView, QMainWindow, QGraphicsScene, QTextBrowser, QPlainTextEdit, QLineEdit, QLabel, QHBoxLayout, QGridLayout, QCheckBox, QMessageBox, QComboBox, QGraphicsItem, QStyleOptionGraphicsItem, QProgressBar, QListWidget, QListWidgetItem
+from PyQt5.QtGui import QPen, QColor, QPainterPath, QSyntaxHighlighter, QTextCharFormat, QTextCursor, QFont
+from PyQt5.QtCore import Qt, QRectF, QLineF, QObject, pyqtSignal
 import os
-import qdarktheme
-import numpy as np
-import decimal
 import math
-
-# Parses input file to extract entities relative to gcode
-def parse_dxf_file(file_path):
-    # Set the precision (number of decimal places)
-    decimal.getcontext().prec = 2  # Change this to your desired precision
-
-    # Set the rounding mode (optional, default is ROUND_HALF_EVEN)
-    decimal.getcontext().rounding = decimal.ROUND_HALF_UP
-    
-    parsed_data = []
-    doc = ezdxf.readfile(file_path)
-    for entity in doc.modelspace():
-        if entity.dxftype() == 'LINE':
-            start_point = entity.dxf.start
-            end_point = entity.dxf.end
-            parsed_data.append({
-                'type': 'LINE',
-                'start_point': (round(start_point.x,2), round(start_point.y,2)),
-                'end_point': (round(end_point.x,2), round(end_point.y,2))
-            })
-        elif entity.dxftype() == 'ARC':
-            center = entity.dxf.center
-            radius = entity.dxf.radius
-            start_angle = entity.dxf.start_angle
-            end_angle = entity.dxf.end_angle
-            
-            # Calculate the start and end points
-            start_angle_rad = math.radians(start_angle)
-            end_angle_rad = math.radians(end_angle)
-            start_x = center.x + radius * math.cos(start_angle_rad)
-            start_y = center.y + radius * math.sin(start_angle_rad)
-
-            end_x = center.x + radius * math.cos(end_angle_rad)
-            end_y = center.y + radius * math.sin(end_angle_rad)
-            
-            # Calculate arc direction for g02 g03
-            # Calculate the angular difference between the start and end angles
-            angle_difference = end_angle - start_angle
-            direction = ""
-
-            # Determine the direction based on the angle difference
-            if angle_difference > 0:
-                direction =  "cw"  # Positive angle difference indicates counterclockwise
-            else:
-                direction =  "ccw"  # Negative angle difference indicates clockwise
-    
-            
-            # Ensure start and end points are in order
-            start_point = (round(start_x,2), round(start_y,2))
-            end_point = (round(end_x,2), round(end_y,2))
-            if round(start_x,2) < round(end_x,2):
-                temp = start_point
-                start_point = end_point
-                end_point = temp
-                if direction == "cw":
-                    direction = "ccw"
-                else:
-                    direction = "cw"
-                
-            parsed_data.append({
-                    'type': 'ARC',
-                    'center_point': (round(center.x,2), round(center.y,2)),
-                    'radius': round(radius,2),
-                    'start_angle': round(start_angle,2),
-                    'end_angle': round(end_angle,2),
-                    'start_point': start_point,
-                    'end_point': end_point,
-                    'direction': direction
-                })
-        elif entity.dxftype() == 'LWPOLYLINE':
-            polyline_data = []
-            for vertex in entity.points():
-                polyline_data.append((round(vertex.x,2)), round(vertex.y,2))
-            parsed_data.append({
-                'type': 'POLYLINE',
-                'vertices': polyline_data
-            })
-
-    return parsed_data
-
-# block num space padding logic
-def blockNumPad(blockNum, GcodeTrue):
-    blockNumStr = ""
-    if blockNum < 10:
-        blockNumStr = "    0" + str(blockNum)
-    elif blockNum < 100:
-        blockNumStr = "    " + str(blockNum)
-    else:
-        blockNumStr = "   " + str(blockNum)
-        
-    if GcodeTrue:
-        blockNumStr = blockNumStr + " "
-    return blockNumStr
-
-# Adjusts x coordinate based on stock radius, Lathe Z axis in implementation
-def compX(xcoordinate, stockRadius):
-    return xcoordinate - stockRadius
-
-# returns a formated G01 command
-def formatG00G01G02G03(xcord, ycord, gcodeType):
-    # Set the precision (number of decimal places)
-    decimal.getcontext().prec = 2  # Change this to your desired precision
-
-    # Set the rounding mode (optional, default is ROUND_HALF_EVEN)
-    decimal.getcontext().rounding = decimal.ROUND_HALF_UP
-    
-    # Both coordinates are negative
-    if xcord < 0 and ycord < 0:
-        return f'{gcodeType[1:]} -{abs(int(xcord*100)):04} -{abs(int(ycord*100)):05}'
-    # Only X neg
-    elif xcord < 0 and ycord >= 0:
-        return f'{gcodeType[1:]} -{abs(int(xcord*100)):04}  {abs(int(ycord*100)):05}'
-    # Only y neg    
-    elif xcord >= 0 and ycord < 0:
-        return f'{gcodeType[1:]}  {abs(int(xcord*100)):04} -{abs(int(ycord*100)):05}'
-    # Both positive
-    elif xcord >= 0 and ycord >=0:
-        return f'{gcodeType[1:]}  {abs(int(xcord*100)):04}  {abs(int(ycord*100)):05}'
-
-        
-# Formats feedrate for gcode output
-def formatFeed(feedrate):
-    return f' {feedrate:03}'
-    
-# Sorts data being parsed from DXF so lines are in consecutive order
-# Lines are in order starting from Z0 which should be where the 
-#   start of the cut occurs
-def sortParsedData(parsed_data):
-    # Create a dictionary to map each endpoint to its corresponding line
-    endpoint_to_line = {(line['start_point'][0], line['start_point'][1]): line for line in parsed_data}
-
-    # Find the starting point (0)
-    first_line = None
-    for line in parsed_data:
-        if line['start_point'][0] == 0:
-            first_line = line
-            break
-
-    # Initialize the sorted list with the first line
-    sorted_lines = [first_line]
-    endpoint = first_line['end_point']
-
-    # Continue to find and add consecutive lines
-    while True:
-        next_line = endpoint_to_line.get(endpoint)
-        if next_line is None:
-            break
-        sorted_lines.append(next_line)
-        endpoint = next_line['end_point']
-        
-    return sorted_lines
-
-# FLips a DXF file over the x azis (machine z) so that you can draw in the 
-#   positive or negative y axis
-def flipDXFOverX(parsed_data):
-    if parsed_data[0]['start_point'][1] < 0 :
-        for item in parsed_data:
-            # flip start point y
-            if 'start_point' in item:
-                item['start_point'] = (item['start_point'][0], abs(item['start_point'][1]))
-
-            # flip end point y 
-            if 'end_point' in item:
-                item['end_point'] = (item['end_point'][0], abs(item['end_point'][1]))
-
-            # flip center point if arc
-            if 'center_point' in item:
-                item['center_point'] = (item['center_point'][0],abs(item['center_point'][1]))
-                
-#             # change start angle if arc
-#             if 'start_angle' in item:
-#                 # do nothing?
-                
-#             # change end angle if arc
-#             if 'end_angle' in item:
-#                 # do nothing?
-                
-            # change direction if arc
-            if 'direction' in item:
-                if item['direction'] == "cw":
-                    item['direction'] = "ccw"
-                else:
-                    item['direction'] = "cw"
-                    
-    return parsed_data
-
-# Adds final blocks to gcode. Included M30, M5
-def addFinishingBlocks(gcode, blockNum, isUseM3M5Checked):
-    # ending blocks
-    if isUseM3M5Checked:
-        gcode.append(f'{blockNumPad(blockNum, 0)}M05\n')
-        blockNum +=1
-
-    # File end
-    gcode.append(f'{blockNumPad(blockNum, 0)}M30\n')
-    blockNum += 1
-    return gcode, blockNum
-
-# Adds starting bocks. Includes retract, M3
-def addStartingBlocks(gcode, blockNum, isUseM3M5Checked, isStartRetractXChecked, isStartRetractZChecked, isStartRetractXZChecked):
-    # Check if using m3/m5
-    def usingM3M5(blockNum):
-        if isUseM3M5Checked:
-            gcode.append(f'{blockNumPad(blockNum, 0)}M03\n')
-            blockNum +=1
-        return blockNum
-    
-    # Check stating retracts
-    if isStartRetractXChecked:
-        # The "Retract before start in X" checkbox is checked
-        gcode.append(f'{blockNumPad(blockNum, 1)}{formatG00G01G02G03(.50, 0, "G00")}\n')
-        blockNum += 1
-        blockNum = usingM3M5(blockNum)
-        gcode.append(f'{blockNumPad(blockNum, 1)}{formatG00G01G02G03(-.50, 0, "G00")}\n')
-        blockNum += 1
-    elif isStartRetractZChecked:
-        # The "Retract bblockNumefore start in Z" checkbox is checked
-        gcode.append(f'{blockNumPad(blockNum, 1)}{formatG00G01G02G03(0, .50, "G00")}\n')
-        blockNum += 1
-        blockNum = usingM3M5(blockNum)
-        gcode.append(f'{blockNumPad(blockNum, 1)}{formatG00G01G02G03(0, -.50, "G00")}\n')
-        blockNum += 1
-    elif isStartRetractXZChecked:
-        # The "ReblockNumtract before start in X and Z" checkbox is checked
-        gcode.append(f'{blockNumPad(blockNum, 1)}{formatG00G01G02G03(.50, .50, "G00")}\n')
-        blockNum += 1
-        blockNum = usingM3M5(blockNum)
-        gcode.append(f'{blockNumPad(blockNum, 1)}{formatG00G01G02G03(-.50, -.50, "G00")}\n')
-        blockNum += 1
-    else:
-        blockNum = usingM3M5(blockNum)
-        
-    return gcode, blockNum
-
-# Returns the smallest y value of the parsed data. Machine X axis
-def find_smallest_y(parsed_data):
-    # Initialize with a large value to ensure any Y coordinate is smaller
-    smallest_y = float('inf')
-
-    for entity in parsed_data:
-        if 'start_point' in entity:
-            smallest_y = min(smallest_y, entity['start_point'][1])
-        if 'end_point' in entity:
-            smallest_y = min(smallest_y, entity['end_point'][1])
-        # Add similar checks for other entity types, e.g., 'center_point' for arcs
-
-    return smallest_y
-
-# Adds final blocks to gcode. Included retract, M30, M5
-def addRetract(gcode, blockNum, current_x, current_y):
-    # final retract to beginning of cut
-    toAppend = (f'{blockNumPad(blockNum, 1)}{formatG00G01G02G03(-current_x, 0, "G00")}\n')
-    gcode.append(toAppend)
-    blockNum += 1
-    toAppend = (f'{blockNumPad(blockNum, 1)}{formatG00G01G02G03(0, -current_y, "G00")}\n')
-    gcode.append(toAppend)
-    blockNum += 1
-    return gcode, blockNum
-
-# Adds the block num to roughing subroutine calls
-def addSubStartBlock(gcode, sub_start_num):
-    modified_gcode_lines = []
-    for line in gcode:
-        if "25+blockNumRough" in line:
-            # Replace "G25" with "G25 BlockNum"
-            modified_line = line.replace("25+blockNumRough", f"25             L{sub_start_num:03}")
-            modified_gcode_lines.append(modified_line)
+# Only the conversion core, ezdxf is loaded on the worker once the window is up
+from emco.core import calculate_drawing_extents, loadDXFReader, MAX_BLOCKS
+from emco.pipeline import Pipeline
+from emco.passplan import STRATEGIES
+from emco.blocks import Block, MCODE, G21, parseProgram, splitProgramText, blockSpans, changedLines
+from emco.profiling import default_profiler, timedStage
+from emco.preview import PREVIEW_SIZE, previewScale, previewSegments, decimateSegments, sceneBounds, toolpathOverlay, ROUGH, FINISH
+from emco.roughing import arcSweep
+from emco.simulate import runPrograms
+from emco.worker import JobRunner, DONE, CANCELLED, FAILED
+
+# Zoom (pixels per scene unit) from which the preview draws exact arcs
+#   instead of a decimated set of chords
+FULL_DETAIL_LOD = 4
+
+# Line segments from emco.preview as one item. Zoomed out it draws them
+#   snapped to a grid of about a pixel, zoomed in all of them. Lines are only
+#   built for the zoom levels that get painted and kept, so adding an item is
+#   cheap and a hidden one never costs anything
+class SegmentItem(QGraphicsItem):
+
+    def __init__(self, segments, pen, bounds=None, parent=None):
+        super().__init__(parent)
+        self.segments = segments
+        self.pen = pen
+        # Scene rectangle of the segments, so Qt never has to measure them.
+        #   Padded so flat drawings still have an area
+        if bounds is None and len(segments):
+            xs = segments[:, 0::2]
+            ys = segments[:, 1::2]
+            bounds = QRectF(xs.min(), ys.min(), xs.max() - xs.min(), ys.max() - ys.min())
+        self.bounds = (bounds or QRectF()).adjusted(-1, -1, 1, 1)
+        # Grid level -> list of QLineF, the grid is 2**level scene units. None
+        #   holds every segment
+        self.levels = {}
+
+    def boundingRect(self):
+        return self.bounds
+
+    def paint(self, painter, option, widget=None):
+        painter.setPen(self.pen)
+        painter.drawLines(self.linesForLevel(self.levelFor(painter)))
+
+    # Grid level with a cell of at most one pixel at the painter's zoom, None
+    #   once zoomed in past FULL_DETAIL_LOD
+    def levelFor(self, painter):
+        lod = max(QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform()), 1e-6)
+        if lod >= FULL_DETAIL_LOD:
+            return None
+        return math.floor(-math.log2(lod))
+
+    def linesForLevel(self, level):
+        lines = self.levels.get(level)
+        if lines is None:
+            rows = self.segments if level is None else decimateSegments(self.segments, 2.0 ** level)
+            lines = self.levels[level] = [QLineF(*row) for row in rows.tolist()]
+        return lines
+
+# Whole drawing as one item, drawn like a SegmentItem except zoomed in, where
+#   it draws one path with the exact lines and arcs
+class ProfileItem(SegmentItem):
+
+    def __init__(self, entities, scale, pen, bounds, segments=None):
+        # Segments from previewSegments, when the worker already made them
+        super().__init__(previewSegments(entities, scale) if segments is None else segments, pen, bounds)
+        self.entities = entities
+        self.scale_factor = scale
+        self.full_path = None
+
+    def paint(self, painter, option, widget=None):
+        painter.setPen(self.pen)
+        level = self.levelFor(painter)
+        if level is None:
+            painter.drawPath(self.fullPath())
         else:
-            modified_gcode_lines.append(line)
-    return modified_gcode_lines
-
-# Creates toolpath gcode calls
-def createToolpath(gcode, parsed_data, blockNum, current_x, current_y, stockRadius, roughFeed, finishFeed, isRoughing):
-    # generate subroutine gcode blocks
-    if isRoughing == 0:
-        roughFeed = finishFeed
-        
-    for entity in parsed_data:
-        toAppend = ""
-        isArc = 0
-        if entity['type'] == 'LINE':
-            end_x, end_y = entity['end_point']
-            gotoX = compX(end_y, stockRadius) - current_x
-            current_x = compX(end_y, stockRadius)   
-            gotoY = end_x - current_y
-            current_y = end_x
-            gcodeToAdd = (f'{formatG00G01G02G03(gotoX, gotoY, "G01")}{formatFeed(roughFeed)}')
-        elif entity['type'] == 'ARC':
-            center_x, center_y = entity['center_point']
-            radius = entity['radius']
-            start_angle = entity['start_angle']
-            end_angle = entity['end_angle']
-            start_x, start_y = entity['start_point']
-            direction = entity['direction']
-
-            if direction == "ccw":
-                # First line with M03: Include end point relative to the center
-                end_x, end_y = entity['end_point']
-                gotoX = compX(end_y, stockRadius) - current_x
-                current_x = compX(end_y, stockRadius)   
-                gotoY = end_x - current_y
-                current_y = end_x
-                gcodeToAdd = (f'{formatG00G01G02G03(gotoX, gotoY, "G02")}{formatFeed(roughFeed)}\n')
-            else:
-                # First line with M02: Include end point relative to the center
+            painter.drawLines(self.linesForLevel(level))
+
+    # Exact drawing, built the first time the view is zoomed in far enough
+    def fullPath(self):
+        if self.full_path is not None:
+            return self.full_path
+        scale = self.scale_factor
+        path = QPainterPath()
+        for entity in self.entities:
+            if entity['type'] == 'LINE':
+                start_x, start_y = entity['start_point']
                 end_x, end_y = entity['end_point']
-                gotoX = compX(end_y, stockRadius) - current_x
-                current_x = compX(end_y, stockRadius)   
-                gotoY = end_x - current_y
-                current_y = end_x
-                gcodeToAdd = (f'{formatG00G01G02G03(gotoX, gotoY, "G03")}{formatFeed(roughFeed)}\n')
-
-            # Calculate the relative distance to the center
-            relative_x = end_x - center_x
-            relative_y = end_y - center_y
-
-            # Second line with M99: Include relative distance to the center
-            gcodeToAdd = (f'{gcodeToAdd}{blockNumPad(blockNum+1, 0)}M99 I{abs(int(relative_x*100)):04} K{abs(int(relative_y*100)):05}')
-            isArc = 1
-        elif entity['type'] == 'POLYLINE':
-            vertices = entity['vertices']
-            for vertex in vertices:
-                end_x = vertex[0]
-                end_y = vertex[1]
-                gotoX = compX(end_y, stockRadius) - current_x
-                current_x = compX(end_y, stockRadius)   
-                gotoY = end_x - current_y
-                current_y = end_x
-                gcodeToAdd = (f'{formatG00G01G02G03(gotoX, gotoY, "G01")}{formatFeed(roughFeed)}')
-
-        # append to output
-        toAppend = blockNumPad(blockNum, 1) + gcodeToAdd + "\n"
-        gcode.append(toAppend)
-        if isArc:
-            blockNum += 2
-        else:
-            blockNum += 1
-            
-    # Insert final M17 sub return
-    if isRoughing:
-        gcode.append(f'{blockNumPad(blockNum, 0)}M17\n')
-        
-    return gcode, blockNum
-        
-# Parses DXF data into Emco supported GCode
-def generate_gcode_from_dxf(parsed_data, isUseM3M5Checked, isStartRetractXChecked,isStartRetractZChecked, isStartRetractXZChecked, stockRadius, roughFeed, roughStep, finishFeed, finishStep):
-    
-    # starting blocks
-    gcode = []
-    blockNum = 0
-    gcode.append(f'%\n')
-    gcode.append(f'    N` G`   X `    Z `  F`  H\n')
-    feed = roughFeed
-    if (finishFeed == ""):
-        finishFeed == roughFeed
-    
-    # generate starting blocks
-    gcode, blockNum = addStartingBlocks(gcode, blockNum, isUseM3M5Checked, isStartRetractXChecked, isStartRetractZChecked, isStartRetractXZChecked)
-
-    # Calculate stepovers
-    parsed_data = sortParsedData(parsed_data)
-    parsed_data = flipDXFOverX(parsed_data)
-    number_of_steps = 1
-    finish_steps = 0
-    
-    # Calculate number of steps
-    if roughStep != 0:
-        smallest_z = find_smallest_y(parsed_data)
-        number_of_steps = int((stockRadius - smallest_z)/roughStep)
-        if finishStep != 0:
-            if ((stockRadius - smallest_z) % roughStep) / finishStep > 1:
-                number_of_steps += 1
-        
-    # Generate move and sub calls
-    step_num = 1
-    while step_num - 1 != number_of_steps:
-        
-        # Set x offset accordingly
-        # Roughing
-        feed = roughFeed
-        startXOffset = 0
-        if roughStep != 0:
-            if (stockRadius-smallest_z)-((step_num-1)*roughStep) > roughStep:
-                startXOffset = (stockRadius - smallest_z) - (step_num * roughStep) 
-            else:
-                # Finishing
-                stockLeft = (stockRadius-smallest_z)-((step_num-1)*roughStep)
-                if stockLeft > finishStep:
-                    startXOffset = stockLeft - (stockLeft - finishStep)
-        
-        # Calculate starting cut position and move there from X offset
-        # Move to cut
-        firstEndPoint = (parsed_data[0]['start_point'][0], parsed_data[0]['start_point'][1])
-        toAppend = (f'{blockNumPad(blockNum, 1)}{formatG00G01G02G03(compX(firstEndPoint[1], stockRadius) + startXOffset, firstEndPoint[0], "G01")}{formatFeed(feed)}\n')
-        gcode.append(toAppend)
-        blockNum += 1
-        
-        # Add subroutine call
-        gcode.append(f'{blockNumPad(blockNum, 1)}25+blockNumRough\n')
-        blockNum += 1
-        
-        # Add retract
-        retract_x = compX(parsed_data[-1]['end_point'][1], stockRadius) + startXOffset
-        retract_y = parsed_data[-1]['end_point'][0]
-        gcode, blockNum = addRetract(gcode, blockNum, retract_x, retract_y)
-            
-        # Update num steps
-        step_num += 1
-        
-    # Blank lines for readability
-    gcode.append(f'{blockNumPad(blockNum, 1)}21\n')
-    blockNum += 1
-    gcode.append(f'{blockNumPad(blockNum, 1)}21\n')
-    blockNum += 1
-    
-    # Calculate starting positions of cut relatively 
-    firstEndPoint = (parsed_data[0]['start_point'][0], parsed_data[0]['start_point'][1])
-    current_x = compX(firstEndPoint[1], stockRadius)
-    current_y = firstEndPoint[0]
-    
-    ##############
-    # add finish subroutine
-    ##############
-    if roughStep != 0:
-        # Move to cut
-        firstEndPoint = (parsed_data[0]['start_point'][0], parsed_data[0]['start_point'][1])
-        toAppend = (f'{blockNumPad(blockNum, 1)}{formatG00G01G02G03(compX(firstEndPoint[1], stockRadius), firstEndPoint[0], "G01")}{formatFeed(finishFeed)}\n')
-        gcode.append(toAppend)
-        blockNum += 1
-
-        # Add finish pass
-        gcode, blockNum = createToolpath(gcode, parsed_data, blockNum, current_x, current_y, stockRadius, roughFeed, finishFeed, 0)
-
-        # Add retract
-        retract_x = compX(parsed_data[-1]['end_point'][1], stockRadius)
-        retract_y = parsed_data[-1]['end_point'][0]
-        gcode, blockNum = addRetract(gcode, blockNum, retract_x, retract_y)
-    
-    ##############
-    # end finish subroutine
-    ##############
-    
-    # generate finishing blocks
-    gcode, blockNum = addFinishingBlocks(gcode, blockNum, isUseM3M5Checked)
-    gcode.append(f'{blockNumPad(blockNum, 1)}21\n')
-    blockNum += 1
-    gcode.append(f'{blockNumPad(blockNum, 1)}21\n')
-    blockNum += 1
-    
-    # insert sub block number into sub calls
-    gcode = addSubStartBlock(gcode, blockNum)
-    
-    # generate subroutine gcode blocks
-    gcode, blockNum = createToolpath(gcode, parsed_data, blockNum, current_x, current_y, stockRadius, roughFeed, finishFeed, 1)
-
-    # MFI end input
-    gcode.append(f'   M\n')
-    
-    return gcode
-
-# Determins the max DXF size for scaling DXF preview 
-def calculate_drawing_extents(entities):
-    min_x = float('inf')
-    min_y = float('inf')
-    max_x = float('-inf')
-    max_y = float('-inf')
-
-    for entity in entities:
-        if entity['type'] == 'LINE':
-            start_x, start_y = entity['start_point']
-            end_x, end_y = entity['end_point']
-            min_x = min(min_x, start_x, end_x)
-            max_x = max(max_x, start_x, end_x)
-            min_y = min(min_y, start_y, end_y)
-            max_y = max(max_y, start_y, end_y)
-        elif entity['type'] == 'CIRCLE':
-            center_x, center_y = entity['center_point']
-            radius = entity['radius']
-            min_x = min(min_x, center_x - radius)
-            max_x = max(max_x, center_x + radius)
-            min_y = min(min_y, center_y - radius)
-            max_y = max(max_y, center_y + radius)
-        elif entity['type'] == 'ARC':
-            center_x, center_y = entity['center_point']
-            radius = entity['radius']
-            start_angle = entity['start_angle']
-            end_angle = entity['end_angle']
-            min_x = min(min_x, center_x - radius)
-            max_x = max(max_x, center_x + radius)
-            min_y = min(min_y, center_y - radius)
-            max_y = max(max_y, center_y + radius)
-        elif entity['type'] == 'POLYLINE':
-            for vertex in entity['vertices']:
-                x, y = vertex
-                min_x = min(min_x, x)
-                max_x = max(max_x, x)
-                min_y = min(min_y, y)
-                max_y = max(max_y, y)
-
-    return min_x, min_y, max_x, max_y
+                path.moveTo(start_x * scale, -start_y * scale)
+                path.lineTo(end_x * scale, -end_y * scale)
+            elif entity['type'] == 'ARC':
+                center_x, center_y = entity['center_point']
+                radius = entity['radius'] * scale
+                start_x, start_y = entity['start_point']
+                start_angle, sweep = arcSweep(entity)
+                path.moveTo(start_x * scale, -start_y * scale)
+                path.arcTo(center_x * scale - radius, -center_y * scale - radius, radius * 2, radius * 2,
+                           math.degrees(start_angle), math.degrees(sweep))
+            elif entity['type'] == 'POLYLINE':
+                vertices = entity['vertices']
+                path.moveTo(vertices[0][0] * scale, -vertices[0][1] * scale)
+                for x, y in vertices[1:]:
+                    path.lineTo(x * scale, -y * scale)
+        self.full_path = path
+        return path
+
+# Drawing view that zooms on the mouse wheel and pans by dragging
+class PreviewView(QGraphicsView):
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setDragMode(QGraphicsView.ScrollHandDrag)
+        self.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)
+        self.setOptimizationFlags(QGraphicsView.DontSavePainterState | QGraphicsView.DontAdjustForAntialiasing)
+
+    def wheelEvent(self, event):
+        factor = 1.25 ** (event.angleDelta().y() / 120)
+        self.scale(factor, factor)
+
+# Colours the columns of program lines, see emco.blocks.blockSpans. Qt only
+#   calls highlightBlock for the lines an edit touched, so typing or inserting
+#   a block doesn't recolour the rest of a long program
+class GCodeHighlighter(QSyntaxHighlighter):
+    COLOURS = {
+        'number': ('#8a8a8a', False),
+        'gcode': ('#4f9de8', True),
+        'mcode': ('#c678dd', True),
+        'x': ('#e5a550', False),
+        'z': ('#56b6c2', False),
+        'feed': ('#98c379', False),
+        'i': ('#d19a66', False),
+        'k': ('#d19a66', False),
+        'label': ('#e06c75', False),
+    }
+
+    def __init__(self, document):
+        super().__init__(document)
+        # Column -> QTextCharFormat, made once and shared by every line
+        self.formats = {}
+        for column, (colour, bold) in self.COLOURS.items():
+            text_format = QTextCharFormat()
+            text_format.setForeground(QColor(colour))
+            if bold:
+                text_format.setFontWeight(QFont.Bold)
+            self.formats[column] = text_format
+
+    def highlightBlock(self, text):
+        for start, length, column in blockSpans(text):
+            self.setFormat(start, length, self.formats[column])
+
+# Carries worker callbacks over to the GUI thread, see emco.worker
+class WorkerSignals(QObject):
+    progress = pyqtSignal(object, str, int, int)
+    finished = pyqtSignal(object, str, object)
 
 # Emco Processor GUI
 class DXFParserGUI(QWidget):
@@ -517,16 +166,59 @@ class DXFParserGUI(QWidget):
         super().__init__()
         self.initUI()
         self.file_path = ""
+        # Memoized generation so changing one setting only redoes what depends
+        #   on it. Only the worker thread's jobs touch it
+        self.pipeline = Pipeline()
         self.output_code = ""
 
+        # Parsing and generating run on a worker thread so the window stays responsive
+        self.worker_signals = WorkerSignals()
+        self.worker_signals.progress.connect(self.showProgress)
+        self.worker_signals.finished.connect(self.jobFinished)
+        self.runner = JobRunner(self.worker_signals.progress.emit, self.worker_signals.finished.emit)
+        self.runner.submit("warmup", lambda job: loadDXFReader())
+
     def initUI(self):
         layout = QVBoxLayout()
 
-        # Display the DXF drawing
-        self.view = QGraphicsView(self)
+        # Display the DXF drawing. The scene only holds a few items so it
+        #   isn't indexed
+        self.view = PreviewView(self)
         self.scene = QGraphicsScene()
+        self.scene.setItemIndexMethod(QGraphicsScene.NoIndex)
         self.view.setScene(self.scene)
-        layout.addWidget(self.view)
+
+        # Drawing with the generated toolpath's passes listed beside it, each
+        #   one can be shown or hidden
+        view_layout = QHBoxLayout()
+        view_layout.addWidget(self.view)
+        self.pass_list = QListWidget()
+        self.pass_list.setMaximumWidth(200)
+        self.pass_list.itemChanged.connect(self.passToggled)
+        view_layout.addWidget(self.pass_list)
+        layout.addLayout(view_layout)
+        # Overlay item of every pass in pass_list order, and their rapids
+        self.pass_items = []
+        self.rapid_items = []
+        # Scene rectangle of the drawing alone, the overlay is added to it
+        self.drawing_rect = QRectF()
+
+        # Shared pens for the drawing, cosmetic so lines stay one pixel wide when zoomed
+        self.profile_pen = QPen(QColor(0, 0, 255))
+        self.profile_pen.setCosmetic(True)
+        self.axis_pen = QPen(QColor(255, 0, 0))
+        self.axis_pen.setStyle(Qt.DashLine)  # Set the style to DashLine
+        self.axis_pen.setDashPattern([25, 20])  # Adjust the spacing here
+        self.axis_pen.setCosmetic(True)
+        self.rapid_pen = QPen(QColor(150, 150, 150))
+        self.rapid_pen.setStyle(Qt.DashLine)
+        self.rapid_pen.setCosmetic(True)
+        self.finish_pen = QPen(QColor(0, 200, 0))
+        self.finish_pen.setWidth(2)
+        self.finish_pen.setCosmetic(True)
+        # Entities the cached extents were measured for, and the extents
+        self.extents_entities = None
+        self.drawing_extents = None
 
         # Open DXF file button
         self.btn_open = QPushButton("Open DXF File")
@@ -589,6 +281,15 @@ class DXFParserGUI(QWidget):
         self.retract_start_xz_checkbox = QCheckBox("Retract before start in X and Z")
         grid_layout2.addWidget(self.retract_start_xz_checkbox, 1, 6, 1, 7)
 
+        # Roughing pass stepping strategy
+        self.strategy_combo = QComboBox()
+        self.strategy_combo.addItems(STRATEGIES)
+        grid_layout2.addWidget(self.strategy_combo, 1, 8, 1, 9)
+
+        # Only cut the parts of each roughing pass that are inside the stock
+        self.clip_roughing_checkbox = QCheckBox("Clip roughing to stock")
+        grid_layout2.addWidget(self.clip_roughing_checkbox, 1, 10, 1, 11)
+
         
         # Create a list of the checkboxes for easier management
         retract_checkboxes = [
@@ -604,16 +305,18 @@ class DXFParserGUI(QWidget):
         # Add the grid layout to the main layout
         layout.addLayout(grid_layout2)
 
-        # Scrollable G-code display that allows user to edit directly
-        self.gcode_browser = QTextEdit(self)
+        # G-code editor the user can edit directly. A plain text editor only
+        #   lays out the lines in view, so programs of thousands of blocks stay
+        #   quick to scroll and edit. Lines are short, so no wrapping
+        self.gcode_browser = QPlainTextEdit(self)
+        self.gcode_browser.setLineWrapMode(QPlainTextEdit.NoWrap)
         self.gcode_browser_cursor = self.gcode_browser.textCursor()
-        self.scroll_area = QScrollArea(self)
-        self.scroll_area.setWidget(self.gcode_browser)
-        layout.addWidget(self.scroll_area)
-        self.scroll_area.setWidgetResizable(True)
+        self.gcode_highlighter = GCodeHighlighter(self.gcode_browser.document())
+        layout.addWidget(self.gcode_browser)
         
-        # Set the font size for the QTextBrowser
-        font = self.gcode_browser.currentFont()
+        # Monospaced so the block columns line up
+        font = QFont("Monospace")
+        font.setStyleHint(QFont.TypeWriter)
         font.setPointSize(14)  # Adjust the font size (in points) as needed
         self.gcode_browser.setFont(font)
         
@@ -646,10 +349,55 @@ class DXFParserGUI(QWidget):
         self.btn_save = QPushButton("Save G-code")
         self.btn_save.clicked.connect(self.saveGCode)
         grid_layout3.addWidget(self.btn_save, 0, 5)
+
+        # Auto generate toggle, regenerates in the background on every setting change
+        self.auto_generate_checkbox = QCheckBox("Auto generate")
+        self.auto_generate_checkbox.toggled.connect(self.settingsChanged)
+        grid_layout3.addWidget(self.auto_generate_checkbox, 1, 0)
+
+        # Profile toggle, times every stage of opening and generating
+        self.profile_checkbox = QCheckBox("Profile")
+        self.profile_checkbox.toggled.connect(self.toggleProfiling)
+        grid_layout3.addWidget(self.profile_checkbox, 1, 4)
+
+        # Export profile button
+        self.btn_export_profile = QPushButton("Export profile")
+        self.btn_export_profile.clicked.connect(self.exportProfile)
+        self.btn_export_profile.setEnabled(False)
+        grid_layout3.addWidget(self.btn_export_profile, 1, 5)
         
         # Add the grid layout to the main layout
         layout.addLayout(grid_layout3)
 
+        # Progress of the background open or generate, with a cancel button
+        progress_layout = QHBoxLayout()
+        self.status_label = QLabel("Ready")
+        progress_layout.addWidget(self.status_label)
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setVisible(False)
+        progress_layout.addWidget(self.progress_bar)
+        self.btn_cancel = QPushButton("Cancel")
+        self.btn_cancel.clicked.connect(self.cancelJobs)
+        self.btn_cancel.setEnabled(False)
+        progress_layout.addWidget(self.btn_cancel)
+        layout.addLayout(progress_layout)
+
+        # Every setting that changes the program regenerates it while auto generate is on
+        for line_edit in (self.stock_radius_input, self.roughing_feedrate_input, self.roughing_stepdown_input,
+                          self.finishing_feedrate_input, self.finishing_stepdown_input):
+            line_edit.textChanged.connect(self.settingsChanged)
+        for checkbox in (self.use_m3_m5_checkbox, self.clip_roughing_checkbox, *retract_checkboxes):
+            checkbox.toggled.connect(self.settingsChanged)
+        self.strategy_combo.currentIndexChanged.connect(self.settingsChanged)
+
+        # Status panel with the stage timings of the last open or generate,
+        #   only shown while profiling
+        self.profile_panel = QTextBrowser(self)
+        self.profile_panel.setStyleSheet("font-family: monospace;")
+        self.profile_panel.setMaximumHeight(200)
+        self.profile_panel.setVisible(False)
+        layout.addWidget(self.profile_panel)
+
         self.setLayout(layout)
         self.setGeometry(100, 100, 1600, 1600)
         self.setWindowTitle("DXF Parser")
@@ -662,7 +410,7 @@ class DXFParserGUI(QWidget):
     # Function to read stock radius input
     def getStockRadius(self):
         if self.stock_radius_input.text() != "":
-            return int(self.stock_radius_input.text())
+            return float(self.stock_radius_input.text())
         else:
             return ""
         
@@ -683,17 +431,27 @@ class DXFParserGUI(QWidget):
     # Function to read roughing feedrate
     def getRoughStep(self):
         if self.roughing_stepdown_input.text() != "":
-            return int(self.roughing_stepdown_input.text())
+            return float(self.roughing_stepdown_input.text())
         else:
             return "" 
         
     # Function to read finishing feedrate
     def getFinishStep(self):
         if self.finishing_stepdown_input.text() != "":
-            return int(self.finishing_stepdown_input.text())
+            return float(self.finishing_stepdown_input.text())
         else:
             return "" 
     
+    # Function to read the roughing pass strategy
+    def getStrategy(self):
+        return self.strategy_combo.currentText()
+
+    # Function to get the roughing mode from the clip roughing checkbox
+    def getRoughingMode(self):
+        if self.clip_roughing_checkbox.isChecked():
+            return "clipped"
+        return "subroutine"
+
     # Function to get the value of the Use M3/M5 checkbox
     def isUseM3M5Checked(self):
         return self.use_m3_m5_checkbox.isChecked()
@@ -707,6 +465,16 @@ class DXFParserGUI(QWidget):
     
     def isStartRetractXZChecked(self):
         return self.retract_start_xz_checkbox.isChecked()
+
+    # Start retract as the pipeline's retract mode
+    def getRetractMode(self):
+        if self.isStartRetractXChecked():
+            return "x"
+        elif self.isStartRetractZChecked():
+            return "z"
+        elif self.isStartRetractXZChecked():
+            return "xz"
+        return "none"
     
     # Insert M00 at cursor position in gcode output
     def insertM00(self):
@@ -719,42 +487,39 @@ class DXFParserGUI(QWidget):
     # Insert M00, G21 at cursor position in gcode output
     def insertBlock(self, M00G21):
         
-        # Insert M00 or popup error if block insertion number has been added
+        # Insert M00 or popup error if block insertion number has been added.
+        #   Several comma separated block numbers insert at each of them
         currentBlock = self.addM00G21_input.text()
-        if self.gcode_browser.toPlainText() == "":
+        if self.gcode_browser.document().isEmpty():
             self.errorMessage("Please generate GCode first")
-        elif currentBlock != "":
-            currentBlock = int(currentBlock)
-            text_to_insert = f"    {currentBlock:02d}  {M00G21}"  # Format the text
-        
-            # Get the entire text from the QTextEdit
-            full_text = self.gcode_browser.toPlainText()
-
-            # Split the text into lines
-            lines = full_text.split('\n')
-
-            # Update the block numbers in the lines
-            updated_lines = []
-            block_number = 0  # The starting block number
-            for line in lines:
-                if line.strip().startswith("M") or line.strip().startswith("%") or line.strip().startswith("N") or line == "":  # Check for the start/end of the file
-                    updated_lines.append(line)  # Keep the "M" line
-                elif int(line[:6]) == currentBlock: 
-                    updated_lines.append(text_to_insert)
-                    block_number += 1
-                    updated_line = f"    {block_number:02d}{line[6:]}"  # Update the block number
-                    updated_lines.append(updated_line)
-                    block_number += 1
-                else:
-                    updated_line = f"    {block_number:02d}{line[6:]}"  # Update the block number
-                    updated_lines.append(updated_line)
-                    block_number += 1
-
-                # Join the updated lines into a single string
-                updated_text = '\n'.join(updated_lines)
-
-                # Set the updated text back into the QTextEdit
-                self.gcode_browser.setPlainText(updated_text)
+        elif currentBlock.strip() != "":
+            try:
+                numbers = [int(number) for number in currentBlock.split(',') if number.strip()]
+            except ValueError:
+                self.errorMessage("Block numbers must be whole numbers separated by commas")
+                return
+
+            text = self.gcode_browser.toPlainText()
+            if len(splitProgramText(text)) > 1:
+                self.errorMessage("Blocks can only be inserted into a single program, save the chained programs and edit them separately")
+                return
+
+            # Edit the program structurally so every block is renumbered and
+            #   G25 L targets follow their subroutine in one pass
+            program = parseProgram(text)
+            index = program.indexByNumber()
+            missing = [number for number in numbers if number not in index]
+            if missing:
+                self.errorMessage(f"Block {missing[0]} is not in the program")
+                return
+            if M00G21 == "M00":
+                insert = {index[number]: [Block(MCODE, 0)] for number in numbers}
+            else:
+                insert = {index[number]: [Block(G21, 21)] for number in numbers}
+            program.edit(insert=insert)
+
+            # Only the lines from the first insert on change
+            self.replaceEditorText(text, program.render())
         else:
             self.errorMessage("You need to enter a block number for insertion position")
 
@@ -764,114 +529,310 @@ class DXFParserGUI(QWidget):
             if checkbox is not clicked_checkbox:
                 checkbox.setChecked(False)
     
-    # Opens DXF file from your computer
+    # Opens DXF file from your computer, parsing it in the background
     def openFile(self):
         options = QFileDialog.Options()
-        self.file_path, _ = QFileDialog.getOpenFileName(self, "Open DXF File", "", "DXF Files (*.dxf);;All Files (*)", options=options)
-        if self.file_path:
-            entities = parse_dxf_file(self.file_path)
-            self.parseAndDisplayDXF(entities)
+        file_path, _ = QFileDialog.getOpenFileName(self, "Open DXF File", "", "DXF Files (*.dxf);;All Files (*)", options=options)
+        if file_path:
+            # self.file_path only changes once the drawing is shown, so a
+            #   cancelled or failed open leaves the window on the old file
+            self.startProfile()
+            self.runner.submit("open", self.openJob, file_path)
+
+    # Worker side of openFile, parses and lays out the preview segments.
+    #   Returns the file path with them for jobFinished
+    def openJob(self, job, file_path):
+        self.pipeline.set(file_path=file_path)
+        stages = self.pipeline.staleStages('parsed') + ['preview']
+        entities = self.runPipeline(job, 'parsed', stages)
+        job.progress('preview', len(stages) - 1, len(stages))
+        extents = calculate_drawing_extents(entities)
+        return file_path, entities, extents, previewSegments(entities, previewScale(extents))
            
     # Starts gcode generating process
     def generateGCode(self):
-        if self.file_path == "":
-            self.errorMessage("You need to insert a DXF first")
-        elif self.getStockRadius() == "":
-            self.errorMessage("You need to enter a stock radius")
-        elif self.getRoughFeed() == "":
-            self.errorMessage("You need to enter a roughing feedrate")
-        elif self.getFinishFeed() == "":
-            self.errorMessage("You need to enter a finishing feedrate")
-        elif self.getRoughStep() == "":
-            self.errorMessage("You need to enter a stepdown. 0 = 1 pass")
+        self.requestGeneration()
+
+    # Regenerates after a setting changed, when auto generate is on
+    def settingsChanged(self, *args):
+        if self.auto_generate_checkbox.isChecked():
+            self.requestGeneration(quiet=True)
+
+    # Generates in the background. A newer request cancels the one running and
+    #   replaces one still waiting. quiet skips the missing setting messages and
+    #   only shows a failed generation in the status label
+    def requestGeneration(self, quiet=False):
+        params = self.generationParams(quiet)
+        if params is not None:
+            self.startProfile()
+            scale = previewScale(self.drawing_extents) if self.drawing_extents is not None else None
+            self.runner.submit("generate", self.generateJob, params, scale, quiet=quiet)
+
+    # Generation settings as Pipeline parameters, None after telling the user
+    #   what is missing
+    def generationParams(self, quiet=False):
+        try:
+            if self.file_path == "":
+                message = "You need to insert a DXF first"
+            elif self.getStockRadius() == "":
+                message = "You need to enter a stock radius"
+            elif self.getRoughFeed() == "":
+                message = "You need to enter a roughing feedrate"
+            elif self.getFinishFeed() == "":
+                message = "You need to enter a finishing feedrate"
+            elif self.getRoughStep() == "":
+                message = "You need to enter a stepdown. 0 = 1 pass"
+            elif self.getFinishStep() == "":
+                message = "You need to enter a finishing stepdown"
+            else:
+                return dict(file_path=self.file_path, use_m3_m5=self.isUseM3M5Checked(), retract=self.getRetractMode(),
+                            stock_radius=self.getStockRadius(), rough_feed=self.getRoughFeed(), rough_step=self.getRoughStep(),
+                            finish_feed=self.getFinishFeed(), finish_step=self.getFinishStep(),
+                            strategy=self.getStrategy(), roughing=self.getRoughingMode())
+        except ValueError:
+            message = "Stock radius and stepdowns need to be numbers, feedrates whole numbers"
+        if not quiet:
+            self.errorMessage(message)
+        return None
+
+    # Worker side of generateGCode, generates and backplots the programs into
+    #   the toolpath overlay, drawn at the preview's scale
+    def generateJob(self, job, params, scale):
+        self.pipeline.set(**params)
+        stages = self.pipeline.staleStages('programs') + ['backplot']
+        programs = self.runPipeline(job, 'programs', stages)
+        job.progress('backplot', len(stages) - 1, len(stages))
+        if scale is None:
+            scale = previewScale(calculate_drawing_extents(self.pipeline.get('parsed')))
+        # Drawings in the 3rd quadrant are cut flipped, see flipDXFOverX
+        segments = self.pipeline.get('chained').segments
+        mirror = bool(segments) and segments[0]['start_point'][1] < 0
+        overlay = toolpathOverlay(runPrograms(programs), params['stock_radius'], scale,
+                                  self.pipeline.get('plan').finish, mirror)
+        return programs, overlay
+
+    # Runs a pipeline stage on the worker, reporting each of stages as it
+    #   starts. Cancelling the job stops it before the next stage
+    def runPipeline(self, job, name, stages):
+        def listener(stage):
+            job.progress(stage, stages.index(stage) if stage in stages else 0, len(stages))
+        self.pipeline.listener = listener
+        try:
+            return self.pipeline.get(name)
+        finally:
+            self.pipeline.listener = None
+
+    # Shows which stage the worker is on
+    def showProgress(self, job, stage, done, total):
+        action = "Opening" if job.kind == "open" else "Generating"
+        self.status_label.setText(f"{action}: {stage}")
+        self.progress_bar.setRange(0, total)
+        self.progress_bar.setValue(done)
+        self.progress_bar.setVisible(True)
+        self.btn_cancel.setEnabled(True)
+
+    # Takes a finished job's result on the GUI thread
+    def jobFinished(self, job, status, value):
+        if not self.runner.busy():
+            self.progress_bar.setVisible(False)
+            self.btn_cancel.setEnabled(False)
+            self.status_label.setText("Cancelled" if status == CANCELLED else "Ready")
+        if status == FAILED and job.quiet:
+            self.status_label.setText("Failed: " + value)
+        elif status == FAILED:
+            self.status_label.setText("Failed")
+            self.errorMessage(value)
+        elif status == DONE and job.kind == "open":
+            file_path, entities, extents, segments = value
+            self.file_path = file_path
+            self.extents_entities = entities
+            self.drawing_extents = extents
+            self.parseAndDisplayDXF(entities, segments)
+            self.showProfile("Open " + os.path.basename(self.file_path))
+        elif status == DONE and job.kind == "generate":
+            programs, overlay = value
+            self.showGCode(programs)
+            self.showToolpath(overlay)
+
+    # Puts generated programs into the editor
+    def showGCode(self, programs):
+        self.output_code = ''.join(programs).splitlines(keepends=True)
+        self.replaceEditorText(self.gcode_browser.toPlainText(), ''.join(self.output_code))
+        self.showProfile("Generate G-code")
+        if len(programs) > 1 and not self.auto_generate_checkbox.isChecked():
+            QMessageBox.information(self, "Program split",
+                                    f"The job needs more than {MAX_BLOCKS} blocks so it was split into {len(programs)} "
+                                    "chained programs. Saving writes one numbered .cnc file per program, run them in order.")
+
+    # Changes the editor from old_text, what it holds now, to new_text by
+    #   replacing only the lines that differ, as one undo step. The lines
+    #   around the change keep their layout and highlighting, and the view
+    #   stays where it was
+    def replaceEditorText(self, old_text, new_text):
+        old_lines = old_text.split('\n')
+        new_lines = new_text.split('\n')
+        change = changedLines(old_lines, new_lines)
+        if change is None:
+            return
+        first, old_stop, new_stop = change
+        document = self.gcode_browser.document()
+        last = document.findBlockByNumber(old_stop - 1)
+        cursor = QTextCursor(document.findBlockByNumber(first))
+        cursor.beginEditBlock()
+        cursor.setPosition(last.position() + last.length() - 1, QTextCursor.KeepAnchor)
+        cursor.insertText('\n'.join(new_lines[first:new_stop]))
+        cursor.endEditBlock()
+
+    # Draws the backplotted toolpath under the drawing, one item per pass
+    #   with its rapids as a child item
+    def showToolpath(self, overlay):
+        self.clearToolpath()
+        self.pass_list.blockSignals(True)
+        self.pass_list.clear()
+        self.addPassEntry("Rapids")
+        scene_rect = self.drawing_rect
+        for pass_overlay in overlay:
+            if pass_overlay.kind == FINISH:
+                label, pen = "Finish pass", self.finish_pen
+            elif pass_overlay.kind == ROUGH:
+                label, pen = f"Roughing pass {pass_overlay.index + 1}", self.passPen(pass_overlay.index)
+            else:
+                label, pen = "Start and end moves", self.rapid_pen
+            item = SegmentItem(pass_overlay.feeds, pen)
+            self.rapid_items.append(SegmentItem(pass_overlay.rapids, self.rapid_pen, parent=item))
+            self.scene.addItem(item)
+            self.pass_items.append(item)
+            scene_rect = scene_rect.united(item.boundingRect()).united(item.childrenBoundingRect())
+            self.addPassEntry(label)
+        self.scene.setSceneRect(scene_rect)
+        self.pass_list.blockSignals(False)
+
+    def addPassEntry(self, label):
+        entry = QListWidgetItem(label)
+        entry.setFlags(entry.flags() | Qt.ItemIsUserCheckable)
+        entry.setCheckState(Qt.Checked)
+        self.pass_list.addItem(entry)
+
+    # Roughing pass colours go round the hue circle, skipping the finish pass green
+    def passPen(self, index):
+        hue = (20 + index * 47) % 360
+        if 90 <= hue < 150:
+            hue += 60
+        pen = QPen(QColor.fromHsv(hue, 220, 255))
+        pen.setCosmetic(True)
+        return pen
+
+    # Pass list checkbox, the first entry shows or hides every pass's rapids
+    def passToggled(self, entry):
+        row = self.pass_list.row(entry)
+        visible = entry.checkState() == Qt.Checked
+        if row == 0:
+            for item in self.rapid_items:
+                item.setVisible(visible)
         else:
-            entities = parse_dxf_file(self.file_path)
-            self.output_code = generate_gcode_from_dxf(entities, self.isUseM3M5Checked(), self.isStartRetractXChecked(), self.isStartRetractZChecked(), self.isStartRetractXZChecked(), self.getStockRadius(), self.getRoughFeed(), self.getRoughStep(), self.getFinishFeed(), self.getFinishStep())
-            self.gcode_browser.clear()
-            self.gcode_browser.append(''.join(self.output_code))
-            
+            self.pass_items[row - 1].setVisible(visible)
+
+    # Takes the overlay out of the scene, before the scene is cleared or redrawn
+    def clearToolpath(self):
+        for item in self.pass_items:
+            self.scene.removeItem(item)
+        self.pass_items = []
+        self.rapid_items = []
+
+    # Cancel button, stops the running job at its next stage and drops waiting ones
+    def cancelJobs(self):
+        self.runner.cancelAll()
+
     # Displays DXF and scales uniformly to fit screen
-    def parseAndDisplayDXF(self, entities):
+    #   segments optionally holds the preview segments the worker made
+    @timedStage('parseAndDisplayDXF')
+    def parseAndDisplayDXF(self, entities, segments=None):
+        self.clearToolpath()
+        self.pass_list.clear()
         self.scene.clear()
-        # Get the drawing extents for scaling
-        min_x, min_y, max_x, max_y = calculate_drawing_extents(entities)
-        drawing_width = max_x - min_x
-        drawing_height = max_y - min_y
-        scale_factor = 750 / max(drawing_width, drawing_height)  # Adjust the scale as needed
+        # Get the drawing extents for scaling, measured once per parse result
+        extents = self.drawingExtents(entities)
+        scale_factor = previewScale(extents)
 
         # draw line for x axis
-        line = self.scene.addLine(0, 0, -750, 0)
-        pen = QPen(QColor(255, 0, 0))
-        pen.setStyle(Qt.DashLine)  # Set the style to DashLine
-        pen.setDashPattern([25, 20])  # Adjust the spacing here
-        line.setPen(pen)
-        
-        # draw DXF entities
-        for entity in entities:
-            if entity['type'] == 'LINE':
-                start_x, start_y = entity['start_point']
-                end_x, end_y = entity['end_point']
-                line = self.scene.addLine(start_x * scale_factor, -start_y * scale_factor, end_x * scale_factor, -end_y * scale_factor)
-                pen = QPen(QColor(0, 0, 255))
-                line.setPen(pen)
-            elif entity['type'] == 'ARC':
-                # Extract ARC data
-                center_x, center_y = entity['center_point']
-                radius = entity['radius']
-                start_angle = entity['start_angle']
-                end_angle = entity['end_angle']
-
-                # Calculate scaled values
-                center_x_scaled = center_x * scale_factor
-                center_y_scaled = -center_y * scale_factor
-                radius_scaled = radius * scale_factor
-
-                # Calculate start and end points based on angles and radius
-                start_x = center_x + radius * math.cos(math.radians(start_angle))
-                start_y = center_y + radius * math.sin(math.radians(start_angle))
-                end_x = center_x + radius * math.cos(math.radians(end_angle))
-                end_y = center_y + radius * math.sin(math.radians(end_angle))
-
-                start_x_scaled = start_x * scale_factor 
-                start_y_scaled = -start_y * scale_factor 
-                end_x_scaled = end_x * scale_factor
-                end_y_scaled = -end_y * scale_factor
-
-                # Draw the scaled arc using QGraphicsPathItem
-                arc_path = QPainterPath()
-                arc_path.moveTo(start_x_scaled, start_y_scaled)
-                arc_path.arcTo(center_x_scaled - radius_scaled, center_y_scaled - radius_scaled, radius_scaled * 2, radius_scaled * 2, start_angle, (end_angle - start_angle))
-
-                arc = QGraphicsPathItem(arc_path)
-                pen = QPen(QColor(0, 0, 255))
-                arc.setPen(pen)
-                self.scene.addItem(arc)
-            elif entity['type'] == 'POLYLINE':
-                vertices = entity['vertices']
-                polyline = QGraphicsView()
-                poly_scene = QGraphicsScene()
-                polyline.setScene(poly_scene)
-                pen = QPen(QColor(0, 0, 255))
-                for i in range(len(vertices) - 1):
-                    start_x, start_y = vertices[i]
-                    end_x, end_y = vertices[i + 1]
-                    line = poly_scene.addLine(start_x * scale_factor, -start_y * scale_factor, end_x * scale_factor, -end_y * scale_factor)
-                    line.setPen(pen)
-                self.view.setScene(self.scene)
+        line = self.scene.addLine(0, 0, -PREVIEW_SIZE, 0)
+        line.setPen(self.axis_pen)
+
+        # draw DXF entities as one item
+        bounds = QRectF(*sceneBounds(extents, scale_factor))
+        # The drawing stays on top of the toolpath overlay
+        profile = ProfileItem(entities, scale_factor, self.profile_pen, bounds, segments)
+        profile.setZValue(1)
+        self.scene.addItem(profile)
+
+        # Fixed scene rectangle so adding items never makes Qt measure them all
+        margin = PREVIEW_SIZE * 0.05
+        scene_rect = bounds.united(QRectF(-PREVIEW_SIZE, 0, PREVIEW_SIZE, 0))
+        self.drawing_rect = scene_rect.adjusted(-margin, -margin, margin, margin)
+        self.scene.setSceneRect(self.drawing_rect)
+
+    # Drawing extents of entities, see calculate_drawing_extents. The
+    #   pipeline hands back the same parse result until the file changes
+    def drawingExtents(self, entities):
+        if entities is not self.extents_entities:
+            self.drawing_extents = calculate_drawing_extents(entities)
+            self.extents_entities = entities
+        return self.drawing_extents
 
     # Saves gcode file to your computer
     def saveGCode(self):
-        if self.gcode_browser.toPlainText() == "":
+        if self.gcode_browser.document().isEmpty():
             self.errorMessage("GCode empty")
         else:
             filename, _ = QFileDialog.getSaveFileName(self, filter="*.cnc")
             if filename:
-                f = open(filename, 'w')
-                toWrite = ""
-                toWrite = toWrite.join(''.join(self.gcode_browser.toPlainText()) )
-                f.write(toWrite)
+                # Chained programs are saved as name_1.cnc, name_2.cnc, ...
+                programs = splitProgramText(self.gcode_browser.toPlainText())
+                base, extension = os.path.splitext(filename)
+                for number, program in enumerate(programs, 1):
+                    if len(programs) > 1:
+                        filename = f"{base}_{number}{extension}"
+                    f = open(filename, 'w')
+                    f.write(program)
+                    f.close()
                 self.setWindowTitle(str(os.path.basename(filename)) + " - Notepad Alpha")
-                f.close()
+
+
+    # Turns stage timing on or off, see emco.profiling
+    def toggleProfiling(self, checked):
+        if checked:
+            default_profiler.reset()
+            default_profiler.enable()
+            self.profile_panel.setPlainText("Profiling on, open a DXF or generate G-code")
+        else:
+            default_profiler.disable()
+        self.profile_panel.setVisible(checked)
+        self.btn_export_profile.setEnabled(checked)
+
+    # Clears the last run's timings so the panel only shows the next action
+    def startProfile(self):
+        if default_profiler.enabled:
+            default_profiler.reset()
+
+    # Shows the recorded stage timings in the status panel
+    def showProfile(self, title):
+        if default_profiler.enabled:
+            self.profile_panel.setPlainText('\n'.join([title] + default_profiler.summary()))
+
+    # Saves the last run's stage timings as JSON
+    def exportProfile(self):
+        if not default_profiler.stages:
+            self.errorMessage("Nothing profiled yet, open a DXF or generate G-code first")
+            return
+        filename, _ = QFileDialog.getSaveFileName(self, "Export profile", "", "JSON Files (*.json)")
+        if filename:
+            default_profiler.writeJson(filename, file=self.file_path)
+
+
+    # Stops background work before the window goes
+    def closeEvent(self, event):
+        self.runner.shutdown()
+        super().closeEvent(event)
         
     def errorMessage(self, message):
         self.msg = QMessageBox()
@@ -881,6 +842,7 @@ class DXFParserGUI(QWidget):
        
 def main():
     app = QApplication(sys.argv)
+    import qdarktheme
     qdarktheme.setup_theme()
     window = DXFParserGUI()
     sys.exit(app.exec_())
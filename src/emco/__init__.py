@@ -0,0 +1,13 @@
+# GUI-free conversion core for EmcoProcessor
+# Nothing in this package imports Qt so it can be used on headless machines.
+#   The names below load emco.core on first use, so light modules like
+#   emco.worker or emco.profiling import without numpy, and nothing imports
+#   ezdxf until a file is read
+import importlib
+
+__all__ = ['parse_dxf_file', 'generate_gcode_from_dxf', 'calculate_drawing_extents']
+
+def __getattr__(name):
+    if name in __all__:
+        return getattr(importlib.import_module('emco.core'), name)
+    raise AttributeError(f"module 'emco' has no attribute {name!r}")
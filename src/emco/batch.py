@@ -0,0 +1,386 @@
+# Headless batch conversion of DXF files into Emco GCode
+# Usage: python -m emco.batch [options] <dxf files, directories or globs>
+import argparse
+import concurrent.futures
+import csv
+import glob
+import json
+import os
+import sys
+import time
+from emco.core import generate_programs_from_dxf, prepareProfile, flipDXFOverX, MAX_BLOCKS
+from emco.cache import default_cache
+from emco.chain import chainSegments
+from emco.simplify import simplifySegments
+from emco.profile import Profile
+from emco.fixedpoint import programClosure
+from emco.simulate import runPrograms, verifyToolpath
+from emco.cycletime import RAPID_RATE, estimateToolpath, formatDuration
+from emco.passplan import STRATEGIES
+from emco.roughing import ROUGHING_MODES
+from emco.profiling import Profiler, default_profiler
+
+# Parameters used when neither the command line, manifest nor sidecar set one
+DEFAULT_PARAMS = {
+    'stock_radius': None,
+    'rough_feed': None,
+    'rough_step': 0,
+    'finish_feed': None,
+    'finish_step': 0,
+    'use_m3_m5': False,
+    'retract': 'none',
+    'strategy': 'constant',
+    'roughing': 'subroutine',
+    'max_blocks': MAX_BLOCKS,
+    'rapid_rate': RAPID_RATE,
+}
+
+RETRACT_MODES = ('none', 'x', 'z', 'xz')
+
+# Converts manifest/sidecar text into an int where possible so feeds format correctly
+def parseNumber(value):
+    if isinstance(value, (int, float)):
+        return value
+    value = str(value).strip()
+    if value == "":
+        return None
+    number = float(value)
+    if number.is_integer():
+        return int(number)
+    return number
+
+# Converts manifest/sidecar text into a bool
+def parseBool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y', 'on')
+
+# Normalizes a dict of raw parameters, ignoring blank and unknown entries
+def normalizeParams(raw):
+    params = {}
+    for key, value in raw.items():
+        key = key.strip().lower()
+        if key not in DEFAULT_PARAMS or value is None or value == "":
+            continue
+        if key == 'use_m3_m5':
+            params[key] = parseBool(value)
+        elif key == 'retract':
+            value = str(value).strip().lower()
+            if value not in RETRACT_MODES:
+                raise ValueError(f'retract must be one of {", ".join(RETRACT_MODES)}, got {value!r}')
+            params[key] = value
+        elif key == 'strategy':
+            value = str(value).strip().lower()
+            if value not in STRATEGIES:
+                raise ValueError(f'strategy must be one of {", ".join(STRATEGIES)}, got {value!r}')
+            params[key] = value
+        elif key == 'roughing':
+            value = str(value).strip().lower()
+            if value not in ROUGHING_MODES:
+                raise ValueError(f'roughing must be one of {", ".join(ROUGHING_MODES)}, got {value!r}')
+            params[key] = value
+        else:
+            params[key] = parseNumber(value)
+    return params
+
+# Reads a CSV manifest with a "file" column and one column per parameter
+def readManifest(manifest_path):
+    manifest = {}
+    with open(manifest_path, newline='') as f:
+        for row in csv.DictReader(f):
+            file_name = row.pop('file', '').strip()
+            if file_name:
+                manifest[os.path.basename(file_name)] = normalizeParams(row)
+    return manifest
+
+# Reads the optional <part>.json sidecar next to a DXF file
+def readSidecar(file_path):
+    sidecar_path = os.path.splitext(file_path)[0] + '.json'
+    if not os.path.isfile(sidecar_path):
+        return {}
+    with open(sidecar_path) as f:
+        return normalizeParams(json.load(f))
+
+# Expands files, directories and glob patterns into a sorted list of DXF files
+def collectInputs(inputs):
+    files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            matches = glob.glob(os.path.join(item, '*.dxf')) + glob.glob(os.path.join(item, '*.DXF'))
+        elif glob.has_magic(item):
+            matches = glob.glob(item, recursive=True)
+        else:
+            matches = [item]
+        for match in matches:
+            if match not in files:
+                files.append(match)
+    return sorted(files)
+
+# Builds the parameter set for one file. Sidecar beats manifest beats command line
+def resolveParams(file_path, cli_params, manifest):
+    params = dict(DEFAULT_PARAMS)
+    params.update(cli_params)
+    params.update(manifest.get(os.path.basename(file_path), {}))
+    params.update(readSidecar(file_path))
+    for key in ('stock_radius', 'rough_feed', 'finish_feed'):
+        if params[key] is None:
+            raise ValueError(f'no {key} given on the command line, manifest or sidecar')
+    return params
+
+# Converts a single DXF file, run inside a worker process
+#   profile is None, "time" or "memory" to record every stage with
+#   emco.profiling, the snapshot is returned under result['profile']
+def convertFile(file_path, params, output_dir, cache_dir=None, layers=None, streaming=False, verify=True, profile=None):
+    result = {'file': file_path, 'output': None, 'outputs': [], 'ok': False, 'error': None,
+              'parse_time': 0.0, 'generate_time': 0.0, 'backplot_time': 0.0, 'lines': 0, 'warnings': [],
+              'simplified': None, 'verified': None, 'cycle_time': None, 'cycle': None, 'passes': [], 'profile': None}
+    if profile:
+        default_profiler.reset()
+        default_profiler.enable(memory=profile == 'memory')
+    try:
+        start = time.perf_counter()
+        default_cache.cache_dir = cache_dir
+        with default_profiler.stage('load'):
+            entities = default_cache.get(file_path, layers, streaming)
+        result['parse_time'] = time.perf_counter() - start
+
+        chained = chainSegments(entities)
+        result['warnings'] = chained.warnings()
+        simplified = simplifySegments(chained.segments)
+        if simplified.removed():
+            result['simplified'] = simplified.summary()
+        # Prepared once here, generation and verification take it as it is
+        profile = flipDXFOverX(Profile.fromEntities(simplified.segments))
+
+        start = time.perf_counter()
+        retract = params['retract']
+        programs = generate_programs_from_dxf(profile, params['use_m3_m5'], retract == 'x', retract == 'z', retract == 'xz',
+                                              params['stock_radius'], params['rough_feed'], params['rough_step'],
+                                              params['finish_feed'], params['finish_step'], params['strategy'],
+                                              params['roughing'], params['max_blocks'])
+        result['generate_time'] = time.perf_counter() - start
+
+        # Jobs too long for one program are written as <part>_1.cnc, <part>_2.cnc, ...
+        #   to be run in order
+        base_name = os.path.splitext(os.path.basename(file_path))[0]
+        texts = []
+        for number, program in enumerate(programs, 1):
+            output_path = base_name + (f'_{number}' if len(programs) > 1 else '') + '.cnc'
+            output_path = os.path.join(output_dir or os.path.dirname(file_path), output_path)
+            texts.append(program.render())
+            with default_profiler.stage('write'), open(output_path, 'w') as f:
+                f.write(texts[-1])
+            result['outputs'].append(output_path)
+            result['lines'] += len(program)
+            closure = programClosure(program)
+            if closure != (0, 0):
+                result['warnings'].append(f'{output_path} does not return to its start, off by '
+                                          f'{closure[0]}/{closure[1]} hundredths in X/Z')
+        result['output'] = result['outputs'][0]
+
+        # Backplot the written programs, check them against the profile and
+        #   time them
+        start = time.perf_counter()
+        toolpath = runPrograms(texts)
+        if verify:
+            report = verifyToolpath(toolpath, profile, params['stock_radius'])
+            result['verified'] = report.ok()
+            if not report.ok():
+                result['warnings'].append(f'toolpath check: {report.summary()}')
+        estimate = estimateToolpath(toolpath, params['stock_radius'], params['rapid_rate'])
+        result['backplot_time'] = time.perf_counter() - start
+        result['cycle_time'] = estimate.total()
+        result['cycle'] = estimate.summary()
+        result['passes'] = estimate.table()
+        result['ok'] = True
+    except Exception as e:
+        result['error'] = f'{type(e).__name__}: {e}'
+    if profile:
+        result['profile'] = default_profiler.snapshot()
+        default_profiler.disable()
+    return result
+
+# Generates a file with every stepdown strategy and roughing mode and
+#   estimates each one's cycle time without writing anything
+def compareFile(file_path, params, cache_dir=None, layers=None, streaming=False):
+    result = {'file': file_path, 'ok': False, 'error': None, 'parse_time': 0.0, 'generate_time': 0.0, 'rows': []}
+    try:
+        start = time.perf_counter()
+        default_cache.cache_dir = cache_dir
+        entities = default_cache.get(file_path, layers, streaming)
+        result['parse_time'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        profile = prepareProfile(entities)
+        retract = params['retract']
+        for strategy in STRATEGIES:
+            for roughing in ROUGHING_MODES:
+                programs = generate_programs_from_dxf(profile, params['use_m3_m5'], retract == 'x', retract == 'z', retract == 'xz',
+                                                      params['stock_radius'], params['rough_feed'], params['rough_step'],
+                                                      params['finish_feed'], params['finish_step'], strategy,
+                                                      roughing, params['max_blocks'])
+                estimate = estimateToolpath(runPrograms([program.render() for program in programs]),
+                                            params['stock_radius'], params['rapid_rate'])
+                result['rows'].append({'strategy': strategy, 'roughing': roughing, 'programs': len(programs),
+                                       'blocks': sum(len(program) for program in programs),
+                                       'passes': len(estimate.passes), 'time': estimate.total(),
+                                       'cutting': estimate.feedTime(), 'removed': estimate.removed()})
+        result['generate_time'] = time.perf_counter() - start
+        result['ok'] = True
+    except Exception as e:
+        result['error'] = f'{type(e).__name__}: {e}'
+    return result
+
+# Runs every job on a process pool, or inline when only one worker is requested.
+#   compare runs compareFile instead of converting
+def runJobs(jobs, output_dir, workers, cache_dir=None, layers=None, streaming=False, verify=True, compare=False, profile=None):
+    if compare:
+        function, extra = compareFile, (cache_dir, layers, streaming)
+    else:
+        function, extra = convertFile, (output_dir, cache_dir, layers, streaming, verify, profile)
+    results = []
+    if workers == 1 or len(jobs) <= 1:
+        for file_path, params in jobs:
+            results.append(function(file_path, params, *extra))
+        return results
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(function, file_path, params, *extra) for file_path, params in jobs]
+        for future in futures:
+            results.append(future.result())
+    return results
+
+# Prints one line per file followed by totals
+def printSummary(results, wall_time, show_passes=False, out=sys.stdout):
+    failed = [r for r in results if not r['ok']]
+    for r in results:
+        if r['ok']:
+            chained = f" (+{len(r['outputs']) - 1} chained)" if len(r['outputs']) > 1 else ''
+            out.write(f"ok    {r['file']} -> {r['output']}{chained}  parse {r['parse_time']*1000:.1f} ms"
+                      f"  generate {r['generate_time']*1000:.1f} ms  backplot {r['backplot_time']*1000:.1f} ms"
+                      f"  {r['lines']} lines\n")
+            if r['simplified']:
+                out.write(f"      simplified: {r['simplified']}\n")
+            if r['cycle']:
+                out.write(f"      cycle time: {r['cycle']}\n")
+            for line in r['passes'] if show_passes else []:
+                out.write(f'      {line}\n')
+            for warning in r['warnings']:
+                out.write(f'      warning: {warning}\n')
+        else:
+            out.write(f"FAIL  {r['file']}  {r['error']}\n")
+    parse_total = sum(r['parse_time'] for r in results)
+    generate_total = sum(r['generate_time'] for r in results)
+    cycle_total = sum(r['cycle_time'] or 0 for r in results if r['ok'])
+    out.write(f'{len(results) - len(failed)} converted, {len(failed)} failed in {wall_time:.2f} s'
+              f' (parse {parse_total:.2f} s, generate {generate_total:.2f} s), '
+              f'lathe time {formatDuration(cycle_total)}\n')
+
+# Prints every file's strategy and roughing combinations, fastest first
+def printComparison(results, wall_time, out=sys.stdout):
+    failed = [r for r in results if not r['ok']]
+    for r in results:
+        if not r['ok']:
+            out.write(f"FAIL  {r['file']}  {r['error']}\n")
+            continue
+        out.write(f"{r['file']}\n")
+        out.write(f"      {'strategy':<16} {'roughing':<11} {'passes':>6} {'blocks':>7} {'programs':>8} "
+                  f"{'cutting':>9} {'total':>9}\n")
+        for row in sorted(r['rows'], key=lambda row: row['time']):
+            out.write(f"      {row['strategy']:<16} {row['roughing']:<11} {row['passes']:>6} {row['blocks']:>7} "
+                      f"{row['programs']:>8} {formatDuration(row['cutting']):>9} {formatDuration(row['time']):>9}\n")
+    out.write(f'{len(results) - len(failed)} compared, {len(failed)} failed in {wall_time:.2f} s\n')
+
+# Adds up the per file profiles of convertFile results into one Profiler
+def mergeProfiles(results):
+    profiler = Profiler()
+    for r in results:
+        if r.get('profile'):
+            profiler.merge(r['profile'])
+    return profiler
+
+# Prints the stage timings of every file together
+def printProfile(profiler, out=sys.stdout):
+    out.write('profile, all files:\n')
+    for line in profiler.summary():
+        out.write(f'      {line}\n')
+
+# Writes the merged profile and every file's own to file_path as JSON
+def writeProfile(profiler, results, file_path, wall_time, workers):
+    profiler.writeJson(file_path, wall_time=wall_time, workers=workers,
+                       files={r['file']: r['profile'] for r in results if r.get('profile')})
+
+def buildArgParser():
+    parser = argparse.ArgumentParser(prog='python -m emco.batch',
+                                     description='Convert DXF profiles into Emco 5 GCode without the GUI.')
+    parser.add_argument('inputs', nargs='+', help='DXF files, directories or glob patterns')
+    parser.add_argument('-o', '--output-dir', help='write .cnc files here instead of next to each DXF')
+    parser.add_argument('-m', '--manifest', help='CSV with a "file" column and per-file parameter columns')
+    parser.add_argument('--cache-dir', help='keep parsed geometry here so repeated or unchanged DXFs skip parsing')
+    parser.add_argument('--layer', action='append', dest='layers', help='only use entities on this layer, can be repeated')
+    parser.add_argument('--stream', action='store_true', help='read modelspace entity by entity instead of loading the whole document')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help='number of worker processes')
+    parser.add_argument('--stock-radius', help='stock radius (mm)')
+    parser.add_argument('--rough-feed', help='roughing feedrate (mm/min)')
+    parser.add_argument('--rough-step', help='roughing stepdown (mm), 0 = one pass')
+    parser.add_argument('--finish-feed', help='finishing feedrate (mm/min)')
+    parser.add_argument('--finish-step', help='finishing stepdown (mm)')
+    parser.add_argument('--use-m3-m5', action='store_true', default=None, help='add M03/M05 blocks')
+    parser.add_argument('--retract', choices=RETRACT_MODES, help='retract before start')
+    parser.add_argument('--strategy', choices=STRATEGIES, help='roughing pass stepping, default constant')
+    parser.add_argument('--roughing', choices=ROUGHING_MODES, help='clipped only cuts the parts of each pass inside the stock')
+    parser.add_argument('--rapid-rate', help=f'rapid traverse for cycle time estimates (mm/min, default {RAPID_RATE})')
+    parser.add_argument('--passes', action='store_true', help='print the time and material removed of every pass')
+    parser.add_argument('--compare', action='store_true',
+                        help='estimate the cycle time of every strategy and roughing mode instead of converting')
+    parser.add_argument('--no-verify', dest='verify', action='store_false',
+                        help='skip backplotting the written programs against the profile')
+    parser.add_argument('--profile', action='store_true', help='print the time spent in every pipeline stage')
+    parser.add_argument('--profile-memory', action='store_true',
+                        help='also trace the peak memory of every stage, slows conversion down a lot')
+    parser.add_argument('--profile-json', metavar='PATH', help='write the stage profile to PATH as JSON, implies --profile')
+    parser.add_argument('--max-blocks', help=f'most blocks per program, longer jobs are split into chained programs (default {MAX_BLOCKS})')
+    return parser
+
+def main(argv=None):
+    args = buildArgParser().parse_args(argv)
+    cli_params = normalizeParams({key: getattr(args, key) for key in DEFAULT_PARAMS})
+    manifest = readManifest(args.manifest) if args.manifest else {}
+
+    files = collectInputs(args.inputs)
+    if not files:
+        sys.stderr.write('No DXF files found\n')
+        return 2
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    jobs = []
+    failures = []
+    for file_path in files:
+        try:
+            jobs.append((file_path, resolveParams(file_path, cli_params, manifest)))
+        except Exception as e:
+            failures.append({'file': file_path, 'ok': False, 'error': f'{type(e).__name__}: {e}',
+                             'parse_time': 0.0, 'generate_time': 0.0})
+
+    profile = None
+    if args.profile or args.profile_memory or args.profile_json:
+        profile = 'memory' if args.profile_memory else 'time'
+
+    start = time.perf_counter()
+    results = failures + runJobs(jobs, args.output_dir, max(1, args.jobs), args.cache_dir, args.layers, args.stream,
+                                 args.verify, args.compare, profile)
+    wall_time = time.perf_counter() - start
+    if args.compare:
+        printComparison(results, wall_time)
+    else:
+        printSummary(results, wall_time, args.passes)
+    if profile and not args.compare:
+        profiler = mergeProfiles(results)
+        printProfile(profiler)
+        if args.profile_json:
+            writeProfile(profiler, results, args.profile_json, wall_time, max(1, args.jobs))
+    return 1 if any(not r['ok'] for r in results) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
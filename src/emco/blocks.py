@@ -0,0 +1,357 @@
+# Structured GCode program model
+# Generation appends typed Block objects to a Program instead of formatted
+#   strings. Block numbers are handed out as blocks are added and subroutine
+#   calls point at symbolic labels, so nothing has to be re-scanned or patched.
+#   render() then writes the whole program out in one linear pass, formatting
+#   columns through lookup tables instead of per block format calls
+import io
+import re
+from emco.profiling import timedStage
+
+# Block kinds
+TEXT = 0      # program text that isn't a block, % and the column header
+MOTION = 1    # G00/G01/G02/G03 with incremental X/Z and optional feed
+ARC_CENTER = 2  # M99 I/K arc center following a G02/G03
+MCODE = 3     # M03, M05, M17, M30, M00
+CALL = 4      # G25 subroutine call to a label
+G21 = 5       # blank block for readability
+RAW = 6       # numbered block kept verbatim, read back from program text
+
+COLUMN_HEADER = '    N` G`   X `    Z `  F`  H\n'
+
+# block num space padding logic
+def blockNumPad(blockNum, GcodeTrue):
+    blockNumStr = ""
+    if blockNum < 10:
+        blockNumStr = "    0" + str(blockNum)
+    elif blockNum < 100:
+        blockNumStr = "    " + str(blockNum)
+    else:
+        blockNumStr = "   " + str(blockNum)
+
+    if GcodeTrue:
+        blockNumStr = blockNumStr + " "
+    return blockNumStr
+
+# Formats a move given in integer hundredths of a mm, see emco.fixedpoint
+def formatMove(x, z, gcodeType):
+    x_sign = '-' if x < 0 else ' '
+    z_sign = '-' if z < 0 else ' '
+    return f'{gcodeType[1:]} {x_sign}{abs(x):04} {z_sign}{abs(z):05}'
+
+# Formats feedrate for gcode output
+def formatFeed(feedrate):
+    return f' {feedrate:03}'
+
+# Column text memoized by value. Block numbers the Emco allows are built up
+#   front, move columns fill in the first time a value is seen. Moves repeat a
+#   lot (retracts, passes, subroutine calls) so formatting a block comes down to
+#   a few dict lookups and one concatenation. Tables are bounded by the column
+#   widths, at most 10^4 X and 10^5 Z values each way
+class ColumnTable(dict):
+
+    def __init__(self, format, prefill=()):
+        super().__init__()
+        self.format = format
+        for value in prefill:
+            self[value] = format(value)
+
+    def __missing__(self, value):
+        text = self[value] = self.format(value)
+        return text
+
+# Number column of M blocks and of G blocks, which have a space before the G
+NUMBER_COLUMN = ColumnTable(lambda number: blockNumPad(number, 0), range(1000))
+GCODE_NUMBER_COLUMN = ColumnTable(lambda number: blockNumPad(number, 1), range(1000))
+OPCODE_COLUMN = ColumnTable(lambda opcode: f'{opcode:02}', range(100))
+# Moves in hundredths with the space in front, same as formatMove
+X_COLUMN = ColumnTable(lambda x: f' -{-x:04}' if x < 0 else f'  {x:04}')
+Z_COLUMN = ColumnTable(lambda z: f' -{-z:05}' if z < 0 else f'  {z:05}')
+# Feed column and line end, None for blocks without a feed
+FEED_COLUMN = ColumnTable(lambda feed: '\n' if feed is None else formatFeed(feed) + '\n')
+
+# Formats many G00-G03 blocks at once from columns of block numbers, opcodes,
+#   X/Z moves in hundredths and feeds (None for no feed). Columns can be lists
+#   or NumPy arrays. Returns the lines, byte for byte what Program.write gives
+def formatMoves(numbers, opcodes, xs, zs, feeds=None):
+    columns = []
+    for column in (numbers, opcodes, xs, zs):
+        columns.append(column.tolist() if hasattr(column, 'tolist') else column)
+    numbers, opcodes, xs, zs = columns
+    if feeds is None:
+        feeds = [None] * len(numbers)
+    elif hasattr(feeds, 'tolist'):
+        feeds = feeds.tolist()
+    number_column = GCODE_NUMBER_COLUMN
+    opcode_column = OPCODE_COLUMN
+    x_column = X_COLUMN
+    z_column = Z_COLUMN
+    feed_column = FEED_COLUMN
+    return [number_column[n] + opcode_column[op] + x_column[x] + z_column[z] + feed_column[f]
+            for n, op, x, z, f in zip(numbers, opcodes, xs, zs, feeds)]
+
+class Block:
+    __slots__ = ('kind', 'number', 'opcode', 'x', 'z', 'feed', 'i', 'k', 'target', 'text')
+
+    def __init__(self, kind, opcode=None, x=0, z=0, feed=None, i=0, k=0, target=None, text=None):
+        self.kind = kind
+        # Assigned by Program.add, None for TEXT
+        self.number = None
+        # G code number for MOTION (0-3), M code number for MCODE
+        self.opcode = opcode
+        # Incremental moves in integer hundredths of a mm, machine X then machine Z
+        self.x = x
+        self.z = z
+        self.feed = feed
+        # Arc center offsets for ARC_CENTER, hundredths
+        self.i = i
+        self.k = k
+        # Label a CALL jumps to
+        self.target = target
+        self.text = text
+
+    def __repr__(self):
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__
+                           if getattr(self, name) is not None and name != 'kind')
+        return f'Block({self.kind}, {fields})'
+
+class Program:
+
+    def __init__(self, blockNum=0):
+        self.blocks = []
+        # Label name -> the block added after label() was called. Calls look the
+        #   number up when written so renumbering never has to touch them
+        self.labels = {}
+        self.start = blockNum
+        self.blockNum = blockNum
+        self._pending_labels = []
+
+    def add(self, block):
+        if block.kind != TEXT:
+            block.number = self.blockNum
+            self.blockNum += 1
+            for name in self._pending_labels:
+                self.labels[name] = block
+            self._pending_labels = []
+        self.blocks.append(block)
+        return block
+
+    # Names the next block added so CALL blocks can jump to it
+    def label(self, name):
+        self._pending_labels.append(name)
+
+    def text(self, text):
+        return self.add(Block(TEXT, text=text))
+
+    def motion(self, opcode, x, z, feed=None):
+        return self.add(Block(MOTION, opcode, x, z, feed))
+
+    def arcCenter(self, i, k):
+        return self.add(Block(ARC_CENTER, i=i, k=k))
+
+    def mcode(self, opcode):
+        return self.add(Block(MCODE, opcode))
+
+    def call(self, target):
+        return self.add(Block(CALL, 25, target=target))
+
+    def blank(self):
+        return self.add(Block(G21, 21))
+
+    # Applies any number of edits in one pass and renumbers once, so editing a
+    #   long program stays O(n). insert maps a block index to a list of blocks
+    #   placed before it, len(self) appends. delete is a set of block indexes.
+    #   Labels on a deleted block move to the next block that is kept
+    def edit(self, insert=None, delete=()):
+        insert = insert or {}
+        for index in insert:
+            if not 0 <= index <= len(self.blocks):
+                raise IndexError(f'block index {index} out of range')
+        delete = set(delete)
+        moved = {}
+        for name, block in self.labels.items():
+            moved.setdefault(id(block), []).append(name)
+
+        blocks = []
+        orphans = []
+        for index, block in enumerate(self.blocks):
+            blocks.extend(insert.get(index, ()))
+            names = moved.get(id(block), ())
+            if index in delete:
+                orphans.extend(names)
+                continue
+            if orphans and block.kind != TEXT:
+                for name in orphans:
+                    self.labels[name] = block
+                orphans = []
+            blocks.append(block)
+        blocks.extend(insert.get(len(self.blocks), ()))
+        for name in orphans:
+            del self.labels[name]
+
+        self.blocks = blocks
+        self.renumber()
+        return self
+
+    # Hands out block numbers again from the program start
+    def renumber(self):
+        number = self.start
+        for block in self.blocks:
+            if block.kind != TEXT:
+                block.number = number
+                number += 1
+        self.blockNum = number
+
+    # Block number -> index in blocks, for turning editor positions into indexes
+    def indexByNumber(self):
+        return {block.number: index for index, block in enumerate(self.blocks) if block.kind != TEXT}
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def __iter__(self):
+        return iter(self.blocks)
+
+    # Writes every block to out, a file or io.StringIO. feeds optionally maps
+    #   symbolic feed values to real ones when rendering
+    def write(self, out, feeds=None):
+        out.write(''.join(self.formatLines(feeds)))
+
+    # Every block as a line of text, see the column tables above
+    @timedStage('Program.formatLines')
+    def formatLines(self, feeds=None):
+        labels = self.labels
+        number_column = NUMBER_COLUMN
+        gcode_number_column = GCODE_NUMBER_COLUMN
+        opcode_column = OPCODE_COLUMN
+        x_column = X_COLUMN
+        z_column = Z_COLUMN
+        feed_column = FEED_COLUMN
+        lines = []
+        append = lines.append
+        for block in self.blocks:
+            kind = block.kind
+            if kind == MOTION:
+                feed = block.feed
+                if feeds is not None and feed in feeds:
+                    feed = feeds[feed]
+                append(gcode_number_column[block.number] + opcode_column[block.opcode] +
+                       x_column[block.x] + z_column[block.z] + feed_column[feed])
+            elif kind == ARC_CENTER:
+                append(f'{number_column[block.number]}M99 I{abs(block.i):04} K{abs(block.k):05}\n')
+            elif kind == MCODE:
+                append(f'{number_column[block.number]}M{block.opcode:02}\n')
+            elif kind == CALL:
+                append(f'{gcode_number_column[block.number]}25             L{labels[block.target].number:03}\n')
+            elif kind == G21:
+                append(f'{gcode_number_column[block.number]}21\n')
+            elif kind == RAW:
+                append(number_column[block.number] + block.text)
+            else:
+                append(block.text)
+        return lines
+
+    def render(self, feeds=None):
+        out = io.StringIO()
+        self.write(out, feeds)
+        return out.getvalue()
+
+    # Rendered program as a list of lines, the old generate_gcode_from_dxf output
+    def lines(self, feeds=None):
+        return ''.join(self.formatLines(feeds)).splitlines(keepends=True)
+
+# G25 subroutine call as written by Program.write
+CALL_PATTERN = re.compile(r' 25 +L(\d+)\s*$')
+
+# Reads program text back into a Program so it can be edited structurally.
+#   Numbered lines are kept verbatim as RAW blocks except G25 calls, which are
+#   tied to the block they jump to so their L target follows renumbering
+def parseProgram(text):
+    program = Program()
+    numbered = {}
+    calls = []
+    for line in text.splitlines(keepends=True):
+        head = line[:6]
+        if not head.strip().isdigit():
+            program.text(line)
+            continue
+        if not numbered:
+            program.start = program.blockNum = int(head)
+        number = int(head)
+        match = CALL_PATTERN.match(line[6:])
+        if match:
+            block = program.add(Block(CALL, 25, target=int(match.group(1)), text=line[6:]))
+            calls.append(block)
+        else:
+            block = program.add(Block(RAW, text=line[6:]))
+        # Keep the number from the text so calls resolve even if it was edited
+        block.number = number
+        numbered.setdefault(number, block)
+
+    for block in calls:
+        target = numbered.get(block.target)
+        if target is None:
+            # Jumps outside the program, leave the line as it was
+            block.kind = RAW
+            continue
+        name = f'L{block.target:03}'
+        program.labels[name] = target
+        block.target = name
+    program.renumber()
+    return program
+
+# Splits editor text holding several chained programs back into one text per
+#   program, each starts at its % line
+def splitProgramText(text):
+    programs = []
+    for line in text.splitlines(keepends=True):
+        if line.rstrip('\n') == '%' or not programs:
+            programs.append([])
+        programs[-1].append(line)
+    return [''.join(lines) for lines in programs]
+
+# Columns of a numbered block line, as written by Program.write. Lines that
+#   were edited by hand only match as far as they still look like a block
+BLOCK_LINE = re.compile(r'(?P<number> *\d+)(?:(?P<mcode>M\d+)(?P<i> +I\d+)?(?P<k> +K\d+)?'
+                        r'| (?P<gcode>\d\d)(?P<x> +-?\d+)?(?P<z> +-?\d+)?(?P<feed> +\d+)?(?P<label> +L\d+)?)?')
+SPAN_COLUMNS = ('number', 'gcode', 'mcode', 'x', 'z', 'feed', 'i', 'k', 'label')
+
+# Column spans of one program line for syntax highlighting, a list of
+#   (start, length, column) with column from SPAN_COLUMNS. Lines that aren't
+#   numbered blocks, %, the column header and M, have none
+def blockSpans(line):
+    match = BLOCK_LINE.match(line)
+    if match is None:
+        return []
+    spans = []
+    for column in SPAN_COLUMNS:
+        start, end = match.span(column)
+        if start < 0:
+            continue
+        # Columns are separated by spaces, the span starts at the value
+        start = end - len(line[start:end].lstrip())
+        spans.append((start, end - start, column))
+    return spans
+
+# Range of lines that differ between two lists of lines, so an editor can
+#   replace just that part of its document. Returns (first, old_stop,
+#   new_stop): old_lines[first:old_stop] become new_lines[first:new_stop].
+#   Both ranges hold at least one line, so the change is always a replacement.
+#   None when the lines are the same
+def changedLines(old_lines, new_lines):
+    if old_lines == new_lines:
+        return None
+    limit = min(len(old_lines), len(new_lines))
+    first = 0
+    while first < limit and old_lines[first] == new_lines[first]:
+        first += 1
+    last = 0
+    while last < limit - first and old_lines[-1 - last] == new_lines[-1 - last]:
+        last += 1
+    # Take in an unchanged neighbour when one side would be empty
+    if first + last == limit:
+        if first > 0:
+            first -= 1
+        else:
+            last -= 1
+    return first, len(old_lines) - last, len(new_lines) - last
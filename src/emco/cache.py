@@ -0,0 +1,118 @@
+# Parsed geometry cache so regenerating GCode doesn't re-read the DXF
+# Entries are keyed on the file content hash. The hash itself is remembered per
+#   path + mtime + size so unchanged files are never re-read or re-hashed
+import collections
+import hashlib
+import json
+import os
+from emco.core import parse_dxf_file, parse_dxf_file_streaming
+
+# Bump when the parsed entity layout changes so stale disk entries are ignored
+CACHE_VERSION = 2
+
+# Keys that hold a point tuple, JSON turns these into lists
+POINT_KEYS = ('start_point', 'end_point', 'center_point')
+
+# Copies entities so callers can flip/sort them without touching the cache
+def copyEntities(entities):
+    return [dict(entity) for entity in entities]
+
+# Restores tuples lost when entities went through JSON
+def entitiesFromJson(entities):
+    for entity in entities:
+        for key in POINT_KEYS:
+            if key in entity:
+                entity[key] = tuple(entity[key])
+        if 'vertices' in entity:
+            entity['vertices'] = [tuple(vertex) for vertex in entity['vertices']]
+    return entities
+
+class ParsedDXFCache:
+
+    def __init__(self, max_entries=32, cache_dir=None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._hashes = {}
+
+    # Returns the content hash of a file, only re-hashing when mtime or size changed
+    def fileHash(self, file_path):
+        file_path = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        known = self._hashes.get(file_path)
+        if known is not None and known[0] == stat.st_mtime_ns and known[1] == stat.st_size:
+            return known[2]
+        with open(file_path, 'rb') as f:
+            digest = hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+        self._hashes[file_path] = (stat.st_mtime_ns, stat.st_size, digest)
+        return digest
+
+    # Returns a private copy of the parsed entities for file_path
+    #   layers filters entities by layer name and is part of the cache key,
+    #   streaming only changes how a miss is parsed since both readers agree
+    def get(self, file_path, layers=None, streaming=False):
+        digest = self.fileHash(file_path)
+        if layers:
+            layers = sorted(set(layers))
+            digest = digest + '-' + hashlib.blake2b('\0'.join(layers).encode(), digest_size=4).hexdigest()
+        entities = self._entries.get(digest)
+        if entities is not None:
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return copyEntities(entities)
+
+        self.misses += 1
+        entities = self._readDisk(digest)
+        if entities is None:
+            parser = parse_dxf_file_streaming if streaming else parse_dxf_file
+            entities = parser(file_path, layers)
+            self._writeDisk(digest, entities)
+        self._store(digest, entities)
+        return copyEntities(entities)
+
+    def clear(self):
+        self._entries.clear()
+        self._hashes.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def _store(self, digest, entities):
+        self._entries[digest] = copyEntities(entities)
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _diskPath(self, digest):
+        return os.path.join(self.cache_dir, f'{digest}.json')
+
+    def _readDisk(self, digest):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._diskPath(digest)) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('version') != CACHE_VERSION:
+            return None
+        return entitiesFromJson(data['entities'])
+
+    # Writes to a temp file first so parallel batch workers never see half an entry
+    def _writeDisk(self, digest, entities):
+        if not self.cache_dir:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._diskPath(digest)
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({'version': CACHE_VERSION, 'entities': entities}, f, separators=(',', ':'))
+        os.replace(temp_path, path)
+
+# Shared in-memory cache used by the GUI and batch workers
+default_cache = ParsedDXFCache()
+
+# Drop in replacement for parse_dxf_file that goes through the default cache
+def parse_dxf_file_cached(file_path, layers=None, streaming=False):
+    return default_cache.get(file_path, layers, streaming)
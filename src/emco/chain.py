@@ -0,0 +1,158 @@
+# Chains parsed DXF segments into one continuous profile
+# Endpoints go into a grid hash with cells the size of the snap tolerance so
+#   each lookup only checks the 3x3 cells around a point. That keeps chaining
+#   O(n) and lets endpoints that differ by CAD floating noise still connect.
+#   Segments drawn backwards are reversed, and gaps or branches in the profile
+#   are reported instead of silently truncating the chain
+import math
+from emco.profiling import timedStage
+
+# Emco 5 resolution, endpoints closer than this are the same point
+DEFAULT_TOLERANCE = 0.01
+
+class ChainResult:
+    __slots__ = ('segments', 'gaps', 'branches', 'unused', 'reversed_count')
+
+    def __init__(self):
+        # Segments in cutting order, starting at X0
+        self.segments = []
+        # (chain end point, nearest unused endpoint, distance) when the chain stops early
+        self.gaps = []
+        # (point, number of candidate segments) wherever more than one segment continues
+        self.branches = []
+        # Segments that never made it into the chain
+        self.unused = []
+        self.reversed_count = 0
+
+    def warnings(self):
+        messages = []
+        for end_point, nearest, distance in self.gaps:
+            messages.append(f'profile stops at {end_point} with {len(self.unused)} segments unused, '
+                            f'nearest is {distance:.3f} mm away at {nearest}')
+        for point, count in self.branches:
+            messages.append(f'{count} segments continue from {point}, took the first')
+        return messages
+
+# Start and end point of any parsed entity, polylines use their outer vertices
+def segmentEnds(entity):
+    if entity['type'] == 'POLYLINE':
+        return entity['vertices'][0], entity['vertices'][-1]
+    return entity['start_point'], entity['end_point']
+
+# Returns a copy of entity running the other way
+def reverseSegment(entity):
+    entity = dict(entity)
+    if entity['type'] == 'POLYLINE':
+        entity['vertices'] = list(reversed(entity['vertices']))
+        return entity
+    entity['start_point'], entity['end_point'] = entity['end_point'], entity['start_point']
+    if 'direction' in entity:
+        entity['direction'] = "ccw" if entity['direction'] == "cw" else "cw"
+    return entity
+
+# Moves the start of entity onto point so noise doesn't carry into the next move
+def snapStart(entity, point):
+    if segmentEnds(entity)[0] == point:
+        return entity
+    entity = dict(entity)
+    if entity['type'] == 'POLYLINE':
+        entity['vertices'] = [point] + list(entity['vertices'][1:])
+    else:
+        entity['start_point'] = point
+    return entity
+
+class EndpointGrid:
+
+    def __init__(self, tolerance):
+        self.tolerance = tolerance
+        # Cells a hair wider than tolerance, so float noise like 16.92 * 100 =
+        #   1692.0000000000002 can't put points within tolerance two cells apart
+        self.scale = 1.0 / (tolerance * (1 + 1e-9))
+        self.cells = {}
+
+    def cell(self, point):
+        return (math.floor(point[0] * self.scale), math.floor(point[1] * self.scale))
+
+    def add(self, point, item):
+        self.cells.setdefault(self.cell(point), []).append((point, item))
+
+    # Items whose point is within tolerance of point
+    def near(self, point):
+        cx, cy = self.cell(point)
+        # Rounded points a hundredth apart are 0.010000000000000009 apart in
+        #   floating point, which still counts as within 0.01
+        limit = self.tolerance * self.tolerance + 1e-12
+        found = []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for other, item in self.cells.get((cx + dx, cy + dy), ()):
+                    if (other[0] - point[0]) ** 2 + (other[1] - point[1]) ** 2 <= limit:
+                        found.append(item)
+        return found
+
+# Picks the segment that starts the cut, one touching X0. Segments drawn from
+#   X0 are preferred over ones that end there and would need reversing
+def findStart(parsed_data, tolerance):
+    for index, entity in enumerate(parsed_data):
+        if abs(segmentEnds(entity)[0][0]) <= tolerance:
+            return index, False
+    for index, entity in enumerate(parsed_data):
+        if abs(segmentEnds(entity)[1][0]) <= tolerance:
+            return index, True
+    return None, False
+
+# Orders parsed entities head to tail starting from X0
+@timedStage('chainSegments')
+def chainSegments(parsed_data, tolerance=DEFAULT_TOLERANCE):
+    result = ChainResult()
+    start_index, start_reversed = findStart(parsed_data, tolerance)
+    if start_index is None:
+        raise ValueError('No profile segment starts at X0')
+
+    grid = EndpointGrid(tolerance)
+    for index, entity in enumerate(parsed_data):
+        start_point, end_point = segmentEnds(entity)
+        grid.add(start_point, (index, False))
+        grid.add(end_point, (index, True))
+
+    used = [False] * len(parsed_data)
+    entity = parsed_data[start_index]
+    if start_reversed:
+        entity = reverseSegment(entity)
+        result.reversed_count += 1
+    entity = snapStart(entity, (0.0, segmentEnds(entity)[0][1]))
+    used[start_index] = True
+    result.segments.append(entity)
+    endpoint = segmentEnds(entity)[1]
+
+    while True:
+        # Unused segments touching the current end, unreversed ones first
+        candidates = [item for item in grid.near(endpoint) if not used[item[0]]]
+        if not candidates:
+            break
+        candidates.sort(key=lambda item: item[1])
+        if len({index for index, _ in candidates}) > 1:
+            result.branches.append((endpoint, len({index for index, _ in candidates})))
+
+        index, matched_end = candidates[0]
+        entity = parsed_data[index]
+        if matched_end:
+            entity = reverseSegment(entity)
+            result.reversed_count += 1
+        used[index] = True
+        entity = snapStart(entity, endpoint)
+        result.segments.append(entity)
+        endpoint = segmentEnds(entity)[1]
+
+    result.unused = [entity for index, entity in enumerate(parsed_data) if not used[index]]
+    if result.unused:
+        nearest = None
+        nearest_distance = float('inf')
+        for entity in result.unused:
+            for point in segmentEnds(entity):
+                distance = math.hypot(point[0] - endpoint[0], point[1] - endpoint[1])
+                if distance < nearest_distance:
+                    nearest = point
+                    nearest_distance = distance
+        result.gaps.append((endpoint, nearest, nearest_distance))
+    return result
@@ -0,0 +1,532 @@
+# Required imports
+# ezdxf is imported when a file is read, see loadDXFReader
+import math
+from emco.profile import Profile, LINE, ARC
+from emco.chain import chainSegments, DEFAULT_TOLERANCE
+from emco.passplan import planPasses
+from emco.roughing import clipBelow
+from emco.fitting import splitQuadrants, fitPoints, flattenCurve, polylineEntities
+from emco.simplify import simplifySegments
+from emco.fixedpoint import toHundredths
+from emco.blocks import Program, COLUMN_HEADER
+from emco.profiling import timedStage, count
+
+# Entity types that make up the profile, everything else in the drawing is ignored
+PROFILE_ENTITY_TYPES = ('LINE', 'ARC', 'LWPOLYLINE', 'SPLINE', 'ELLIPSE')
+
+# Converts one ezdxf entity into the list of parsed dicts used by the rest of
+#   the pipeline, empty for entities that aren't part of the profile. Arcs are
+#   split at quadrants and curves are fitted into lines and arcs, see emco.fitting
+def parseEntity(entity):
+    if entity.dxftype() == 'LINE':
+        start_point = entity.dxf.start
+        end_point = entity.dxf.end
+        return [{
+            'type': 'LINE',
+            'start_point': (round(start_point.x,2), round(start_point.y,2)),
+            'end_point': (round(end_point.x,2), round(end_point.y,2))
+        }]
+    elif entity.dxftype() == 'ARC':
+        center = entity.dxf.center
+        radius = entity.dxf.radius
+        start_angle = entity.dxf.start_angle
+        end_angle = entity.dxf.end_angle
+        
+        # Calculate the start and end points
+        start_angle_rad = math.radians(start_angle)
+        end_angle_rad = math.radians(end_angle)
+        start_x = center.x + radius * math.cos(start_angle_rad)
+        start_y = center.y + radius * math.sin(start_angle_rad)
+
+        end_x = center.x + radius * math.cos(end_angle_rad)
+        end_y = center.y + radius * math.sin(end_angle_rad)
+        
+        # Ensure start and end points are in order and calculate arc direction
+        #   for g02 g03. DXF arcs always run counterclockwise from start to end
+        #   angle, even when the end angle is numerically smaller because it
+        #   crosses 0, which the lathe calls "cw". Swapping the ends reverses it
+        start_point = (round(start_x,2), round(start_y,2))
+        end_point = (round(end_x,2), round(end_y,2))
+        direction = "cw"
+        if round(start_x,2) < round(end_x,2):
+            start_point, end_point = end_point, start_point
+            direction = "ccw"
+
+        return splitQuadrants({
+                'type': 'ARC',
+                'center_point': (round(center.x,2), round(center.y,2)),
+                'radius': round(radius,2),
+                'start_angle': round(start_angle,2),
+                'end_angle': round(end_angle,2),
+                'start_point': start_point,
+                'end_point': end_point,
+                'direction': direction
+            })
+    elif entity.dxftype() == 'LWPOLYLINE':
+        return polylineEntities(entity)
+    elif entity.dxftype() in ('SPLINE', 'ELLIPSE'):
+        return fitPoints(flattenCurve(entity))
+    return []
+
+# ezdxf is most of the time it takes to import the converter, so it's only
+#   imported when a file is read. The GUI calls this on its worker thread
+#   once the window is up so the first open doesn't wait for it either
+def loadDXFReader():
+    import ezdxf
+    return ezdxf
+
+# Parses input file to extract entities relative to gcode
+#   layers optionally limits parsing to entities on the given layer names
+@timedStage('parse_dxf_file')
+def parse_dxf_file(file_path, layers=None):
+    parsed_data = []
+    doc = loadDXFReader().readfile(file_path)
+    for entity in doc.modelspace():
+        if layers and entity.dxf.layer not in layers:
+            continue
+        parsed_data.extend(parseEntity(entity))
+
+    count('entities', len(parsed_data))
+    return parsed_data
+
+# Yields profile entities from modelspace one at a time without building the
+#   document model. Tables, blocks, layouts and non profile entities are skipped
+#   so memory stays bounded by the largest single entity
+def iter_dxf_entities(file_path, layers=None):
+    from ezdxf.addons import iterdxf
+    for entity in iterdxf.modelspace(file_path, types=PROFILE_ENTITY_TYPES):
+        if layers and entity.dxf.layer not in layers:
+            continue
+        yield from parseEntity(entity)
+
+# Streaming version of parse_dxf_file for large drawings, same output
+@timedStage('parse_dxf_file_streaming')
+def parse_dxf_file_streaming(file_path, layers=None):
+    parsed_data = list(iter_dxf_entities(file_path, layers))
+    count('entities', len(parsed_data))
+    return parsed_data
+
+# Adjusts x coordinate based on stock radius, Lathe Z axis in implementation
+def compX(xcoordinate, stockRadius):
+    return xcoordinate - stockRadius
+
+# Sorts data being parsed from DXF so lines are in consecutive order
+# Lines are in order starting from Z0 which should be where the 
+#   start of the cut occurs. Endpoints within tolerance are treated as
+#   connected and backwards segments are reversed, see emco.chain
+@timedStage('sortParsedData')
+def sortParsedData(parsed_data, tolerance=DEFAULT_TOLERANCE):
+    return chainSegments(parsed_data, tolerance).segments
+
+# FLips a DXF file over the x azis (machine z) so that you can draw in the 
+#   positive or negative y axis
+@timedStage('flipDXFOverX')
+def flipDXFOverX(parsed_data):
+    if isinstance(parsed_data, Profile):
+        return parsed_data.flipOverX()
+
+    if parsed_data[0]['start_point'][1] < 0 :
+        for item in parsed_data:
+            # flip start point y
+            if 'start_point' in item:
+                item['start_point'] = (item['start_point'][0], abs(item['start_point'][1]))
+
+            # flip end point y 
+            if 'end_point' in item:
+                item['end_point'] = (item['end_point'][0], abs(item['end_point'][1]))
+
+            # flip center point if arc
+            if 'center_point' in item:
+                item['center_point'] = (item['center_point'][0],abs(item['center_point'][1]))
+                
+#             # change start angle if arc
+#             if 'start_angle' in item:
+#                 # do nothing?
+                
+#             # change end angle if arc
+#             if 'end_angle' in item:
+#                 # do nothing?
+                
+            # change direction if arc
+            if 'direction' in item:
+                if item['direction'] == "cw":
+                    item['direction'] = "ccw"
+                else:
+                    item['direction'] = "cw"
+                    
+    return parsed_data
+
+# Adds final blocks to gcode. Included M30, M5
+def addFinishingBlocks(program, isUseM3M5Checked):
+    # ending blocks
+    if isUseM3M5Checked:
+        program.mcode(5)
+
+    # File end
+    program.mcode(30)
+    return program
+
+# Adds starting bocks. Includes retract, M3
+def addStartingBlocks(program, isUseM3M5Checked, isStartRetractXChecked, isStartRetractZChecked, isStartRetractXZChecked):
+    # Check if using m3/m5
+    def usingM3M5():
+        if isUseM3M5Checked:
+            program.mcode(3)
+    
+    # Check stating retracts
+    if isStartRetractXChecked:
+        # The "Retract before start in X" checkbox is checked
+        program.motion(0, 50, 0)
+        usingM3M5()
+        program.motion(0, -50, 0)
+    elif isStartRetractZChecked:
+        # The "Retract before start in Z" checkbox is checked
+        program.motion(0, 0, 50)
+        usingM3M5()
+        program.motion(0, 0, -50)
+    elif isStartRetractXZChecked:
+        # The "Retract before start in X and Z" checkbox is checked
+        program.motion(0, 50, 50)
+        usingM3M5()
+        program.motion(0, -50, -50)
+    else:
+        usingM3M5()
+        
+    return program
+
+# Returns the smallest y value of the parsed data. Machine X axis
+def find_smallest_y(parsed_data):
+    if isinstance(parsed_data, Profile):
+        return parsed_data.smallestY()
+
+    # Initialize with a large value to ensure any Y coordinate is smaller
+    smallest_y = float('inf')
+
+    for entity in parsed_data:
+        if 'start_point' in entity:
+            smallest_y = min(smallest_y, entity['start_point'][1])
+        if 'end_point' in entity:
+            smallest_y = min(smallest_y, entity['end_point'][1])
+        # Add similar checks for other entity types, e.g., 'center_point' for arcs
+
+    return smallest_y
+
+# Adds final blocks to gcode. Included retract, M30, M5
+#   current_x and current_y are the machine position in hundredths
+def addRetract(program, current_x, current_y):
+    # final retract to beginning of cut
+    program.motion(0, -current_x, 0)
+    program.motion(0, 0, -current_y)
+    return program
+
+# Block numbers are three digits, so one program holds at most 1000 blocks.
+#   Use a smaller limit to fit the control's program memory
+MAX_BLOCKS = 1000
+
+# Label of the roughing subroutine that the G25 calls jump to
+ROUGHING_SUBROUTINE = 'roughing'
+
+# Machine position in hundredths of a sketch point, see compX
+def machineHundredths(point, stockRadius):
+    return toHundredths(point[1]) - toHundredths(stockRadius), toHundredths(point[0])
+
+# Creates toolpath gcode calls
+#   current_x and current_y are the machine position in hundredths the first
+#   move starts from. Moves are differences of rounded absolute positions so
+#   they add up exactly however long the profile is, see emco.fixedpoint
+def createToolpath(program, parsed_data, current_x, current_y, stockRadius, roughFeed, finishFeed, isRoughing):
+    # generate subroutine gcode blocks
+    if isRoughing == 0:
+        roughFeed = finishFeed
+
+    # Incremental moves for every segment in one pass over the profile arrays
+    profile = Profile.fromEntities(parsed_data)
+    moves_x, moves_y = profile.moveHundredths(current_x, current_y, stockRadius)
+    moves_x = moves_x.tolist()
+    moves_y = moves_y.tolist()
+    centers_i, centers_k = profile.arcCenterHundredths()
+    ends_x, ends_y = profile.machineHundredths(stockRadius)
+        
+    for i, entity in enumerate(profile):
+        kind = profile.kind[i]
+        if kind == LINE:
+            program.motion(1, moves_x[i], moves_y[i], roughFeed)
+        elif kind == ARC:
+            # First block G02 for ccw and G03 for cw, then M99 with the
+            #   relative distance to the center
+            if entity['direction'] == "ccw":
+                program.motion(2, moves_x[i], moves_y[i], roughFeed)
+            else:
+                program.motion(3, moves_x[i], moves_y[i], roughFeed)
+            program.arcCenter(int(centers_i[i]), int(centers_k[i]))
+        else:
+            for vertex in entity['vertices']:
+                vertex_x, vertex_y = machineHundredths(vertex, stockRadius)
+                program.motion(1, vertex_x - current_x, vertex_y - current_y, roughFeed)
+                current_x, current_y = vertex_x, vertex_y
+        current_x, current_y = int(ends_x[i]), int(ends_y[i])
+            
+    # Insert final M17 sub return
+    if isRoughing:
+        program.mcode(17)
+        
+    return program
+        
+# Adds one roughing pass that only follows the parts of the profile inside the
+#   stock. Between cutting runs the tool rapids along the stock surface (X0)
+def addClippedPass(program, parsed_data, startXOffset, stockRadius, feed):
+    passRadius = stockRadius - startXOffset
+    current_z = 0
+    for run in clipBelow(parsed_data, passRadius):
+        plunge, start_z = machineHundredths(run[0]['start_point'], passRadius)
+
+        # Rapid along the stock surface to the start of the run
+        if start_z != current_z:
+            program.motion(0, 0, start_z - current_z)
+
+        # Feed in when the run starts below the stock surface
+        if plunge != 0:
+            program.motion(1, plunge, 0, feed)
+
+        # Cut the run with the profile shifted out to this pass
+        createToolpath(program, run, plunge, start_z, passRadius, feed, feed, 0)
+
+        # Back out to the stock surface
+        end_x, end_z = machineHundredths(run[-1]['end_point'], passRadius)
+        if end_x != 0:
+            program.motion(0, -end_x, 0)
+        current_z = end_z
+
+    # Return to Z0
+    if current_z != 0:
+        program.motion(0, 0, -current_z)
+    return program
+
+# Parses DXF data into Emco supported GCode
+#   strategy picks how roughing passes are stepped, see emco.passplan
+#   roughing is "subroutine" to call the full profile every pass or "clipped"
+#   to only cut the parts of each pass that are inside the stock, see emco.roughing
+@timedStage('generate_gcode_from_dxf')
+def generate_gcode_from_dxf(parsed_data, isUseM3M5Checked, isStartRetractXChecked,isStartRetractZChecked, isStartRetractXZChecked, stockRadius, roughFeed, roughStep, finishFeed, finishStep, strategy='constant', roughing='subroutine'):
+    program = generate_program_from_dxf(parsed_data, isUseM3M5Checked, isStartRetractXChecked, isStartRetractZChecked, isStartRetractXZChecked, stockRadius, roughFeed, roughStep, finishFeed, finishStep, strategy, roughing)
+    return program.lines()
+
+# Same as generate_gcode_from_dxf but split into chained programs of at most
+#   max_blocks blocks each, see splitProgram. Returns a list of Programs
+@timedStage('generate_programs_from_dxf')
+def generate_programs_from_dxf(parsed_data, isUseM3M5Checked, isStartRetractXChecked,isStartRetractZChecked, isStartRetractXZChecked, stockRadius, roughFeed, roughStep, finishFeed, finishStep, strategy='constant', roughing='subroutine', max_blocks=MAX_BLOCKS):
+    parsed_data = prepareProfile(parsed_data)
+    plan = planProfilePasses(parsed_data, stockRadius, roughStep, finishStep, strategy)
+    header = lambda: generateHeader(isUseM3M5Checked, isStartRetractXChecked, isStartRetractZChecked, isStartRetractXZChecked)
+    return splitProgram(header, parsed_data, plan, isUseM3M5Checked, stockRadius, roughFeed, finishFeed, roughing, max_blocks)
+
+# Splits a job that doesn't fit in one program. Every chunk is a complete
+#   program with the starting blocks, a run of roughing passes and M30, so they
+#   can be loaded and run one after the other. Chunks with subroutine roughing
+#   passes carry their own copy of the roughing subroutine. The finish pass
+#   goes in the last chunk, or in a chunk of its own when it doesn't fit beside
+#   the subroutine. makeHeader returns a new Program holding the starting blocks
+@timedStage('splitProgram')
+def splitProgram(makeHeader, parsed_data, plan, isUseM3M5Checked, stockRadius, roughFeed, finishFeed, roughing='subroutine', max_blocks=MAX_BLOCKS):
+    def chunk(start, stop, finish, subroutine):
+        return addProgramBody(makeHeader(), parsed_data, plan.slice(start, stop, finish), isUseM3M5Checked, stockRadius, roughFeed, finishFeed, roughing, subroutine)
+
+    whole = chunk(0, len(plan), plan.finish, True)
+    if whole.blockNum - whole.start <= max_blocks:
+        countBlocks([whole])
+        return [whole]
+
+    # Blocks of a chunk without passes, what the finish pass adds to it, and
+    #   the blocks every chunk of roughing passes needs
+    bare = chunk(0, 0, False, False).blockNum
+    finish_blocks = chunk(0, 0, plan.finish, False).blockNum - bare
+    if bare + finish_blocks > max_blocks:
+        raise ValueError(f'The profile needs {bare + finish_blocks} blocks without any roughing passes, '
+                         f'more than the {max_blocks} that fit in one program')
+    overhead = chunk(0, 0, False, True).blockNum
+
+    # Pack passes greedily, a pass never straddles two programs
+    bounds = []
+    start = 0
+    used = overhead
+    for index, startXOffset in enumerate(plan.offsets.tolist()):
+        cost = addRoughingPass(Program(), parsed_data, startXOffset, stockRadius, roughFeed, roughing).blockNum
+        if overhead + cost > max_blocks:
+            raise ValueError(f'Roughing pass {index + 1} needs {cost} blocks, more than fit in one program')
+        if used + cost > max_blocks:
+            bounds.append((start, index))
+            start = index
+            used = overhead
+        used += cost
+    # The finish pass gets its own chunk when it doesn't fit in the last one
+    if len(plan) and used + finish_blocks > max_blocks:
+        bounds.append((start, len(plan)))
+        start = len(plan)
+    bounds.append((start, len(plan)))
+
+    programs = [chunk(a, b, plan.finish and i == len(bounds) - 1, b > a) for i, (a, b) in enumerate(bounds)]
+    countBlocks(programs)
+    return programs
+
+# Same as generate_gcode_from_dxf but returns the structured Program, see emco.blocks
+@timedStage('generate_program_from_dxf')
+def generate_program_from_dxf(parsed_data, isUseM3M5Checked, isStartRetractXChecked,isStartRetractZChecked, isStartRetractXZChecked, stockRadius, roughFeed, roughStep, finishFeed, finishStep, strategy='constant', roughing='subroutine'):
+    if (finishFeed == ""):
+        finishFeed == roughFeed
+    
+    # starting blocks
+    program = generateHeader(isUseM3M5Checked, isStartRetractXChecked, isStartRetractZChecked, isStartRetractXZChecked)
+
+    # Calculate stepovers
+    parsed_data = prepareProfile(parsed_data)
+
+    # Calculate every pass offset up front
+    plan = planProfilePasses(parsed_data, stockRadius, roughStep, finishStep, strategy)
+
+    program = addProgramBody(program, parsed_data, plan, isUseM3M5Checked, stockRadius, roughFeed, finishFeed, roughing)
+    countBlocks([program])
+    return program
+
+# Counts the emitted programs and blocks for the profiler, see emco.profiling
+def countBlocks(programs):
+    count('programs', len(programs))
+    count('blocks', sum(program.blockNum - program.start for program in programs))
+
+# Program start, % and column header followed by the start retracts and M03
+def generateHeader(isUseM3M5Checked, isStartRetractXChecked, isStartRetractZChecked, isStartRetractXZChecked):
+    program = Program()
+    program.text('%\n')
+    program.text(COLUMN_HEADER)
+    return addStartingBlocks(program, isUseM3M5Checked, isStartRetractXChecked, isStartRetractZChecked, isStartRetractXZChecked)
+
+# Sorts, simplifies and flips parsed data into the Profile that gets cut.
+#   Simplifying drops zero length moves and merges collinear lines and
+#   touching arcs, see emco.simplify. A Profile is taken as already prepared,
+#   so callers that prepare once can pass it to generation and verification
+@timedStage('prepareProfile')
+def prepareProfile(parsed_data):
+    if isinstance(parsed_data, Profile):
+        return parsed_data
+    parsed_data = simplifySegments(sortParsedData(parsed_data)).segments
+    return flipDXFOverX(Profile.fromEntities(parsed_data))
+
+# Plans the roughing passes for a prepared profile
+@timedStage('planProfilePasses')
+def planProfilePasses(parsed_data, stockRadius, roughStep, finishStep, strategy='constant'):
+    smallest_z = find_smallest_y(parsed_data)
+    return planPasses(stockRadius, stockRadius - smallest_z, roughStep, finishStep, strategy)
+
+# Adds one roughing pass at startXOffset from the finished profile
+def addRoughingPass(program, parsed_data, startXOffset, stockRadius, feed, roughing='subroutine'):
+    if roughing == 'clipped':
+        return addClippedPass(program, parsed_data, startXOffset, stockRadius, feed)
+    
+    # Calculate starting cut position and move there from X offset
+    # Move to cut
+    offset = toHundredths(startXOffset)
+    start_x, start_z = machineHundredths(parsed_data[0]['start_point'], stockRadius)
+    program.motion(1, start_x + offset, start_z, feed)
+    
+    # Add subroutine call
+    program.call(ROUGHING_SUBROUTINE)
+    
+    # Add retract
+    retract_x, retract_z = machineHundredths(parsed_data[-1]['end_point'], stockRadius)
+    return addRetract(program, retract_x + offset, retract_z)
+
+# Adds everything after the starting blocks: roughing passes, finish pass,
+#   program end and the roughing subroutine. subroutine False leaves the
+#   subroutine out, for split chunks without any roughing calls
+@timedStage('addProgramBody')
+def addProgramBody(program, parsed_data, plan, isUseM3M5Checked, stockRadius, roughFeed, finishFeed, roughing='subroutine', subroutine=True):
+    # Generate move and sub calls
+    for startXOffset in plan.offsets.tolist():
+        addRoughingPass(program, parsed_data, startXOffset, stockRadius, roughFeed, roughing)
+        
+    # Blank lines for readability
+    program.blank()
+    program.blank()
+    
+    # Calculate starting positions of cut relatively 
+    current_x, current_y = machineHundredths(parsed_data[0]['start_point'], stockRadius)
+    
+    ##############
+    # add finish subroutine
+    ##############
+    if plan.finish:
+        # Move to cut
+        program.motion(1, current_x, current_y, finishFeed)
+
+        # Add finish pass
+        createToolpath(program, parsed_data, current_x, current_y, stockRadius, roughFeed, finishFeed, 0)
+
+        # Add retract
+        retract_x, retract_y = machineHundredths(parsed_data[-1]['end_point'], stockRadius)
+        addRetract(program, retract_x, retract_y)
+    
+    ##############
+    # end finish subroutine
+    ##############
+    
+    # generate finishing blocks
+    addFinishingBlocks(program, isUseM3M5Checked)
+    if roughing == 'clipped' or not subroutine:
+        # Clipped passes are inline so there is no subroutine to add
+        program.text('   M\n')
+        return program
+
+    program.blank()
+    program.blank()
+    
+    # generate subroutine gcode blocks, the G25 calls above jump here
+    program.label(ROUGHING_SUBROUTINE)
+    createToolpath(program, parsed_data, current_x, current_y, stockRadius, roughFeed, finishFeed, 1)
+
+    # MFI end input
+    program.text('   M\n')
+    
+    return program
+
+# Determins the max DXF size for scaling DXF preview 
+def calculate_drawing_extents(entities):
+    if isinstance(entities, Profile):
+        return entities.extents()
+
+    min_x = float('inf')
+    min_y = float('inf')
+    max_x = float('-inf')
+    max_y = float('-inf')
+
+    for entity in entities:
+        if entity['type'] == 'LINE':
+            start_x, start_y = entity['start_point']
+            end_x, end_y = entity['end_point']
+            min_x = min(min_x, start_x, end_x)
+            max_x = max(max_x, start_x, end_x)
+            min_y = min(min_y, start_y, end_y)
+            max_y = max(max_y, start_y, end_y)
+        elif entity['type'] == 'CIRCLE':
+            center_x, center_y = entity['center_point']
+            radius = entity['radius']
+            min_x = min(min_x, center_x - radius)
+            max_x = max(max_x, center_x + radius)
+            min_y = min(min_y, center_y - radius)
+            max_y = max(max_y, center_y + radius)
+        elif entity['type'] == 'ARC':
+            center_x, center_y = entity['center_point']
+            radius = entity['radius']
+            start_angle = entity['start_angle']
+            end_angle = entity['end_angle']
+            min_x = min(min_x, center_x - radius)
+            max_x = max(max_x, center_x + radius)
+            min_y = min(min_y, center_y - radius)
+            max_y = max(max_y, center_y + radius)
+        elif entity['type'] == 'POLYLINE':
+            for vertex in entity['vertices']:
+                x, y = vertex
+                min_x = min(min_x, x)
+                max_x = max(max_x, x)
+                min_y = min(min_y, y)
+                max_y = max(max_y, y)
+
+    return min_x, min_y, max_x, max_y
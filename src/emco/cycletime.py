@@ -0,0 +1,144 @@
+# Cycle time estimate from the emitted blocks
+# Programs are backplotted with emco.simulate, so G25 calls are expanded into
+#   the subroutine they run. Feed moves take their length over the feed on
+#   their block (mm/min, the roughFeed / finishFeed values), G00 moves their
+#   length over the machine's rapid rate. Material removed is tracked as the
+#   stock radius along Z in SAMPLE_STEP slices, each pass cuts the slices it
+#   goes below down to its deepest point in them
+import math
+import numpy as np
+from emco.simulate import SAMPLE_STEP, runProgram, runPrograms
+from emco.profiling import timedStage
+
+# Rapid traverse of the Emco Compact 5 (mm/min)
+RAPID_RATE = 700
+
+class PassTime:
+    __slots__ = ('index', 'program', 'moves', 'feed_time', 'rapid_time', 'length', 'depth', 'removed')
+
+    def __init__(self, index, program):
+        self.index = index
+        # Which of a split job's chained programs the pass is in
+        self.program = program
+        self.moves = 0
+        # Seconds spent on feed moves and rapids
+        self.feed_time = 0.0
+        self.rapid_time = 0.0
+        # Distance travelled in mm
+        self.length = 0.0
+        # Deepest machine X reached (mm, negative into the stock)
+        self.depth = 0.0
+        # Material removed in mm^3
+        self.removed = 0.0
+
+    def time(self):
+        return self.feed_time + self.rapid_time
+
+class CycleTime:
+    __slots__ = ('passes', 'other_time', 'rapid_rate', 'stock_radius')
+
+    def __init__(self, rapid_rate, stock_radius):
+        self.passes = []
+        # Seconds spent on moves outside any pass, start block retracts
+        self.other_time = 0.0
+        self.rapid_rate = rapid_rate
+        self.stock_radius = stock_radius
+
+    def feedTime(self):
+        return sum(p.feed_time for p in self.passes)
+
+    def rapidTime(self):
+        return sum(p.rapid_time for p in self.passes)
+
+    def total(self):
+        return self.feedTime() + self.rapidTime() + self.other_time
+
+    def removed(self):
+        return sum(p.removed for p in self.passes)
+
+    def summary(self):
+        return (f'{formatDuration(self.total())} in {len(self.passes)} passes '
+                f'(cutting {formatDuration(self.feedTime())}, rapids {formatDuration(self.rapidTime() + self.other_time)}), '
+                f'{self.removed() / 1000:.2f} cm^3 removed')
+
+    # One line per pass for printing
+    def table(self):
+        lines = [f"{'pass':>5} {'program':>7} {'moves':>6} {'depth':>8} {'cutting':>9} {'rapids':>8} {'removed':>11}"]
+        for p in self.passes:
+            lines.append(f'{p.index + 1:>5} {p.program + 1:>7} {p.moves:>6} {p.depth:>8.2f} '
+                         f'{formatDuration(p.feed_time):>9} {formatDuration(p.rapid_time):>8} {p.removed:>8.0f} mm3')
+        return lines
+
+# Seconds as m:ss, or h:mm:ss for long jobs
+def formatDuration(seconds):
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f'{hours}:{minutes:02}:{seconds:02}'
+    return f'{minutes}:{seconds:02}'
+
+# Volume in mm^3 each pass removes from a stock of stockRadius. Returns an
+#   array indexed by pass
+def removedVolumes(toolpath, stockRadius, step=SAMPLE_STEP):
+    passes = int(toolpath.pass_index.max()) + 1 if len(toolpath) else 0
+    removed = np.zeros(passes)
+    points, owners = toolpath.samples((toolpath.opcode != 0) & (toolpath.pass_index >= 0), step=step / 2)
+    # Only points inside the stock cut anything, the stock's face is Z0
+    inside = (points[:, 0] < 0) & (points[:, 1] <= 0)
+    points = points[inside]
+    pass_index = toolpath.pass_index[owners[inside]]
+    if not len(points):
+        return removed
+
+    slices = np.floor(points[:, 1] / step).astype(np.int64)
+    slices -= slices.min()
+    radius = np.full(slices.max() + 1, float(stockRadius))
+    # Deepest point of every pass in every slice, grouped by pass
+    order = np.lexsort((slices, pass_index))
+    slices = slices[order]
+    pass_index = pass_index[order]
+    cut = np.maximum(stockRadius + points[order, 0], 0)
+    starts = np.nonzero(np.concatenate(([True], (slices[1:] != slices[:-1]) | (pass_index[1:] != pass_index[:-1]))))[0]
+    deepest = np.minimum.reduceat(cut, starts)
+    group_slices = slices[starts]
+    group_passes = pass_index[starts]
+
+    bounds = np.searchsorted(group_passes, np.arange(passes + 1))
+    for index in range(passes):
+        group = slice(bounds[index], bounds[index + 1])
+        touched = group_slices[group]
+        before = radius[touched]
+        after = np.minimum(before, deepest[group])
+        removed[index] = math.pi * step * float((before * before - after * after).sum())
+        radius[touched] = after
+    return removed
+
+# Cycle time of a backplotted Toolpath
+@timedStage('estimateToolpath')
+def estimateToolpath(toolpath, stockRadius, rapid_rate=RAPID_RATE):
+    estimate = CycleTime(rapid_rate, stockRadius)
+    lengths = toolpath.lengths()
+    rapids = toolpath.opcode == 0
+    # Feed moves without a feed would never finish, count them as rapids
+    rate = np.where(rapids | (toolpath.feed <= 0), rapid_rate, toolpath.feed)
+    seconds = lengths / rate * 60
+
+    outside = toolpath.pass_index < 0
+    estimate.other_time = float(seconds[outside].sum())
+    removed = removedVolumes(toolpath, stockRadius)
+    for index in range(len(removed)):
+        moves = toolpath.pass_index == index
+        timing = PassTime(index, int(toolpath.program[moves][0]) if moves.any() else 0)
+        timing.moves = int(moves.sum())
+        timing.feed_time = float(seconds[moves & ~rapids].sum())
+        timing.rapid_time = float(seconds[moves & rapids].sum())
+        timing.length = float(lengths[moves].sum())
+        timing.depth = float(np.minimum(toolpath.start[moves, 0], toolpath.end[moves, 0]).min()) if moves.any() else 0.0
+        timing.removed = float(removed[index])
+        estimate.passes.append(timing)
+    return estimate
+
+# Cycle time of program text, or of the list of chained programs of a split job
+def estimateProgram(texts, stockRadius, rapid_rate=RAPID_RATE):
+    toolpath = runProgram(texts) if isinstance(texts, str) else runPrograms(texts)
+    return estimateToolpath(toolpath, stockRadius, rapid_rate)
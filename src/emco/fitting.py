@@ -0,0 +1,275 @@
+# Curve tessellation and arc fitting
+# The Emco only knows lines and arcs of at most 90 degrees that stay inside one
+#   quadrant, since M99 I/K are unsigned. SPLINE and ELLIPSE entities are
+#   flattened into points within CHORD_TOLERANCE, then the points are fitted
+#   back into as few lines and arcs as stay within FIT_TOLERANCE of them.
+#   Every arc, fitted or drawn, is finally split at the quadrant boundaries of
+#   its center so the emitter never sees one the machine can't cut
+#
+# Fitting is greedy: from each point the longest run of points that a line,
+#   or the circle through the run's first, middle and last point, stays within
+#   tolerance of is found with a galloping search, so n points take O(n log n)
+#   fit checks. Each check is vectorized over the run with NumPy
+import math
+import numpy as np
+from emco.roughing import arcSweep
+
+# Max distance between a curve and its flattened points
+CHORD_TOLERANCE = 0.001
+# Max distance between the flattened points and the fitted lines and arcs.
+#   Snapping ends and centers to the 0.01mm grid adds up to about 0.004, so the
+#   total stays around the Emco's 0.01mm resolution
+FIT_TOLERANCE = 0.005
+# Arc ends closer than this to a quadrant boundary aren't split there
+QUADRANT_EPSILON = 1e-6
+
+def roundPoint(point):
+    return (round(float(point[0]), 2), round(float(point[1]), 2))
+
+# Center on the 0.01mm grid for an arc between rounded end points. Of the grid
+#   points around the true center, takes the one that keeps both ends and the
+#   arc's middle closest to one radius, which roughly halves the rounding error
+def snapCenter(center, radius, start_point, end_point, middle):
+    base_x = round(center[0], 2)
+    base_y = round(center[1], 2)
+    best = None
+    for dx in (-0.01, 0, 0.01):
+        for dy in (-0.01, 0, 0.01):
+            candidate = (round(base_x + dx, 2), round(base_y + dy, 2))
+            start_radius = math.dist(start_point, candidate)
+            end_radius = math.dist(end_point, candidate)
+            error = abs(start_radius - end_radius) + abs(math.dist(middle, candidate) - (start_radius + end_radius) / 2)
+            if best is None or error < best[0]:
+                best = (error, candidate)
+    return best[1]
+
+def lineEntity(start_point, end_point):
+    return {'type': 'LINE', 'start_point': roundPoint(start_point), 'end_point': roundPoint(end_point)}
+
+# Arc dict in the parsed format travelling start_point to end_point. ccw is the
+#   geometric sense in the sketch, the parsed direction label is the lathe sense
+#   so a counterclockwise arc is labelled "cw", see parseEntity. start_angle and
+#   end_angle follow the DXF convention of running counterclockwise
+def arcEntity(center, radius, start_point, end_point, ccw):
+    start_point = roundPoint(start_point)
+    end_point = roundPoint(end_point)
+    # Middle of the true arc, halfway round from start to end
+    start_angle = math.atan2(start_point[1] - center[1], start_point[0] - center[0])
+    sweep = (math.atan2(end_point[1] - center[1], end_point[0] - center[0]) - start_angle) % (2 * math.pi)
+    if not ccw:
+        sweep -= 2 * math.pi
+    middle = (center[0] + radius * math.cos(start_angle + sweep / 2), center[1] + radius * math.sin(start_angle + sweep / 2))
+    center = snapCenter(center, radius, start_point, end_point, middle)
+    radius = (math.dist(start_point, center) + math.dist(end_point, center)) / 2
+
+    start_angle = math.degrees(math.atan2(start_point[1] - center[1], start_point[0] - center[0]))
+    end_angle = math.degrees(math.atan2(end_point[1] - center[1], end_point[0] - center[0]))
+    if not ccw:
+        start_angle, end_angle = end_angle, start_angle
+    if end_angle < start_angle:
+        end_angle += 360
+    return {
+        'type': 'ARC',
+        'center_point': roundPoint(center),
+        'radius': round(float(radius), 2),
+        'start_angle': round(start_angle, 2),
+        'end_angle': round(end_angle, 2),
+        'start_point': roundPoint(start_point),
+        'end_point': roundPoint(end_point),
+        'direction': "cw" if ccw else "ccw"
+    }
+
+# Splits a parsed arc wherever it crosses an axis through its center. Returns
+#   the pieces in travel order, an arc inside one quadrant comes back as is
+def splitQuadrants(entity):
+    start_angle, sweep = arcSweep(entity)
+    if sweep == 0:
+        return [entity]
+    center = entity['center_point']
+    radius = entity['radius']
+    step = math.pi / 2
+
+    # Angles of the quadrant boundaries strictly inside the sweep
+    cuts = []
+    if sweep > 0:
+        boundary = math.floor(start_angle / step + QUADRANT_EPSILON) * step + step
+        while boundary < start_angle + sweep - QUADRANT_EPSILON:
+            cuts.append(boundary)
+            boundary += step
+    else:
+        boundary = math.ceil(start_angle / step - QUADRANT_EPSILON) * step - step
+        while boundary > start_angle + sweep + QUADRANT_EPSILON:
+            cuts.append(boundary)
+            boundary -= step
+    if not cuts:
+        return [entity]
+
+    points = [entity['start_point']]
+    points += [(center[0] + radius * math.cos(angle), center[1] + radius * math.sin(angle)) for angle in cuts]
+    points.append(entity['end_point'])
+    pieces = []
+    for start_point, end_point in zip(points, points[1:]):
+        piece = arcEntity(center, radius, start_point, end_point, sweep > 0)
+        if piece['start_point'] != piece['end_point']:
+            pieces.append(piece)
+    # Keep the original ends exactly so the chain still connects
+    pieces[0]['start_point'] = entity['start_point']
+    pieces[-1]['end_point'] = entity['end_point']
+    return pieces
+
+# Arc of a bulged polyline segment. bulge is tan(sweep / 4), positive bulges
+#   turn counterclockwise
+def bulgeArc(start_point, end_point, bulge):
+    chord = math.hypot(end_point[0] - start_point[0], end_point[1] - start_point[1])
+    sweep = 4 * math.atan(bulge)
+    radius = chord / (2 * math.sin(abs(sweep) / 2))
+    # Center sits on the chord's perpendicular bisector
+    mid_x = (start_point[0] + end_point[0]) / 2
+    mid_y = (start_point[1] + end_point[1]) / 2
+    offset = radius * math.cos(sweep / 2) * (1 if bulge > 0 else -1)
+    normal_x = -(end_point[1] - start_point[1]) / chord
+    normal_y = (end_point[0] - start_point[0]) / chord
+    center = (mid_x + normal_x * offset, mid_y + normal_y * offset)
+    return arcEntity(center, radius, start_point, end_point, bulge > 0)
+
+# Circle through three points as (center, radius), None when they're collinear
+def circleThrough(a, b, c):
+    d = 2 * (a[0] * (b[1] - c[1]) + b[0] * (c[1] - a[1]) + c[0] * (a[1] - b[1]))
+    if abs(d) < 1e-12:
+        return None
+    a2 = a[0] * a[0] + a[1] * a[1]
+    b2 = b[0] * b[0] + b[1] * b[1]
+    c2 = c[0] * c[0] + c[1] * c[1]
+    center_x = (a2 * (b[1] - c[1]) + b2 * (c[1] - a[1]) + c2 * (a[1] - b[1])) / d
+    center_y = (a2 * (c[0] - b[0]) + b2 * (a[0] - c[0]) + c2 * (b[0] - a[0])) / d
+    return (center_x, center_y), math.hypot(a[0] - center_x, a[1] - center_y)
+
+# True when every point is within tolerance of the segment from first to last
+def fitsLine(points, tolerance):
+    start = points[0]
+    direction = points[-1] - start
+    length = math.hypot(direction[0], direction[1])
+    if length == 0:
+        return False
+    offsets = points - start
+    distance = np.abs(offsets[:, 0] * direction[1] - offsets[:, 1] * direction[0]) / length
+    along = (offsets @ direction) / length
+    return distance.max() <= tolerance and along.min() >= -tolerance and along.max() <= length + tolerance
+
+# (center, radius, ccw) of the circle through the run's first, middle and last
+#   point when every point, and every chord between them, is within tolerance
+#   of it and the points travel one way round. None otherwise
+def fitArc(points, tolerance):
+    circle = circleThrough(points[0], points[len(points) // 2], points[-1])
+    if circle is None:
+        return None
+    center, radius = circle
+    offsets = points - center
+    if np.abs(np.hypot(offsets[:, 0], offsets[:, 1]) - radius).max() > tolerance:
+        return None
+
+    # Chords bulge inward by the sagitta, which has to stay in tolerance too or
+    #   a coarse polyline corner would be rounded off
+    chords = np.hypot(*np.diff(points, axis=0).T)
+    half = np.minimum(chords / 2, radius)
+    if (radius - np.sqrt(radius * radius - half * half)).max() > tolerance:
+        return None
+
+    steps = np.diff(np.unwrap(np.arctan2(offsets[:, 1], offsets[:, 0])))
+    if not ((steps > 0).all() or (steps < 0).all()):
+        return None
+    if abs(steps.sum()) >= 2 * math.pi - 1e-6:
+        return None
+    return center, radius, bool(steps[0] > 0)
+
+# Line or arc entity for points[i:j + 1], None when neither fits
+def fitRun(points, i, j, tolerance):
+    run = points[i:j + 1]
+    if fitsLine(run, tolerance):
+        return lineEntity(run[0], run[-1])
+    if len(run) < 3:
+        return None
+    arc = fitArc(run, tolerance)
+    if arc is None:
+        return None
+    center, radius, ccw = arc
+    return arcEntity(center, radius, run[0], run[-1], ccw)
+
+# Fits a list of points into parsed LINE and ARC entities, arcs already split
+#   at quadrant boundaries
+def fitPoints(points, tolerance=FIT_TOLERANCE):
+    points = np.asarray(points, dtype=float)[:, :2]
+    # Drop repeated points, they make zero length chords
+    if len(points) > 1:
+        keep = np.concatenate(([True], np.hypot(*np.diff(points, axis=0).T) > 1e-9))
+        points = points[keep]
+
+    entities = []
+    i = 0
+    last = len(points) - 1
+    while i < last:
+        # Gallop out until a run stops fitting, then bisect back to the longest
+        #   run that does. Two points always fit as a line
+        good = i + 1
+        best = fitRun(points, i, good, tolerance)
+        step = 2
+        bad = None
+        while good < last:
+            j = min(i + step, last)
+            fitted = fitRun(points, i, j, tolerance)
+            if fitted is None:
+                bad = j
+                break
+            good, best = j, fitted
+            step *= 2
+        if bad is not None:
+            while bad - good > 1:
+                j = (good + bad) // 2
+                fitted = fitRun(points, i, j, tolerance)
+                if fitted is None:
+                    bad = j
+                else:
+                    good, best = j, fitted
+
+        if best['start_point'] != best['end_point']:
+            if best['type'] == 'ARC':
+                entities.extend(splitQuadrants(best))
+            else:
+                entities.append(best)
+        i = good
+
+    # Rounding can leave neighbours a hundredth apart, join them back up
+    for previous, entity in zip(entities, entities[1:]):
+        entity['start_point'] = previous['end_point']
+    return entities
+
+# Flattens a SPLINE or ELLIPSE into points within CHORD_TOLERANCE
+def flattenCurve(entity, chord_tolerance=CHORD_TOLERANCE):
+    return [(point.x, point.y) for point in entity.flattening(chord_tolerance)]
+
+# Parsed entities for an LWPOLYLINE. Bulged segments become arcs, runs of
+#   straight segments are fitted so a dense polyline collapses into few blocks
+def polylineEntities(entity, tolerance=FIT_TOLERANCE):
+    vertices = [(x, y, bulge) for x, y, _, _, bulge in entity.get_points('xyseb')]
+    if entity.closed and vertices:
+        vertices.append(vertices[0])
+
+    entities = []
+    run = []
+    for (x, y, bulge), (next_x, next_y, _) in zip(vertices, vertices[1:]):
+        if not run:
+            run.append((x, y))
+        if bulge:
+            entities.extend(fitPoints(run, tolerance) if len(run) > 1 else [])
+            run = []
+            arc = bulgeArc((x, y), (next_x, next_y), bulge)
+            if arc['start_point'] != arc['end_point']:
+                entities.extend(splitQuadrants(arc))
+        else:
+            run.append((next_x, next_y))
+    if len(run) > 1:
+        entities.extend(fitPoints(run, tolerance))
+
+    for previous, entity in zip(entities, entities[1:]):
+        entity['start_point'] = previous['end_point']
+    return entities
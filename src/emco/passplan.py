@@ -0,0 +1,119 @@
+# Roughing and finishing pass planning
+# Works out the X offset of every pass up front as one NumPy array so the
+#   GCode emitter just walks the plan. Offsets are measured from the finished
+#   profile outwards, so an offset of 0 cuts the final profile
+import math
+import numpy as np
+
+# Pass kinds
+ROUGH = 0
+FINISH_STEP = 1
+
+# constant       - the original stepping, roughStep per pass and the leftover
+#                  stock split into at most one finishing stepdown
+# constant_load  - equal depth passes, the roughing depth is divided evenly so
+#                  the tool sees the same load every pass with no thin sliver
+# constant_volume - every pass removes the same volume of material, so passes
+#                  get deeper as the radius shrinks, never deeper than roughStep
+STRATEGIES = ('constant', 'constant_load', 'constant_volume')
+
+class PassPlan:
+    __slots__ = ('strategy', 'stock_radius', 'depth', 'offsets', 'kinds', 'finish')
+
+    def __init__(self, strategy, stock_radius, depth, offsets, kinds, finish):
+        self.strategy = strategy
+        self.stock_radius = stock_radius
+        # Total stock to remove, stock radius minus the smallest profile radius
+        self.depth = depth
+        # X offset of each roughing subroutine call
+        self.offsets = offsets
+        self.kinds = kinds
+        # True when a separate finish pass follows the roughing calls
+        self.finish = finish
+
+    def __len__(self):
+        return len(self.offsets)
+
+    # Depth of cut of every pass, the first pass cuts from the stock radius
+    def cutDepths(self):
+        previous = np.concatenate(([self.depth], self.offsets[:-1]))
+        return previous - self.offsets
+
+    # Radius the tool is at for every pass' deepest point
+    def passRadii(self):
+        return self.stock_radius - self.depth + self.offsets
+
+    # Plan holding only passes start to stop, for splitting a long job
+    def slice(self, start, stop, finish):
+        return PassPlan(self.strategy, self.stock_radius, self.depth, self.offsets[start:stop],
+                        self.kinds[start:stop], finish)
+
+    def __repr__(self):
+        return (f'PassPlan({self.strategy!r}, depth={self.depth}, passes={len(self)}, '
+                f'finish={self.finish}, offsets={self.offsets.tolist()})')
+
+# Original stepping, kept byte for byte with the old stepdown loop
+def planConstant(depth, roughStep, finishStep):
+    number_of_steps = int(depth / roughStep)
+    if finishStep != 0:
+        if (depth % roughStep) / finishStep > 1:
+            number_of_steps += 1
+
+    step_num = np.arange(1, number_of_steps + 1)
+    stock_left = depth - ((step_num - 1) * roughStep)
+    roughing = stock_left > roughStep
+    finishing_offsets = np.where(stock_left > finishStep, stock_left - (stock_left - finishStep), 0)
+    offsets = np.where(roughing, depth - (step_num * roughStep), finishing_offsets)
+    kinds = np.where(roughing, ROUGH, FINISH_STEP).astype(np.int8)
+    return offsets.astype(float), kinds
+
+# No roughing passes, for stock that is all finishing allowance. A pass at
+#   the allowance would be above the stock surface
+def noPasses():
+    return np.zeros(0), np.zeros(0, dtype=np.int8)
+
+# Equal depth passes down to the finishing allowance
+def planConstantLoad(depth, roughStep, finishStep):
+    rough_depth = depth - finishStep
+    if rough_depth <= 0:
+        return noPasses()
+    count = max(math.ceil(rough_depth / roughStep - 1e-9), 1)
+    offsets = finishStep + rough_depth * (1 - np.arange(1, count + 1) / count)
+    return offsets, np.full(count, ROUGH, dtype=np.int8)
+
+# Equal volume passes. Pass k leaves radius r_k where r_k^2 steps evenly from
+#   the stock radius down to the finishing allowance. Passes get deeper as the
+#   radius shrinks, the last one cuts from sqrt(inner^2 + area / count) down to
+#   inner, so the fewest passes that keep it within roughStep are
+#   area / (roughStep * (2 * inner + roughStep)), rounded up
+def planConstantVolume(depth, roughStep, finishStep, stockRadius):
+    rough_depth = depth - finishStep
+    if rough_depth <= 0:
+        return noPasses()
+    outer = stockRadius
+    inner = stockRadius - rough_depth
+    area = outer ** 2 - inner ** 2
+    count = max(math.ceil(area / (roughStep * (2 * inner + roughStep)) - 1e-9), 1)
+    radii = np.sqrt(outer ** 2 - area * np.arange(1, count + 1) / count)
+    radii[-1] = inner
+    offsets = radii - inner + finishStep
+    return offsets, np.full(count, ROUGH, dtype=np.int8)
+
+# Plans every roughing call. depth is the stock to remove (stock radius minus
+#   the smallest profile radius). A roughStep of 0 cuts the part in one go
+def planPasses(stockRadius, depth, roughStep, finishStep, strategy='constant'):
+    if strategy not in STRATEGIES:
+        raise ValueError(f'strategy must be one of {", ".join(STRATEGIES)}, got {strategy!r}')
+    if roughStep < 0 or finishStep < 0:
+        raise ValueError('Stepdowns can not be negative')
+
+    if roughStep == 0:
+        return PassPlan(strategy, stockRadius, depth, np.zeros(1), np.full(1, ROUGH, dtype=np.int8), False)
+
+    if strategy == 'constant':
+        offsets, kinds = planConstant(depth, roughStep, finishStep)
+    elif strategy == 'constant_load':
+        offsets, kinds = planConstantLoad(depth, roughStep, finishStep)
+    else:
+        offsets, kinds = planConstantVolume(depth, roughStep, finishStep, stockRadius)
+    return PassPlan(strategy, stockRadius, depth, offsets, kinds, True)
@@ -0,0 +1,212 @@
+# Memoized GCode generation pipeline
+# Generation is split into stages that each remember their last few results,
+#   keyed on the parameters and upstream stages they depend on:
+#
+#   parsed -> chained -> simplified -> flipped -> plan -> body -> text -> programs
+#                                               header -------/
+#
+# programs only does work when the job needs more than max_blocks blocks and
+#   has to be split into chained programs
+#
+# Changing a parameter only recomputes the stages downstream of it. Feeds are
+#   left as tokens on the body's blocks and filled in as the text stage
+#   formats them, and the start
+#   retracts live in their own header stage, so tuning feeds or switching the
+#   retract direction never regenerates the toolpath
+#
+# listener, when set, is called with each stage's name just before it runs.
+#   The GUI's background jobs use it for progress and to cancel between stages
+import collections
+from emco.cache import default_cache
+from emco.chain import chainSegments, DEFAULT_TOLERANCE
+from emco.core import generateHeader, planProfilePasses, addProgramBody, flipDXFOverX, splitProgram, MAX_BLOCKS
+from emco.profile import Profile
+from emco.blocks import Program
+from emco.simplify import simplifySegments
+from emco.profiling import default_profiler
+
+# Stands in for a feedrate while the body is generated. The text stage maps
+#   it to the real feed through Program.formatLines
+class FeedToken:
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return f'FeedToken({self.name!r})'
+
+ROUGH_FEED = FeedToken('rough')
+FINISH_FEED = FeedToken('finish')
+
+DEFAULT_PARAMS = {
+    'file_path': None,
+    'layers': None,
+    'streaming': False,
+    'tolerance': DEFAULT_TOLERANCE,
+    'use_m3_m5': False,
+    'retract': 'none',
+    'stock_radius': None,
+    'rough_feed': None,
+    'rough_step': 0,
+    'finish_feed': None,
+    'finish_step': 0,
+    'strategy': 'constant',
+    'roughing': 'subroutine',
+    'max_blocks': MAX_BLOCKS,
+}
+
+# How many results each stage remembers, so toggling a value back is free
+MEMO_SIZE = 4
+
+class Stage:
+    __slots__ = ('name', 'inputs', 'compute', 'memo', 'runs', 'keyed_by_value')
+
+    def __init__(self, name, inputs, compute, keyed_by_value=False):
+        self.name = name
+        # Names of parameters or upstream stages this stage depends on
+        self.inputs = inputs
+        self.compute = compute
+        # Small hashable results are used directly as the key of downstream
+        #   stages, so an upstream change that gives the same value stops here
+        self.keyed_by_value = keyed_by_value
+        self.memo = collections.OrderedDict()
+        self.runs = 0
+
+class Pipeline:
+
+    def __init__(self, **params):
+        self.params = dict(DEFAULT_PARAMS)
+        self.stages = {}
+        self.listener = None
+        # file_signature is only checked once per get or staleStages call, the
+        #   first time a key needs it. depth counts the calls running
+        self.signature = None
+        self.depth = 0
+        self.addStage('parsed', ('file_signature', 'layers', 'streaming'), self.parse)
+        self.addStage('chained', ('parsed', 'tolerance'), lambda parsed, tolerance: chainSegments(parsed, tolerance))
+        self.addStage('simplified', ('chained',), lambda chained: simplifySegments(chained.segments))
+        self.addStage('flipped', ('simplified',), lambda simplified: flipDXFOverX(Profile.fromEntities(simplified.segments)))
+        self.addStage('plan', ('flipped', 'stock_radius', 'rough_step', 'finish_step', 'strategy'), planProfilePasses)
+        self.addStage('header', ('use_m3_m5', 'retract'), self.header)
+        self.addStage('header_blocks', ('header',), lambda header: header[1], keyed_by_value=True)
+        self.addStage('body', ('flipped', 'plan', 'header_blocks', 'use_m3_m5', 'stock_radius', 'roughing'), self.body)
+        self.addStage('text', ('header', 'body', 'rough_feed', 'finish_feed'), self.text)
+        self.addStage('programs', ('text', 'body', 'flipped', 'plan', 'use_m3_m5', 'retract', 'stock_radius',
+                                   'rough_feed', 'finish_feed', 'roughing', 'max_blocks'), self.programs)
+        self.set(**params)
+
+    def addStage(self, name, inputs, compute, keyed_by_value=False):
+        self.stages[name] = Stage(name, inputs, compute, keyed_by_value)
+
+    def set(self, **params):
+        for key, value in params.items():
+            if key not in DEFAULT_PARAMS:
+                raise KeyError(key)
+            if isinstance(value, list):
+                value = tuple(value)
+            self.params[key] = value
+
+    # Parameter value, file_signature is derived from the file content so an
+    #   edited DXF is picked up without the path changing
+    def param(self, name):
+        if name == 'file_signature':
+            signature = self.signature
+            if signature is None:
+                signature = default_cache.fileHash(self.params['file_path']), self.params['file_path']
+                if self.depth:
+                    self.signature = signature
+            return signature
+        return self.params[name]
+
+    # Runs function keeping file_signature for all the keys it computes
+    def withSignature(self, function, *args):
+        self.depth += 1
+        try:
+            return function(*args)
+        finally:
+            self.depth -= 1
+            if not self.depth:
+                self.signature = None
+
+    # Hashable key describing everything a stage result depends on
+    def key(self, name):
+        stage = self.stages[name]
+        return tuple(self.inputKey(i) for i in stage.inputs)
+
+    def inputKey(self, name):
+        if name not in self.stages:
+            return self.param(name)
+        if self.stages[name].keyed_by_value:
+            return self.getStage(name)
+        return self.key(name)
+
+    def get(self, name):
+        return self.withSignature(self.getStage, name)
+
+    def getStage(self, name):
+        stage = self.stages[name]
+        key = self.key(name)
+        if key in stage.memo:
+            stage.memo.move_to_end(key)
+            default_profiler.count('pipeline.cached')
+            return stage.memo[key]
+        values = [self.getStage(i) if i in self.stages else self.param(i) for i in stage.inputs]
+        if self.listener is not None:
+            self.listener(name)
+        with default_profiler.stage('pipeline.' + name):
+            result = stage.compute(*values)
+        stage.runs += 1
+        stage.memo[key] = result
+        while len(stage.memo) > MEMO_SIZE:
+            stage.memo.popitem(last=False)
+        return result
+
+    # Stages get(name) would run, upstream first. Stages that are only in the
+    #   key by value are computed to find out
+    def staleStages(self, name, seen=None):
+        return self.withSignature(self.findStale, name, set() if seen is None else seen)
+
+    def findStale(self, name, seen):
+        if name in seen or self.key(name) in self.stages[name].memo:
+            return []
+        seen.add(name)
+        stale = []
+        for i in self.stages[name].inputs:
+            if i in self.stages:
+                stale += self.findStale(i, seen)
+        stale.append(name)
+        return stale
+
+    # Number of times each stage has actually run, for checking what a change cost
+    def runCounts(self):
+        return {name: stage.runs for name, stage in self.stages.items()}
+
+    def clear(self):
+        for stage in self.stages.values():
+            stage.memo.clear()
+
+    def parse(self, file_signature, layers, streaming):
+        return default_cache.get(file_signature[1], layers, streaming)
+
+    def header(self, use_m3_m5, retract):
+        program = generateHeader(use_m3_m5, retract == 'x', retract == 'z', retract == 'xz')
+        return program.render(), program.blockNum
+
+    def body(self, flipped, plan, header_blocks, use_m3_m5, stock_radius, roughing):
+        return addProgramBody(Program(header_blocks), flipped, plan, use_m3_m5, stock_radius, ROUGH_FEED, FINISH_FEED, roughing)
+
+    def text(self, header, body, rough_feed, finish_feed):
+        return header[0] + ''.join(body.formatLines({ROUGH_FEED: rough_feed, FINISH_FEED: finish_feed}))
+
+    # Program text split into chained programs when it needs more than max_blocks
+    def programs(self, text, body, flipped, plan, use_m3_m5, retract, stock_radius, rough_feed, finish_feed, roughing, max_blocks):
+        if body.blockNum <= max_blocks:
+            return (text,)
+        header = lambda: generateHeader(use_m3_m5, retract == 'x', retract == 'z', retract == 'xz')
+        programs = splitProgram(header, flipped, plan, use_m3_m5, stock_radius, rough_feed, finish_feed, roughing, max_blocks)
+        return tuple(program.render() for program in programs)
+
+    # Generated program as a list of lines, like generate_gcode_from_dxf
+    def gcode(self):
+        return self.get('text').splitlines(keepends=True)
@@ -0,0 +1,163 @@
+# Geometry for the GUI's drawing preview
+# The preview draws the profile as a few combined items instead of one item
+#   per entity. previewSegments turns the entities into one array of line
+#   segments in scene coordinates, sketch Y pointing down the screen and arcs
+#   cut into chords that stay within ARC_TOLERANCE of the arc. When the view
+#   is zoomed out decimateSegments snaps those segments to a grid of about a
+#   pixel and drops the ones that collapse to a point or repeat, so a 100k
+#   segment drawing costs about as many lines as the view has pixels along
+#   the profile
+#
+# toolpathOverlay does the same for a backplotted program, see emco.simulate,
+#   split into one set of feed moves and one of rapids per pass so the GUI can
+#   show and hide passes one at a time
+import math
+import numpy as np
+from emco.roughing import arcSweep
+
+# Scene units the longest side of the drawing is scaled to
+PREVIEW_SIZE = 750
+# Most an arc's chords stray from the arc, in scene units
+ARC_TOLERANCE = 0.05
+
+# Sketch to scene scale for a drawing with the given extents, see
+#   calculate_drawing_extents
+def previewScale(extents):
+    min_x, min_y, max_x, max_y = extents
+    size = max(max_x - min_x, max_y - min_y)
+    if not math.isfinite(size) or size <= 0:
+        return 1.0
+    return PREVIEW_SIZE / size
+
+# Scene rectangle (x, y, width, height) of the drawing extents
+def sceneBounds(extents, scale):
+    min_x, min_y, max_x, max_y = extents
+    if not math.isfinite(max_x - min_x):
+        return 0.0, 0.0, 0.0, 0.0
+    return min_x * scale, -max_y * scale, (max_x - min_x) * scale, (max_y - min_y) * scale
+
+# Chords of every arc as an (n, 4) array of x0, y0, x1, y1 rows in sketch
+#   units, and the arc each chord belongs to. arcs holds center x, center y,
+#   radius, start angle and signed sweep rows, ends the arcs' own start and
+#   end points, which the chords hit exactly
+def arcChords(arcs, ends, scale, tolerance=ARC_TOLERANCE):
+    if not len(arcs):
+        return np.empty((0, 4)), np.zeros(0, dtype=np.int64)
+    center_x, center_y, radius, start_angle, sweep = arcs.T
+    radius_scaled = np.maximum(radius * scale, tolerance)
+    step = 2 * np.arccos(1 - tolerance / radius_scaled)
+    counts = np.maximum(1, np.ceil(np.abs(sweep) / np.minimum(step, math.pi / 2))).astype(np.int64)
+
+    # Point j of arc i sits at start + sweep * j / count, j = 0 .. count
+    owner = np.repeat(np.arange(len(arcs)), counts + 1)
+    first = np.cumsum(counts + 1) - (counts + 1)
+    fraction = (np.arange(len(owner)) - first[owner]) / counts[owner]
+    angles = start_angle[owner] + sweep[owner] * fraction
+    points = np.column_stack((center_x[owner] + radius[owner] * np.cos(angles),
+                              center_y[owner] + radius[owner] * np.sin(angles)))
+    points[first] = ends[:, :2]
+    points[first + counts] = ends[:, 2:]
+
+    # Every point but an arc's last starts a chord
+    starts = np.ones(len(points), dtype=bool)
+    starts[first + counts] = False
+    starts = starts[:-1]
+    return np.hstack((points[:-1][starts], points[1:][starts])), owner[:-1][starts]
+
+# Every line, arc and polyline as an (n, 4) array of x0, y0, x1, y1 rows in
+#   scene coordinates
+def previewSegments(entities, scale, tolerance=ARC_TOLERANCE):
+    lines = []
+    arcs = []
+    arc_ends = []
+    polylines = []
+    for entity in entities:
+        kind = entity['type']
+        if kind == 'LINE':
+            lines.append(entity['start_point'] + entity['end_point'])
+        elif kind == 'ARC':
+            arcs.append(entity['center_point'] + (entity['radius'],) + arcSweep(entity))
+            arc_ends.append(entity['start_point'] + entity['end_point'])
+        elif kind == 'POLYLINE' and len(entity['vertices']) > 1:
+            polylines.append(np.asarray(entity['vertices'], dtype=float))
+
+    parts = [np.asarray(lines, dtype=float).reshape(-1, 4),
+             arcChords(np.asarray(arcs, dtype=float).reshape(-1, 5), np.asarray(arc_ends, dtype=float).reshape(-1, 4),
+                       scale, tolerance)[0]]
+    parts += [np.hstack((points[:-1], points[1:])) for points in polylines]
+    segments = np.concatenate(parts) * scale
+    segments[:, 1::2] *= -1
+    return segments
+
+# Segments snapped to a grid of cell scene units, without the ones that
+#   snap to a point and without duplicates. Chains stay connected because
+#   every point in a cell snaps to the same corner
+def decimateSegments(segments, cell):
+    snapped = np.round(segments / cell).astype(np.int64)
+    snapped = snapped[np.any(snapped[:, :2] != snapped[:, 2:], axis=1)]
+    # The same line drawn either way round is one line
+    flip = (snapped[:, 0] > snapped[:, 2]) | ((snapped[:, 0] == snapped[:, 2]) & (snapped[:, 1] > snapped[:, 3]))
+    snapped[flip] = snapped[flip][:, [2, 3, 0, 1]]
+    if len(snapped):
+        snapped = np.unique(snapped, axis=0)
+    return snapped * cell
+
+# Overlay kinds, a pass is roughing or the finish pass. Moves before the first
+#   pass and after the last one are rapids, and so is the start block retract
+ROUGH = 'rough'
+FINISH = 'finish'
+RAPID = 'rapid'
+
+class PassOverlay:
+    __slots__ = ('index', 'kind', 'feeds', 'rapids')
+
+    def __init__(self, index, kind, feeds, rapids):
+        # Pass number from 0, -1 for the moves outside any pass
+        self.index = index
+        self.kind = kind
+        # Feed moves and rapids as previewSegments style scene segments
+        self.feeds = feeds
+        self.rapids = rapids
+
+# Scene segments of a backplotted Toolpath, as a PassOverlay per pass in
+#   cutting order after one for the moves outside any pass. finish says the
+#   last pass is a finish pass, mirror that the drawing is in the 3rd quadrant
+#   and was flipped for cutting (see flipDXFOverX), so the overlay is flipped
+#   back onto it
+def toolpathOverlay(toolpath, stockRadius, scale, finish=True, mirror=False, tolerance=ARC_TOLERANCE):
+    # Sketch coordinates, x along Z and y from the axis, machine X0 is the stock surface
+    segments = np.column_stack((toolpath.start[:, 1], toolpath.start[:, 0] + stockRadius,
+                                toolpath.end[:, 1], toolpath.end[:, 0] + stockRadius))
+    owners = np.arange(len(toolpath))
+    arcs = ~np.isnan(toolpath.center[:, 0])
+    if arcs.any():
+        # Toolpath angles run from Z towards X, the same as sketch angles
+        radius, start_angle, sweep = toolpath.arcGeometry(arcs)
+        centers = toolpath.center[arcs]
+        rows = np.column_stack((centers[:, 1], centers[:, 0] + stockRadius, radius, start_angle, sweep))
+        chords, chord_arcs = arcChords(rows, segments[arcs], scale, tolerance)
+        segments = np.concatenate((segments[~arcs], chords))
+        owners = np.concatenate((owners[~arcs], owners[arcs][chord_arcs]))
+        order = np.argsort(owners, kind='stable')
+        segments = segments[order]
+        owners = owners[order]
+
+    segments = segments * scale
+    if not mirror:
+        segments[:, 1::2] *= -1
+    pass_index = toolpath.pass_index[owners]
+    rapid = toolpath.opcode[owners] == 0
+    passes = int(toolpath.pass_index.max()) + 1 if len(toolpath) else 0
+
+    overlay = []
+    outside = pass_index < 0
+    if outside.any():
+        overlay.append(PassOverlay(-1, RAPID, segments[outside & ~rapid], segments[outside & rapid]))
+    # Segments grouped by pass, each pass's moves still in cutting order
+    order = np.argsort(pass_index, kind='stable')
+    bounds = np.searchsorted(pass_index[order], np.arange(passes + 1))
+    for index in range(passes):
+        picked = order[bounds[index]:bounds[index + 1]]
+        kind = FINISH if finish and index == passes - 1 else ROUGH
+        overlay.append(PassOverlay(index, kind, segments[picked[~rapid[picked]]], segments[picked[rapid[picked]]]))
+    return overlay
@@ -0,0 +1,254 @@
+# Array backed profile representation
+# A Profile keeps every segment of the parsed DXF in a handful of NumPy columns
+#   instead of one dict per entity, so flipping, extents and coordinate
+#   transforms are whole array operations. Indexing or iterating a Profile gives
+#   Segment views that answer the same keys as the parsed dicts
+#   ('type', 'start_point', 'end_point', ...) so existing code keeps working
+import numpy as np
+from emco.fixedpoint import toHundredths
+
+# Entity kind codes
+LINE = 0
+ARC = 1
+POLYLINE = 2
+
+KIND_NAMES = ('LINE', 'ARC', 'POLYLINE')
+KIND_CODES = {name: code for code, name in enumerate(KIND_NAMES)}
+
+# Arc direction codes, 0 for segments without a direction
+CW = 1
+CCW = -1
+DIRECTION_NAMES = {CW: 'cw', CCW: 'ccw'}
+DIRECTION_CODES = {'cw': CW, 'ccw': CCW}
+
+# Keys each kind of segment answers, matching the dicts made by parse_dxf_file
+SEGMENT_KEYS = (
+    ('type', 'start_point', 'end_point'),
+    ('type', 'center_point', 'radius', 'start_angle', 'end_angle', 'start_point', 'end_point', 'direction'),
+    ('type', 'vertices'),
+)
+
+# Lightweight view of one row of a Profile that behaves like the parsed dict
+class Segment:
+    __slots__ = ('profile', 'index')
+
+    def __init__(self, profile, index):
+        self.profile = profile
+        self.index = index
+
+    @property
+    def kind(self):
+        return int(self.profile.kind[self.index])
+
+    def keys(self):
+        return SEGMENT_KEYS[self.kind]
+
+    def __contains__(self, key):
+        return key in SEGMENT_KEYS[self.kind]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def __getitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        profile = self.profile
+        i = self.index
+        if key == 'type':
+            return KIND_NAMES[self.kind]
+        if key == 'start_point':
+            return tuple(profile.start[i].tolist())
+        if key == 'end_point':
+            return tuple(profile.end[i].tolist())
+        if key == 'center_point':
+            return tuple(profile.center[i].tolist())
+        if key == 'radius':
+            return float(profile.radius[i])
+        if key == 'start_angle':
+            return float(profile.start_angle[i])
+        if key == 'end_angle':
+            return float(profile.end_angle[i])
+        if key == 'direction':
+            return DIRECTION_NAMES[int(profile.direction[i])]
+        if key == 'vertices':
+            return profile.segmentVertices(i)
+
+    def __setitem__(self, key, value):
+        if key not in self or key in ('type', 'vertices'):
+            raise KeyError(key)
+        profile = self.profile
+        i = self.index
+        if key == 'start_point':
+            profile.start[i] = value
+        elif key == 'end_point':
+            profile.end[i] = value
+        elif key == 'center_point':
+            profile.center[i] = value
+        elif key == 'radius':
+            profile.radius[i] = value
+        elif key == 'start_angle':
+            profile.start_angle[i] = value
+        elif key == 'end_angle':
+            profile.end_angle[i] = value
+        elif key == 'direction':
+            profile.direction[i] = DIRECTION_CODES[value]
+
+    def toDict(self):
+        return {key: self[key] for key in self.keys()}
+
+    def __repr__(self):
+        return f'Segment({self.toDict()!r})'
+
+class Profile:
+    __slots__ = ('kind', 'start', 'end', 'center', 'radius', 'start_angle', 'end_angle', 'direction',
+                 'vertex_offsets', 'vertices')
+
+    def __init__(self, count=0):
+        self.kind = np.zeros(count, dtype=np.int8)
+        self.start = np.zeros((count, 2))
+        self.end = np.zeros((count, 2))
+        self.center = np.zeros((count, 2))
+        self.radius = np.zeros(count)
+        self.start_angle = np.zeros(count)
+        self.end_angle = np.zeros(count)
+        self.direction = np.zeros(count, dtype=np.int8)
+        # Polyline vertices are stored back to back, segment i owns
+        #   vertices[vertex_offsets[i]:vertex_offsets[i + 1]]
+        self.vertex_offsets = np.zeros(count + 1, dtype=np.int64)
+        self.vertices = np.zeros((0, 2))
+
+    # Builds a Profile from the list of dicts made by parse_dxf_file
+    @classmethod
+    def fromEntities(cls, entities):
+        if isinstance(entities, Profile):
+            return entities
+        profile = cls(len(entities))
+        vertex_counts = np.zeros(len(entities), dtype=np.int64)
+        polyline_vertices = []
+        for i, entity in enumerate(entities):
+            kind = KIND_CODES[entity['type']]
+            profile.kind[i] = kind
+            if kind == POLYLINE:
+                vertices = list(entity['vertices'])
+                vertex_counts[i] = len(vertices)
+                polyline_vertices.extend(vertices)
+                # Polylines start and end at their first and last vertex so
+                #   whole array moves chain through them
+                if vertices:
+                    profile.start[i] = vertices[0]
+                    profile.end[i] = vertices[-1]
+                continue
+            profile.start[i] = entity['start_point']
+            profile.end[i] = entity['end_point']
+            if kind == ARC:
+                profile.center[i] = entity['center_point']
+                profile.radius[i] = entity['radius']
+                profile.start_angle[i] = entity['start_angle']
+                profile.end_angle[i] = entity['end_angle']
+                profile.direction[i] = DIRECTION_CODES[entity['direction']]
+        np.cumsum(vertex_counts, out=profile.vertex_offsets[1:])
+        if polyline_vertices:
+            profile.vertices = np.array(polyline_vertices, dtype=float).reshape(-1, 2)
+        return profile
+
+    # Converts back into the list of dicts made by parse_dxf_file
+    def toEntities(self):
+        return [segment.toDict() for segment in self]
+
+    def __len__(self):
+        return len(self.kind)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return Segment(self, index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield Segment(self, i)
+
+    def segmentVertices(self, index):
+        vertices = self.vertices[self.vertex_offsets[index]:self.vertex_offsets[index + 1]]
+        return [tuple(vertex) for vertex in vertices.tolist()]
+
+    # Mask of segments that have start and end points in the parsed dict model
+    def pointMask(self):
+        return self.kind != POLYLINE
+
+    # Flips the profile over the x axis (machine z) in place when it was drawn
+    #   below the axis. Same rules as flipDXFOverX
+    def flipOverX(self):
+        if len(self) == 0 or self.start[0, 1] >= 0:
+            return self
+        np.abs(self.start[:, 1], out=self.start[:, 1])
+        np.abs(self.end[:, 1], out=self.end[:, 1])
+        arcs = self.kind == ARC
+        self.center[arcs, 1] = np.abs(self.center[arcs, 1])
+        self.direction[arcs] = -self.direction[arcs]
+        return self
+
+    # Smallest start or end y. Machine X axis
+    def smallestY(self):
+        mask = self.pointMask()
+        if not mask.any():
+            return float('inf')
+        return float(min(self.start[mask, 1].min(), self.end[mask, 1].min()))
+
+    # Drawing extents as (min_x, min_y, max_x, max_y), arcs use their full circle
+    def extents(self):
+        boxes = []
+        lines = self.kind == LINE
+        if lines.any():
+            boxes.append(np.concatenate((self.start[lines], self.end[lines])))
+        arcs = self.kind == ARC
+        if arcs.any():
+            offset = self.radius[arcs, None]
+            boxes.append(np.concatenate((self.center[arcs] - offset, self.center[arcs] + offset)))
+        if len(self.vertices):
+            boxes.append(self.vertices)
+        if not boxes:
+            return float('inf'), float('inf'), float('-inf'), float('-inf')
+        points = np.concatenate(boxes)
+        min_x, min_y = points.min(axis=0).tolist()
+        max_x, max_y = points.max(axis=0).tolist()
+        return min_x, min_y, max_x, max_y
+
+    # End points converted to machine X (sketch y relative to stock radius)
+    #   and machine Z (sketch x), see compX
+    def machineEnds(self, stockRadius):
+        return self.end[:, 1] - stockRadius, self.end[:, 0].copy()
+
+    # Incremental move of every segment from the previous segment's end point,
+    #   starting from (current_x, current_y) in machine coordinates
+    def moveIncrements(self, current_x, current_y, stockRadius):
+        machine_x, machine_z = self.machineEnds(stockRadius)
+        previous_x = np.concatenate(([current_x], machine_x[:-1]))
+        previous_z = np.concatenate(([current_y], machine_z[:-1]))
+        return machine_x - previous_x, machine_z - previous_z
+
+    # End points in machine coordinates as integer hundredths, each rounded
+    #   once from its absolute position, see emco.fixedpoint
+    def machineHundredths(self, stockRadius):
+        return toHundredths(self.end[:, 1]) - toHundredths(stockRadius), toHundredths(self.end[:, 0])
+
+    # Incremental moves in hundredths. They are differences of rounded absolute
+    #   positions so they always add up to the exact end point
+    def moveHundredths(self, current_x, current_z, stockRadius):
+        machine_x, machine_z = self.machineHundredths(stockRadius)
+        previous_x = np.concatenate(([current_x], machine_x[:-1]))
+        previous_z = np.concatenate(([current_z], machine_z[:-1]))
+        return machine_x - previous_x, machine_z - previous_z
+
+    # Arc center offsets from the end point in hundredths, the M99 I and K
+    def arcCenterHundredths(self):
+        return (toHundredths(self.end[:, 0]) - toHundredths(self.center[:, 0]),
+                toHundredths(self.end[:, 1]) - toHundredths(self.center[:, 1]))
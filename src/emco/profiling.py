@@ -0,0 +1,227 @@
+# Instrumentation for the conversion pipeline
+# Stages are timed with default_profiler.stage(name) as a context manager or
+#   the timedStage(name) decorator, and counted things (entities, blocks) go
+#   through count(). Everything is off until enable() is called, a disabled
+#   stage costs one attribute check, so the hooks stay in the code for good
+#
+# Stage times include the stages nested inside them. With enable(memory=True)
+#   every stage also records the peak Python memory allocated above what was
+#   in use when it started, using tracemalloc, which slows things down a lot
+#   so it's only worth it when memory is the question
+#
+# snapshot() gives a JSON ready dict, merge() adds one from another process
+#   into this profiler, which is how batch workers report back
+import functools
+import json
+import sys
+import threading
+import time
+import tracemalloc
+
+# Bump when the snapshot layout changes, so stored reports can be told apart
+PROFILE_VERSION = 1
+
+class StageStats:
+    __slots__ = ('calls', 'total', 'max', 'peak')
+
+    def __init__(self):
+        self.calls = 0
+        # Seconds, all calls together and the slowest one
+        self.total = 0.0
+        self.max = 0.0
+        # Most memory in bytes allocated during one call, None when not traced
+        self.peak = None
+
+    def toDict(self):
+        return {'calls': self.calls, 'total': self.total, 'max': self.max, 'peak': self.peak}
+
+class TimedStage:
+    __slots__ = ('profiler', 'name', 'start', 'trace')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.trace = self.profiler.memory and tracemalloc.is_tracing()
+        if self.trace:
+            self.profiler.enterMemory()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        peak = self.profiler.exitMemory() if self.trace else None
+        self.profiler.record(self.name, elapsed, peak)
+        return False
+
+class NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_STAGE = NullStage()
+
+class Profiler:
+
+    def __init__(self):
+        self.enabled = False
+        self.memory = False
+        self.stages = {}
+        self.counters = {}
+        # Process peak resident memory in KB, filled in by snapshot()
+        self.rss_kb = None
+        self._lock = threading.Lock()
+        # Per thread stack of [memory in use at start, peak seen so far] for
+        #   the traced stages currently open
+        self._local = threading.local()
+        self._started_tracing = False
+
+    def enable(self, memory=False):
+        self.enabled = True
+        self.memory = memory
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def disable(self):
+        self.enabled = False
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        self.memory = False
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+            self.counters = {}
+            self.rss_kb = None
+
+    # Context manager timing one run of a stage
+    def stage(self, name):
+        if not self.enabled:
+            return NULL_STAGE
+        return TimedStage(self, name)
+
+    def count(self, name, amount=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record(self, name, elapsed, peak=None):
+        with self._lock:
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = StageStats()
+            stats.calls += 1
+            stats.total += elapsed
+            stats.max = max(stats.max, elapsed)
+            if peak is not None:
+                stats.peak = max(stats.peak or 0, peak)
+
+    # tracemalloc only has one peak, so opening a nested stage folds the peak
+    #   so far into its parent before resetting it
+    def enterMemory(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1][1] = max(stack[-1][1], peak)
+        tracemalloc.reset_peak()
+        stack.append([current, current])
+
+    def exitMemory(self):
+        stack = self._local.stack
+        start, peak = stack.pop()
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        if stack:
+            stack[-1][1] = max(stack[-1][1], peak)
+        return peak - start
+
+    # JSON ready dict of everything recorded so far
+    def snapshot(self):
+        with self._lock:
+            return {
+                'version': PROFILE_VERSION,
+                'stages': {name: stats.toDict() for name, stats in self.stages.items()},
+                'counters': dict(self.counters),
+                'rss_kb': peakRss(),
+            }
+
+    # Adds a snapshot, from another process for example, into this profiler
+    def merge(self, snapshot):
+        with self._lock:
+            for name, values in snapshot['stages'].items():
+                stats = self.stages.get(name)
+                if stats is None:
+                    stats = self.stages[name] = StageStats()
+                stats.calls += values['calls']
+                stats.total += values['total']
+                stats.max = max(stats.max, values['max'])
+                if values['peak'] is not None:
+                    stats.peak = max(stats.peak or 0, values['peak'])
+            for name, amount in snapshot['counters'].items():
+                self.counters[name] = self.counters.get(name, 0) + amount
+            if snapshot.get('rss_kb') is not None:
+                self.rss_kb = max(self.rss_kb or 0, snapshot['rss_kb'])
+
+    # Report lines, slowest stage first
+    def summary(self):
+        lines = [f"{'stage':<28} {'calls':>6} {'total ms':>10} {'max ms':>9} {'peak MB':>8}"]
+        for name, stats in sorted(self.stages.items(), key=lambda item: -item[1].total):
+            peak = f'{stats.peak / 1e6:>8.1f}' if stats.peak is not None else f"{'':>8}"
+            lines.append(f'{name:<28} {stats.calls:>6} {stats.total*1000:>10.1f} {stats.max*1000:>9.1f} {peak}')
+        for name, amount in sorted(self.counters.items()):
+            lines.append(f'{name:<28} {amount:>6}')
+        rss = self.rss_kb if self.rss_kb is not None else peakRss()
+        if rss is not None:
+            lines.append(f'peak resident memory {rss / 1024:.1f} MB')
+        return lines
+
+    # Writes the snapshot as JSON with where it was taken, plus any extra keys
+    def writeJson(self, file_path, **extra):
+        report = self.snapshot()
+        if self.rss_kb is not None:
+            report['rss_kb'] = max(self.rss_kb, report['rss_kb'] or 0)
+        report.update({
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': sys.version.split()[0],
+            'platform': sys.platform,
+        })
+        report.update(extra)
+        with open(file_path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+# Peak resident memory of this process in KB, None where it can't be read
+def peakRss():
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux KB
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+# Shared profiler the pipeline hooks report to
+default_profiler = Profiler()
+
+# Decorator timing every call of a function as stage name
+def timedStage(name):
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not default_profiler.enabled:
+                return function(*args, **kwargs)
+            with default_profiler.stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def count(name, amount=1):
+    default_profiler.count(name, amount)
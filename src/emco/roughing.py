@@ -0,0 +1,116 @@
+# Stock clipping for roughing passes
+# A roughing pass traces the profile shifted out by the pass offset. The tool
+#   only removes material where that shifted profile is inside the stock, i.e.
+#   below the stock radius, since every earlier pass was further out. Clipping
+#   the profile at level = stockRadius - offset keeps just the pieces that cut,
+#   and the emitter rapids along the stock surface between them
+import math
+
+# Roughing modes
+#   subroutine - every pass calls the full profile subroutine shifted in X
+#   clipped    - every pass only follows the parts of the profile that cut
+ROUGHING_MODES = ('subroutine', 'clipped')
+
+# Points within this of the clip level count as on it
+CLIP_EPSILON = 1e-9
+
+# Arc sweep in radians from start to end, positive is counterclockwise. The
+#   parsed direction is the lathe sense, "cw" travels counterclockwise in the sketch
+def arcSweep(entity):
+    center_x, center_y = entity['center_point']
+    start_x, start_y = entity['start_point']
+    end_x, end_y = entity['end_point']
+    start_angle = math.atan2(start_y - center_y, start_x - center_x)
+    end_angle = math.atan2(end_y - center_y, end_x - center_x)
+    if entity['direction'] == "cw":
+        return start_angle, (end_angle - start_angle) % (2 * math.pi)
+    return start_angle, -((start_angle - end_angle) % (2 * math.pi))
+
+# Point on the arc at fraction t of its sweep
+def arcPoint(entity, start_angle, sweep, t):
+    center_x, center_y = entity['center_point']
+    radius = entity['radius']
+    angle = start_angle + sweep * t
+    return (center_x + radius * math.cos(angle), center_y + radius * math.sin(angle))
+
+# Fractions along the arc where it crosses y = level
+def arcCrossings(entity, start_angle, sweep, level):
+    center_x, center_y = entity['center_point']
+    radius = entity['radius']
+    if radius == 0 or sweep == 0:
+        return []
+    v = (level - center_y) / radius
+    if abs(v) > 1:
+        return []
+    crossings = []
+    for angle in (math.asin(v), math.pi - math.asin(v)):
+        if sweep > 0:
+            t = ((angle - start_angle) % (2 * math.pi)) / sweep
+        else:
+            t = ((start_angle - angle) % (2 * math.pi)) / -sweep
+        if CLIP_EPSILON < t < 1 - CLIP_EPSILON:
+            crossings.append(t)
+    return sorted(crossings)
+
+# Copy of a segment running between two new points. Crossing points land
+#   exactly on the clip level, x is rounded to the Emco's resolution
+def subSegment(entity, start_point, end_point):
+    piece = dict(entity)
+    piece['start_point'] = start_point
+    piece['end_point'] = end_point
+    return piece
+
+def onLevel(point, level):
+    return (round(point[0], 2), level)
+
+# Splits one segment into pieces and says which are below the clip level
+def splitSegment(entity, level):
+    start_point = entity['start_point']
+    end_point = entity['end_point']
+    if entity['type'] == 'LINE':
+        # Height of each end above the level, ends on the level count as 0
+        start_side = start_point[1] - level
+        end_side = end_point[1] - level
+        if abs(start_side) <= CLIP_EPSILON:
+            start_side = 0
+        if abs(end_side) <= CLIP_EPSILON:
+            end_side = 0
+        if start_side * end_side >= 0:
+            return [(entity, start_side < 0 or end_side < 0)]
+        t = (level - start_point[1]) / (end_point[1] - start_point[1])
+        crossing = onLevel((start_point[0] + (end_point[0] - start_point[0]) * t, level), level)
+        return [(subSegment(entity, start_point, crossing), start_side < 0),
+                (subSegment(entity, crossing, end_point), end_side < 0)]
+
+    start_angle, sweep = arcSweep(entity)
+    cuts = [0.0] + arcCrossings(entity, start_angle, sweep, level) + [1.0]
+    pieces = []
+    for a, b in zip(cuts, cuts[1:]):
+        piece_start = start_point if a == 0.0 else onLevel(arcPoint(entity, start_angle, sweep, a), level)
+        piece_end = end_point if b == 1.0 else onLevel(arcPoint(entity, start_angle, sweep, b), level)
+        middle = arcPoint(entity, start_angle, sweep, (a + b) / 2)
+        pieces.append((subSegment(entity, piece_start, piece_end), middle[1] < level - CLIP_EPSILON))
+    return pieces
+
+# Returns the runs of the profile that are below level, each a list of
+#   segments in cutting order. Polylines are treated as chains of lines
+def clipBelow(entities, level):
+    runs = []
+    run = []
+    for entity in entities:
+        if entity['type'] == 'POLYLINE':
+            vertices = entity['vertices']
+            pieces = []
+            for start_point, end_point in zip(vertices, vertices[1:]):
+                pieces.extend(splitSegment({'type': 'LINE', 'start_point': start_point, 'end_point': end_point}, level))
+        else:
+            pieces = splitSegment(entity, level)
+        for piece, below in pieces:
+            if below:
+                run.append(piece)
+            elif run:
+                runs.append(run)
+                run = []
+    if run:
+        runs.append(run)
+    return runs
@@ -0,0 +1,159 @@
+# Removes redundant segments from a chained profile before emission
+# Every segment becomes at least one block, and every block costs upload time
+#   and controller memory. CAD exports are full of collinear runs of short lines,
+#   arcs cut into several pieces and moves that round to nothing, so:
+#   - segments shorter than the Emco's resolution are dropped
+#   - runs of lines that stay within tolerance of one line are merged, checked
+#     one point at a time so long runs cost the same per segment as short ones
+#   - touching arcs on the same circle going the same way are joined, as long
+#     as the result stays inside one quadrant
+import math
+from emco.fitting import FIT_TOLERANCE, arcEntity, splitQuadrants
+from emco.roughing import arcSweep
+from emco.profiling import timedStage
+
+class SimplifyResult:
+    __slots__ = ('segments', 'input_count', 'zero_length', 'lines_merged', 'arcs_merged')
+
+    def __init__(self, input_count):
+        self.segments = []
+        self.input_count = input_count
+        # Segments dropped because they emit no move
+        self.zero_length = 0
+        # Lines and arcs folded into a neighbour
+        self.lines_merged = 0
+        self.arcs_merged = 0
+
+    def removed(self):
+        return self.input_count - len(self.segments)
+
+    def summary(self):
+        return (f'{self.input_count} segments -> {len(self.segments)}, '
+                f'{self.zero_length} zero length dropped, {self.lines_merged} lines and '
+                f'{self.arcs_merged} arcs merged')
+
+# Line run being merged. Every point of the run has to stay within tolerance
+#   of the line from its first point to its newest one. A point at distance d
+#   from the first point allows directions within asin(tolerance / d) of its
+#   own, so only the intersection of those cones and the farthest distance are
+#   kept and a new end point is checked against them in constant time
+class LineRun:
+    __slots__ = ('start', 'tolerance', 'reference', 'low', 'high', 'farthest')
+
+    def __init__(self, start_point, end_point, tolerance):
+        self.start = start_point
+        self.tolerance = tolerance
+        # Direction of the first point farther than tolerance from the start,
+        #   the cone's angles are relative to it. None until there is one
+        self.reference = None
+        # Cone of allowed directions
+        self.low = -math.pi
+        self.high = math.pi
+        # Distance of the run's farthest point from the start
+        self.farthest = 0.0
+        self.add(end_point)
+
+    # Angle of (dx, dy) relative to reference, in -pi .. pi
+    def relative(self, dx, dy):
+        return (math.atan2(dy, dx) - self.reference + math.pi) % (2 * math.pi) - math.pi
+
+    # True when the run still fits one line with end_point as its new end
+    def fits(self, end_point):
+        dx = end_point[0] - self.start[0]
+        dy = end_point[1] - self.start[1]
+        length = math.hypot(dx, dy)
+        # No point of the run may lie past the new end
+        if length == 0 or self.farthest > length + self.tolerance:
+            return False
+        if self.reference is None:
+            return True
+        return self.low <= self.relative(dx, dy) <= self.high
+
+    def add(self, point):
+        dx = point[0] - self.start[0]
+        dy = point[1] - self.start[1]
+        distance = math.hypot(dx, dy)
+        self.farthest = max(self.farthest, distance)
+        # Points this close to the start fit any direction
+        if distance <= self.tolerance:
+            return
+        if self.reference is None:
+            self.reference = math.atan2(dy, dx)
+        angle = self.relative(dx, dy)
+        spread = math.asin(self.tolerance / distance)
+        self.low = max(self.low, angle - spread)
+        self.high = min(self.high, angle + spread)
+
+# True when the segment moves less than half a hundredth in both axes, so it
+#   emits an all zero block
+def isZeroLength(entity):
+    start_x, start_y = entity['start_point']
+    end_x, end_y = entity['end_point']
+    return abs(end_x - start_x) < 0.005 and abs(end_y - start_y) < 0.005
+
+# Joins arc b onto arc a when they share a circle and direction and the result
+#   is still one quadrant. Returns the joined arc or None
+def joinArcs(a, b, tolerance):
+    if a['direction'] != b['direction']:
+        return None
+    if math.dist(a['center_point'], b['center_point']) > tolerance or abs(a['radius'] - b['radius']) > tolerance:
+        return None
+    first_start, first_sweep = arcSweep(a)
+    second_start, second_sweep = arcSweep(b)
+    if abs(first_sweep + second_sweep) > math.pi / 2 + 1e-9:
+        return None
+    joined = arcEntity(a['center_point'], a['radius'], a['start_point'], b['end_point'], a['direction'] == "cw")
+    if len(splitQuadrants(joined)) > 1:
+        return None
+    joined['start_point'] = a['start_point']
+    joined['end_point'] = b['end_point']
+    return joined
+
+# Simplifies segments in cutting order, as they come out of chainSegments.
+#   Polylines are passed through untouched
+@timedStage('simplifySegments')
+def simplifySegments(segments, tolerance=FIT_TOLERANCE):
+    result = SimplifyResult(len(segments))
+    output = result.segments
+    # LineRun being built, merged into output[-1] as it grows
+    run = None
+    # Start of the profile when its first segments are dropped
+    start_point = None
+    for entity in segments:
+        if entity['type'] == 'POLYLINE':
+            output.append(entity)
+            run = None
+            continue
+        if isZeroLength(entity):
+            result.zero_length += 1
+            if not output and start_point is None:
+                start_point = entity['start_point']
+            continue
+        # Keep the profile connected across a dropped segment
+        if output and output[-1]['type'] != 'POLYLINE':
+            start_point = output[-1]['end_point']
+        if start_point is not None and entity['start_point'] != start_point:
+            entity = dict(entity)
+            entity['start_point'] = start_point
+        start_point = None
+
+        if entity['type'] == 'LINE':
+            if run is not None and run.fits(entity['end_point']):
+                run.add(entity['end_point'])
+                output[-1] = dict(output[-1])
+                output[-1]['end_point'] = entity['end_point']
+                result.lines_merged += 1
+                continue
+            output.append(entity)
+            run = LineRun(entity['start_point'], entity['end_point'], tolerance)
+            continue
+
+        run = None
+        if output and output[-1]['type'] == 'ARC':
+            joined = joinArcs(output[-1], entity, tolerance)
+            if joined is not None:
+                output[-1] = joined
+                result.arcs_merged += 1
+                continue
+        output.append(entity)
+    return result
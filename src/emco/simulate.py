@@ -0,0 +1,474 @@
+# Backplotter for the Emco incremental dialect written by emco.blocks
+# Runs a .cnc program the way the control would (G00-G03 with M99 I/K, G25 L
+#   subroutine calls, M17 returns, M30 end), rebuilds the absolute toolpath and
+#   checks it against the profile:
+#   - gouges, feed moves that cut into the finished part
+#   - rapids, G00 moves that pass through the finished part
+#   - leftover, profile points no feed move came within tolerance of
+#
+# Only the program flow is interpreted block by block. Positions are one
+#   cumulative sum over the executed increments, arcs are resolved and
+#   tessellated as arrays and the distance checks are vectorized, so checking
+#   every program in a batch run is cheap
+import math
+import re
+import numpy as np
+from emco.core import prepareProfile
+from emco.profile import ARC, POLYLINE
+from emco.roughing import arcSweep
+from emco.profiling import timedStage
+
+# Gouges, leftovers and arc center misses smaller than this are rounding.
+#   Chaining snaps segment ends within 0.01mm together and arc ends and centers
+#   are each rounded to the 0.01mm grid, so a drawn arc's radius can disagree
+#   with itself by close to two hundredths
+DEFAULT_TOLERANCE = 0.02
+# Max distance between an arc and the chords it's checked as
+CHORD_TOLERANCE = 0.001
+# Feed moves are checked at points at most this far apart
+SAMPLE_STEP = 0.05
+# Stop runaway programs, a subroutine calling itself for example
+MAX_EXECUTED = 10000000
+
+# Instruction kinds
+MOVE = 0
+ARC_CENTER = 1
+M_CODE = 2
+CALL = 3
+NOOP = 4
+
+# Block number at the start of a line, wider than the column past 999
+BLOCK_NUMBER = re.compile(r' *(\d+)')
+
+# Parses program text into {block number: (kind, values)}. Lines that aren't
+#   numbered blocks (%, the column header, M end of input) are skipped
+def parseCnc(text):
+    program = {}
+    for line_number, line in enumerate(text.splitlines(), 1):
+        match = BLOCK_NUMBER.match(line)
+        if match is None:
+            continue
+        number = int(match.group(1))
+        rest = line[match.end():]
+        try:
+            if rest.startswith('M99'):
+                fields = rest[3:].split()
+                program[number] = (ARC_CENTER, (int(fields[0][1:]), int(fields[1][1:])))
+            elif rest.startswith('M'):
+                program[number] = (M_CODE, int(rest[1:3]))
+            else:
+                fields = rest.split()
+                code = int(fields[0])
+                if code == 25:
+                    program[number] = (CALL, int(fields[1][1:]))
+                elif code == 21:
+                    program[number] = (NOOP, None)
+                elif code in (0, 1, 2, 3):
+                    feed = int(fields[3]) if len(fields) > 3 else None
+                    program[number] = (MOVE, (code, int(fields[1]), int(fields[2]), feed))
+                else:
+                    raise ValueError(f'G{code:02} is not supported')
+        except (IndexError, ValueError) as e:
+            raise ValueError(f'line {line_number}: can not read {line.strip()!r}: {e}') from None
+    return program
+
+class Toolpath:
+    __slots__ = ('opcode', 'start', 'end', 'center', 'center_error', 'feed', 'block', 'program', 'pass_index', 'calls')
+
+    def __init__(self, count):
+        # G code of every executed move, 0-3
+        self.opcode = np.zeros(count, dtype=np.int8)
+        # Absolute machine positions in mm as (X, Z), X0 is the stock surface
+        self.start = np.zeros((count, 2))
+        self.end = np.zeros((count, 2))
+        # Arc centers, NaN for straight moves
+        self.center = np.full((count, 2), np.nan)
+        # How far the M99 center misses being a quadrant arc's center, the
+        #   difference of its distances to the ends in mm plus pi when the arc
+        #   would turn more than a quadrant. NaN for straight moves
+        self.center_error = np.full(count, np.nan)
+        # Feedrate of feed moves, 0 for rapids
+        self.feed = np.zeros(count)
+        # Block number each move came from
+        self.block = np.zeros(count, dtype=np.int64)
+        # Which of a split job's chained programs each move came from
+        self.program = np.zeros(count, dtype=np.int64)
+        # Passes are numbered from 0, each one leaves the start point and
+        #   comes back to it. -1 for moves that never leave
+        self.pass_index = np.full(count, -1, dtype=np.int64)
+        # Number of G25 calls made
+        self.calls = 0
+
+    def __len__(self):
+        return len(self.opcode)
+
+    # Path length of every move in mm
+    def lengths(self):
+        chord = np.hypot(*(self.end - self.start).T)
+        arcs = ~np.isnan(self.center[:, 0])
+        if not arcs.any():
+            return chord
+        radius, _, sweep = self.arcGeometry(arcs)
+        lengths = chord.copy()
+        lengths[arcs] = radius * np.abs(sweep)
+        return lengths
+
+    # Radius, start angle and signed sweep of the arcs picked by mask. Angles
+    #   are in the Z (horizontal) / X (vertical) plane, G02 turns clockwise
+    def arcGeometry(self, mask):
+        center = self.center[mask]
+        start = self.start[mask] - center
+        end = self.end[mask] - center
+        radius = (np.hypot(*start.T) + np.hypot(*end.T)) / 2
+        start_angle = np.arctan2(start[:, 0], start[:, 1])
+        end_angle = np.arctan2(end[:, 0], end[:, 1])
+        ccw = (end_angle - start_angle) % (2 * math.pi)
+        sweep = np.where(self.opcode[mask] == 3, ccw, ccw - 2 * math.pi)
+        # Ending where it started is a zero length arc, the Emco can't cut full circles
+        sweep = np.where(np.isclose(np.abs(sweep), 2 * math.pi), 0.0, sweep)
+        return radius, start_angle, sweep
+
+    # Moves as points along the path, arcs within CHORD_TOLERANCE and lines
+    #   every step mm, each move's points together and in order. Returns
+    #   (points, move index of each point)
+    def samples(self, mask=None, step=SAMPLE_STEP):
+        indexes = np.nonzero(np.ones(len(self), dtype=bool) if mask is None else mask)[0]
+        points = []
+        owners = []
+        arcs = ~np.isnan(self.center[indexes, 0])
+        lines = indexes[~arcs]
+        if len(lines):
+            delta = self.end[lines] - self.start[lines]
+            counts = np.maximum(np.ceil(np.hypot(*delta.T) / step).astype(np.int64), 1) + 1
+            owner = np.repeat(lines, counts)
+            # Fraction along each move, 0 to 1 inclusive
+            offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            t = offsets / np.repeat(counts - 1, counts)
+            points.append(self.start[owner] + (self.end[owner] - self.start[owner]) * t[:, None])
+            owners.append(owner)
+        arc_moves = indexes[arcs]
+        if len(arc_moves):
+            picked = np.zeros(len(self), dtype=bool)
+            picked[arc_moves] = True
+            radius, start_angle, sweep = self.arcGeometry(picked)
+            angle_step = 2 * np.arccos(np.clip(1 - CHORD_TOLERANCE / np.maximum(radius, CHORD_TOLERANCE), -1, 1))
+            angle_step = np.minimum(angle_step, step / np.maximum(radius, 1e-9))
+            counts = np.maximum(np.ceil(np.abs(sweep) / angle_step).astype(np.int64), 1) + 1
+            owner = np.repeat(arc_moves, counts)
+            offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            angle = np.repeat(start_angle, counts) + np.repeat(sweep, counts) * offsets / np.repeat(counts - 1, counts)
+            center = self.center[owner]
+            r = np.repeat(radius, counts)
+            points.append(np.column_stack((center[:, 0] + r * np.sin(angle), center[:, 1] + r * np.cos(angle))))
+            owners.append(owner)
+        if not points:
+            return np.zeros((0, 2)), np.zeros(0, dtype=np.int64)
+        return np.concatenate(points), np.concatenate(owners)
+
+# Runs the program flow and returns the executed moves as a Toolpath
+@timedStage('runProgram')
+def runProgram(text):
+    program = parseCnc(text)
+    numbers = sorted(program)
+    position = {number: i for i, number in enumerate(numbers)}
+
+    moves = []
+    stack = []
+    calls = 0
+    pc = 0
+    executed = 0
+    while pc < len(numbers):
+        executed += 1
+        if executed > MAX_EXECUTED:
+            raise ValueError('program does not end, too many blocks executed')
+        number = numbers[pc]
+        kind, values = program[number]
+        pc += 1
+        if kind == MOVE:
+            opcode, x, z, feed = values
+            arc = None
+            if opcode in (2, 3):
+                if pc >= len(numbers) or program[numbers[pc]][0] != ARC_CENTER:
+                    raise ValueError(f'block {number}: G{opcode:02} is not followed by M99')
+                arc = program[numbers[pc]][1]
+                pc += 1
+            moves.append((opcode, x, z, feed or 0, number, arc))
+        elif kind == CALL:
+            if values not in position:
+                raise ValueError(f'block {number}: G25 calls missing block {values}')
+            stack.append(pc)
+            pc = position[values]
+            calls += 1
+        elif kind == M_CODE:
+            if values == 17:
+                if not stack:
+                    break
+                pc = stack.pop()
+            elif values == 30:
+                break
+        elif kind == ARC_CENTER:
+            raise ValueError(f'block {number}: M99 without an arc')
+
+    toolpath = Toolpath(len(moves))
+    toolpath.calls = calls
+    if not moves:
+        return toolpath
+    opcode, x, z, feed, block, arcs = zip(*moves)
+    toolpath.opcode[:] = opcode
+    toolpath.feed[:] = feed
+    toolpath.block[:] = block
+
+    # Absolute positions in hundredths are one running sum of the increments
+    ends = np.cumsum(np.column_stack((x, z)), axis=0)
+    starts = np.vstack(([0, 0], ends[:-1]))
+    toolpath.start[:] = starts / 100
+    toolpath.end[:] = ends / 100
+
+    # A trip starts whenever the tool leaves the start point. Trips with a feed
+    #   move are passes, rapid only ones like the start block retract aren't
+    at_start = ~starts.any(axis=1)
+    leaving = at_start & ends.any(axis=1)
+    trip = np.cumsum(leaving) - 1
+    cutting = np.zeros(max(int(trip[-1]) + 1, 1), dtype=bool)
+    feeds = (toolpath.opcode != 0) & (trip >= 0)
+    cutting[trip[feeds]] = True
+    trip_pass = np.where(cutting, np.cumsum(cutting) - 1, -1)
+    # Moves while sitting at the start point, before anything leaves, and
+    #   rapid only trips are outside any pass
+    toolpath.pass_index[:] = np.where(trip < 0, -1, trip_pass[np.maximum(trip, 0)])
+
+    arc_moves = np.array([i for i, arc in enumerate(arcs) if arc is not None], dtype=np.int64)
+    if len(arc_moves):
+        centers = np.array([arcs[i] for i in arc_moves], dtype=float) / 100
+        toolpath.center[arc_moves], toolpath.center_error[arc_moves] = resolveCenters(
+            toolpath.start[arc_moves], toolpath.end[arc_moves], centers, toolpath.opcode[arc_moves])
+    return toolpath
+
+# One Toolpath for the chained programs of a split job, run one after the
+#   other. They all start and end at the start point
+def runPrograms(texts):
+    toolpaths = [runProgram(text) for text in texts]
+    toolpath = Toolpath(sum(len(part) for part in toolpaths))
+    offset = 0
+    passes = 0
+    for index, part in enumerate(toolpaths):
+        moves = slice(offset, offset + len(part))
+        for name in ('opcode', 'start', 'end', 'center', 'center_error', 'feed', 'block'):
+            getattr(toolpath, name)[moves] = getattr(part, name)
+        toolpath.program[moves] = index
+        toolpath.pass_index[moves] = np.where(part.pass_index < 0, -1, part.pass_index + passes)
+        toolpath.calls += part.calls
+        passes += int(part.pass_index.max()) + 1 if len(part) else 0
+        offset += len(part)
+    return toolpath
+
+# M99 I/K are unsigned distances from the end point to the center, I along Z
+#   and K along X. Of the four signed candidates the center is the one as far
+#   from the start as from the end that turns the arc's way in at most a
+#   quadrant. A quarter circle has two that are equidistant, mirrored across
+#   its chord, and only the direction tells them apart. Returns the centers
+#   and how far each misses, see Toolpath.center_error
+def resolveCenters(starts, ends, offsets, opcodes):
+    best = None
+    best_error = None
+    for sign_x in (-1, 1):
+        for sign_z in (-1, 1):
+            center = np.column_stack((ends[:, 0] - sign_x * offsets[:, 1], ends[:, 1] - sign_z * offsets[:, 0]))
+            start = starts - center
+            end = ends - center
+            error = np.abs(np.hypot(*start.T) - np.hypot(*end.T))
+            ccw = (np.arctan2(end[:, 0], end[:, 1]) - np.arctan2(start[:, 0], start[:, 1])) % (2 * math.pi)
+            sweep = np.where(opcodes == 3, ccw, 2 * math.pi - ccw)
+            error = error + (sweep > math.pi / 2 + 1e-3) * math.pi
+            if best is None:
+                best = center
+                best_error = error
+            else:
+                better = error < best_error
+                best[better] = center[better]
+                best_error = np.where(better, error, best_error)
+    return best, best_error
+
+# Profile as a polyline of (X, Z) machine points in mm, arcs within CHORD_TOLERANCE
+def profilePolyline(parsed_data, stockRadius):
+    profile = prepareProfile(parsed_data)
+    points = []
+    for i, segment in enumerate(profile):
+        vertices = profile.segmentVertices(i) if profile.kind[i] == POLYLINE else None
+        if not points:
+            points.append(vertices[0] if vertices else segment['start_point'])
+        if profile.kind[i] == ARC:
+            start_angle, sweep = arcSweep(segment)
+            radius = segment['radius']
+            center = segment['center_point']
+            step = 2 * math.acos(max(1 - CHORD_TOLERANCE / max(radius, CHORD_TOLERANCE), -1))
+            count = max(int(math.ceil(abs(sweep) / step)), 1)
+            for t in np.arange(1, count) / count:
+                angle = start_angle + sweep * t
+                points.append((center[0] + radius * math.cos(angle), center[1] + radius * math.sin(angle)))
+            points.append(segment['end_point'])
+        elif vertices is not None:
+            points.extend(vertices[1:])
+        else:
+            points.append(segment['end_point'])
+    sketch = np.array(points, dtype=float).reshape(-1, 2)
+    return np.column_stack((sketch[:, 1] - stockRadius, sketch[:, 0]))
+
+# Distance from every point to the nearest of the segments a[i] -> b[i].
+#   Points go in chunks against only the segments whose bounding box comes
+#   within margin of the chunk's, so mostly close points are cheap. Points
+#   that end up further than margin are measured against every segment
+def distanceToSegments(points, a, b, margin, chunk=256):
+    distances = np.full(len(points), np.inf)
+    if len(a) == 0 or len(points) == 0:
+        return distances
+    low = np.minimum(a, b) - margin
+    high = np.maximum(a, b) + margin
+    for start in range(0, len(points), chunk):
+        p = points[start:start + chunk]
+        near = ((high >= p.min(axis=0)) & (low <= p.max(axis=0))).all(axis=1)
+        if near.any():
+            distances[start:start + chunk] = segmentDistance(p, a[near], b[near])
+    far = np.nonzero(distances > margin)[0]
+    if len(far):
+        rows = max(1, (1 << 20) // len(a))
+        for start in range(0, len(far), rows):
+            index = far[start:start + rows]
+            distances[index] = segmentDistance(points[index], a, b)
+    return distances
+
+# Brute force distance from each point to the nearest segment
+def segmentDistance(points, a, b):
+    px = points[:, 0, None]
+    pz = points[:, 1, None]
+    dx = b[:, 0] - a[:, 0]
+    dz = b[:, 1] - a[:, 1]
+    length2 = np.maximum(dx * dx + dz * dz, 1e-18)
+    t = np.clip(((px - a[:, 0]) * dx + (pz - a[:, 1]) * dz) / length2, 0, 1)
+    ox = px - a[:, 0] - t * dx
+    oz = pz - a[:, 1] - t * dz
+    return np.sqrt((ox * ox + oz * oz).min(axis=1))
+
+# Profile X at each Z, the finished part's surface. NaN outside the profile.
+#   The profile runs toward -Z, so reversed it's already sorted with the two
+#   ends of every vertical step in the right order
+def surfaceX(polyline, z):
+    polyline = polyline[::-1]
+    order = np.argsort(polyline[:, 1], kind='stable')
+    zs = polyline[order, 1]
+    xs = polyline[order, 0]
+    surface = np.interp(z, zs, xs)
+    return np.where((z >= zs[0]) & (z <= zs[-1]), surface, np.nan)
+
+# Block in a report, chained programs after the first are named by their
+#   file suffix
+def blockName(program, block):
+    return f'block {block}' if program == 0 else f'block {block} of program {program + 1}'
+
+class VerifyReport:
+    __slots__ = ('tolerance', 'moves', 'passes', 'arcs', 'gouges', 'max_gouge', 'rapids', 'leftover', 'max_leftover')
+
+    def __init__(self, tolerance):
+        self.tolerance = tolerance
+        self.moves = 0
+        self.passes = 0
+        # (program index, block number) of arcs whose M99 I/K don't give a
+        #   center the machine can cut them around
+        self.arcs = []
+        # (program index, block number, X, Z, depth in mm) of the deepest
+        #   point of each feed move that cuts into the part
+        self.gouges = []
+        self.max_gouge = 0.0
+        # (program index, block number, X, Z, depth) of rapids through the part
+        self.rapids = []
+        # (X, Z, distance) of profile points no cut came near
+        self.leftover = []
+        self.max_leftover = 0.0
+
+    def ok(self):
+        return not self.arcs and not self.gouges and not self.rapids and not self.leftover
+
+    def summary(self):
+        if self.ok():
+            return (f'toolpath ok, {self.moves} moves in {self.passes} passes, '
+                    f'profile cut within {self.max_leftover:.3f} mm')
+        parts = []
+        if self.arcs:
+            parts.append(f'{len(self.arcs)} arcs with a bad M99 center, first at {blockName(*self.arcs[0])}')
+        if self.gouges:
+            program, block, x, z, depth = max(self.gouges, key=lambda gouge: gouge[4])
+            parts.append(f'{len(self.gouges)} gouging moves, deepest {depth:.3f} mm at '
+                         f'{blockName(program, block)} (X{x:.2f} Z{z:.2f})')
+        if self.rapids:
+            program, block = self.rapids[0][:2]
+            parts.append(f'{len(self.rapids)} rapids through the part, first at {blockName(program, block)}')
+        if self.leftover:
+            x, z, distance = max(self.leftover, key=lambda point: point[2])
+            parts.append(f'profile not cut by up to {distance:.3f} mm near X{x:.2f} Z{z:.2f}')
+        return '; '.join(parts)
+
+# Checks a Toolpath against the parsed profile
+@timedStage('verifyToolpath')
+def verifyToolpath(toolpath, parsed_data, stockRadius, tolerance=DEFAULT_TOLERANCE):
+    report = VerifyReport(tolerance)
+    report.moves = len(toolpath)
+    report.passes = int(toolpath.pass_index.max()) + 1 if len(toolpath) else 0
+    polyline = profilePolyline(parsed_data, stockRadius)
+    a = polyline[:-1]
+    b = polyline[1:]
+
+    for move in np.nonzero(toolpath.center_error > tolerance)[0].tolist():
+        report.arcs.append((int(toolpath.program[move]), int(toolpath.block[move])))
+
+    # Points below the surface are inside the part, how deep is their
+    #   distance to the profile
+    points, owners = toolpath.samples()
+    if len(points):
+        surface = surfaceX(polyline, points[:, 1])
+        below = np.nonzero(points[:, 0] < surface - tolerance)[0]
+        if len(below):
+            depth = distanceToSegments(points[below], a, b, tolerance)
+            deep = depth > tolerance
+            below = below[deep]
+            depth = depth[deep]
+            for move in np.unique(owners[below]).tolist():
+                mine = owners[below] == move
+                worst = np.argmax(depth[mine])
+                x, z = points[below[mine][worst]].tolist()
+                found = (int(toolpath.program[move]), int(toolpath.block[move]), x, z, float(depth[mine][worst]))
+                if toolpath.opcode[move] == 0:
+                    report.rapids.append(found)
+                else:
+                    report.gouges.append(found)
+                    report.max_gouge = max(report.max_gouge, found[4])
+
+    # Every profile point should have had a feed move pass within tolerance.
+    #   Lines are checked whole, arcs as their chords
+    cutting = toolpath.opcode != 0
+    if cutting.any() and len(polyline):
+        path, owners = toolpath.samples(cutting, step=math.inf)
+        joined = owners[:-1] == owners[1:]
+        profile_points = densify(polyline)
+        distance = distanceToSegments(profile_points, path[:-1][joined], path[1:][joined], tolerance)
+        report.max_leftover = float(distance.max())
+        for index in np.nonzero(distance > tolerance)[0].tolist():
+            x, z = profile_points[index].tolist()
+            report.leftover.append((x, z, float(distance[index])))
+    return report
+
+# Extra points along a polyline so no two are more than SAMPLE_STEP apart
+def densify(polyline):
+    if len(polyline) < 2:
+        return polyline
+    delta = np.diff(polyline, axis=0)
+    counts = np.maximum(np.ceil(np.hypot(*delta.T) / SAMPLE_STEP).astype(np.int64), 1)
+    owner = np.repeat(np.arange(len(delta)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    t = offsets / np.repeat(counts, counts)
+    return np.vstack((polyline[owner] + delta[owner] * t[:, None], polyline[-1:]))
+
+# Runs and checks program text in one go. texts is one program or the list
+#   of chained programs of a split job, which are checked as one
+def verifyProgram(texts, parsed_data, stockRadius, tolerance=DEFAULT_TOLERANCE):
+    toolpath = runProgram(texts) if isinstance(texts, str) else runPrograms(texts)
+    return verifyToolpath(toolpath, parsed_data, stockRadius, tolerance)
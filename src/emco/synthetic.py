@@ -0,0 +1,155 @@
+# Synthetic profile DXFs for load testing
+# Usage: python -m emco.synthetic <out.dxf> [--segments 10000] [--arcs 0.3] [--noise 0.002]
+#          [--reversed 0.3] [--clutter 0] [--quadrant 2] [--no-shuffle] [--seed 1]
+# Writes a connected lathe profile the way the README asks for one: it starts
+#   at X0 and steps left through the 2nd (or 3rd) quadrant, with the radius
+#   wandering between --min-radius and --max-radius. Made to look like a CAD
+#   export rather than a clean drawing:
+#   - --arcs of the segments are arcs, each within one quadrant of its center
+#     so the converter cuts exactly --segments moves
+#   - --noise moves line start points off the previous segment's end by up to
+#     that much along X or Y. Rounding to hundredths on import can then open
+#     gaps of up to 0.01mm along one axis, which still chain
+#   - --reversed of the lines are drawn end to start
+#   - entities are saved in random order unless --no-shuffle
+#   - --clutter adds that many text, circle and point entities on a TITLE
+#     layer, none of which the converter reads as profile
+import argparse
+import math
+import random
+import sys
+
+PROFILE_LAYER = 'PROFILE'
+CLUTTER_LAYER = 'TITLE'
+
+# Profile as a list of ('LINE', start, end) and ('ARC', center, radius,
+#   start_angle, end_angle) tuples in cutting order, angles in degrees. The
+#   arc tuples are in DXF form, counterclockwise from start_angle to end_angle
+#   whichever way the profile travels them
+def buildProfile(segments, arcs=0.3, step=0.1, noise=0.0, reversed_ratio=0.3, quadrant=2,
+                 min_radius=5.0, max_radius=20.0, seed=1):
+    rng = random.Random(seed)
+    y_sign = 1 if quadrant == 2 else -1
+    x = 0.0
+    y = (min_radius + max_radius) / 2
+    # Radius keeps drifting one way for a while, like a real profile
+    trend = 1
+    entities = []
+    for _ in range(segments):
+        if rng.random() < 0.05:
+            trend = -trend
+        if y + trend * step > max_radius or y + trend * step < min_radius:
+            trend = -trend
+
+        if rng.random() < arcs:
+            # Arc starting tangent to X or Y on a center straight across from
+            #   the start, swept up to 90 degrees so it stays in one quadrant
+            radius = step * rng.uniform(1, 3)
+            sweep = rng.uniform(20, 90)
+            if rng.random() < 0.5:
+                # Center level with the start, to its left
+                center = (x - radius, y)
+                angle = sweep if trend > 0 else -sweep
+                start_angle, end_angle = (0, angle) if angle > 0 else (angle, 0)
+            else:
+                # Center straight above the start when climbing, below when falling
+                center = (x, y + trend * radius)
+                base = 270 if trend > 0 else 90
+                angle = base - sweep if trend > 0 else base + sweep
+                start_angle, end_angle = (angle, base) if trend > 0 else (base, angle)
+            end_x = center[0] + radius * math.cos(math.radians(angle))
+            end_y = center[1] + radius * math.sin(math.radians(angle))
+            if min_radius <= end_y <= max_radius:
+                entities.append(('ARC', center, radius, start_angle % 360, end_angle % 360))
+                x, y = end_x, end_y
+                continue
+
+        end_x = x - step
+        end_y = y + trend * step * rng.uniform(0, 0.5)
+        start = (x, y) if not entities else jitter(rng, (x, y), noise)
+        entities.append(('LINE', start, (end_x, end_y)))
+        x, y = end_x, end_y
+
+    if y_sign < 0:
+        entities = [mirrorEntity(entity) for entity in entities]
+    rng_reverse = random.Random(seed + 1)
+    return [('LINE', entity[2], entity[1]) if entity[0] == 'LINE' and rng_reverse.random() < reversed_ratio else entity
+            for entity in entities]
+
+# Point moved by up to noise along X or Y
+def jitter(rng, point, noise):
+    if not noise:
+        return point
+    offset = rng.uniform(-noise, noise)
+    if rng.random() < 0.5:
+        return (point[0] + offset, point[1])
+    return (point[0], point[1] + offset)
+
+# Mirrors an entity tuple over the sketch X axis, for 3rd quadrant profiles
+def mirrorEntity(entity):
+    if entity[0] == 'LINE':
+        return ('LINE', (entity[1][0], -entity[1][1]), (entity[2][0], -entity[2][1]))
+    _, center, radius, start_angle, end_angle = entity
+    # Mirroring flips the sense, so the counterclockwise arc swaps its ends
+    return ('ARC', (center[0], -center[1]), radius, -end_angle % 360, -start_angle % 360)
+
+# Adds count title block style entities to a modelspace
+def addClutter(msp, count, seed=1, layer=CLUTTER_LAYER):
+    rng = random.Random(seed)
+    for i in range(count):
+        x = (i % 100) * 5.0
+        y = 500.0 + (i // 100) * 5.0
+        kind = rng.randrange(3)
+        if kind == 0:
+            msp.add_text(f'NOTE {i}', dxfattribs={'layer': layer, 'insert': (x, y), 'height': 2.5})
+        elif kind == 1:
+            msp.add_circle((x, y), 1.0, dxfattribs={'layer': layer})
+        else:
+            msp.add_point((x, y), dxfattribs={'layer': layer})
+
+# Writes a synthetic profile DXF, see buildProfile for the options. Returns file_path
+def writeProfileDxf(file_path, segments, arcs=0.3, step=0.1, noise=0.002, reversed_ratio=0.3, quadrant=2,
+                    min_radius=5.0, max_radius=20.0, clutter=0, shuffle=True, seed=1):
+    import ezdxf
+    entities = buildProfile(segments, arcs, step, noise, reversed_ratio, quadrant, min_radius, max_radius, seed)
+    if shuffle:
+        random.Random(seed + 2).shuffle(entities)
+    doc = ezdxf.new()
+    doc.layers.add(PROFILE_LAYER)
+    msp = doc.modelspace()
+    attributes = {'layer': PROFILE_LAYER}
+    for entity in entities:
+        if entity[0] == 'LINE':
+            msp.add_line(entity[1], entity[2], dxfattribs=attributes)
+        else:
+            msp.add_arc(entity[1], entity[2], entity[3], entity[4], dxfattribs=attributes)
+    if clutter:
+        doc.layers.add(CLUTTER_LAYER)
+        addClutter(msp, clutter, seed)
+    doc.saveas(file_path)
+    return file_path
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m emco.synthetic', description='Write a synthetic lathe profile DXF.')
+    parser.add_argument('output', help='DXF file to write')
+    parser.add_argument('--segments', type=int, default=10000, help='number of profile segments')
+    parser.add_argument('--arcs', type=float, default=0.3, help='share of segments that are arcs, 0 to 1')
+    parser.add_argument('--step', type=float, default=0.1, help='length of a segment along Z (mm)')
+    parser.add_argument('--noise', type=float, default=0.002, help='most an endpoint is moved off the profile (mm)')
+    parser.add_argument('--reversed', type=float, default=0.3, help='share of lines drawn end to start')
+    parser.add_argument('--quadrant', type=int, choices=(2, 3), default=2, help='sketch quadrant to draw in')
+    parser.add_argument('--min-radius', type=float, default=5.0)
+    parser.add_argument('--max-radius', type=float, default=20.0)
+    parser.add_argument('--clutter', type=int, default=0, help='extra text, circle and point entities')
+    parser.add_argument('--no-shuffle', dest='shuffle', action='store_false', help='save entities in cutting order')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+    if not 0 <= args.noise < 0.01:
+        parser.error('--noise has to stay under the 0.01mm chaining tolerance')
+    writeProfileDxf(args.output, args.segments, args.arcs, args.step, args.noise, args.reversed, args.quadrant,
+                    args.min_radius, args.max_radius, args.clutter, args.shuffle, args.seed)
+    print(f'wrote {args.segments} segments to {args.output}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,118 @@
+# Background jobs for the GUI
+# Parsing and generating run on one worker thread so the window keeps
+#   repainting. One thread is enough and keeps the Pipeline, which isn't
+#   thread safe, in the hands of one job at a time.
+#
+# Jobs have a kind, "open" or "generate". Submitting a job cancels the
+#   running job of the same kind and replaces one of that kind still waiting,
+#   so a burst of parameter edits ends in one run with the latest values
+#   instead of a queue of stale ones. Cancelling is cooperative: job functions
+#   call job.progress() between stages (Pipeline.listener does that for every
+#   stage) and that raises Cancelled once the job is cancelled.
+#
+# Callbacks are called on the worker thread. The GUI passes Qt signal emit
+#   methods, which hand them over to the GUI thread
+import concurrent.futures
+import threading
+import traceback
+
+# How a job ended, passed to on_finished
+DONE = 'done'
+CANCELLED = 'cancelled'
+FAILED = 'failed'
+
+class Cancelled(Exception):
+    pass
+
+class Job:
+    __slots__ = ('kind', 'number', 'function', 'args', 'quiet', 'runner', 'cancelled', 'future')
+
+    def __init__(self, kind, number, function, args, runner, quiet=False):
+        self.kind = kind
+        # Submission order over all kinds, later jobs have higher numbers
+        self.number = number
+        self.function = function
+        self.args = args
+        # Set for jobs the user didn't ask for directly, whose failures
+        #   shouldn't interrupt them
+        self.quiet = quiet
+        self.runner = runner
+        self.cancelled = threading.Event()
+        self.future = None
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def check(self):
+        if self.cancelled.is_set():
+            raise Cancelled()
+
+    # Reports that the job is on step done of total, named stage. Raises
+    #   Cancelled when the job was cancelled
+    def progress(self, stage, done, total):
+        self.check()
+        if self.runner.on_progress is not None:
+            self.runner.on_progress(self, stage, done, total)
+
+class JobRunner:
+
+    def __init__(self, on_progress=None, on_finished=None):
+        # on_progress(job, stage, done, total) and on_finished(job, status, value)
+        #   where value is the result, or the error message when status is FAILED
+        self.on_progress = on_progress
+        self.on_finished = on_finished
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='emco-worker')
+        self._lock = threading.Lock()
+        # Kind -> submitted job that hasn't finished yet, waiting or running
+        self.jobs = {}
+        self.count = 0
+
+    # Runs function(job, *args) on the worker thread, see the top of the file
+    def submit(self, kind, function, *args, quiet=False):
+        with self._lock:
+            self.count += 1
+            job = Job(kind, self.count, function, args, self, quiet)
+            previous = self.jobs.get(kind)
+            self.jobs[kind] = job
+        if previous is not None:
+            previous.cancel()
+            if previous.future.cancel():
+                self.finish(previous, CANCELLED, None)
+        job.future = self.executor.submit(self.run, job)
+        return job
+
+    def run(self, job):
+        try:
+            job.check()
+            value = job.function(job, *job.args)
+            job.check()
+        except Cancelled:
+            self.finish(job, CANCELLED, None)
+        except Exception as e:
+            traceback.print_exc()
+            self.finish(job, FAILED, f'{type(e).__name__}: {e}')
+        else:
+            self.finish(job, DONE, value)
+
+    def finish(self, job, status, value):
+        with self._lock:
+            if self.jobs.get(job.kind) is job:
+                del self.jobs[job.kind]
+        if self.on_finished is not None:
+            self.on_finished(job, status, value)
+
+    def busy(self):
+        with self._lock:
+            return bool(self.jobs)
+
+    def cancelAll(self):
+        with self._lock:
+            jobs = list(self.jobs.values())
+        for job in jobs:
+            job.cancel()
+            if job.future.cancel():
+                self.finish(job, CANCELLED, None)
+
+    def shutdown(self):
+        self.cancelAll()
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,11 @@
+# Lets the tests import the emco package from src without installing it, and
+#   the benchmarks package from the repository root
+import os
+import sys
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(TESTS)
+SRC = os.path.join(ROOT, 'src')
+for path in (SRC, ROOT):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,92 @@
+# Checks emco.batch's per-file parameters: manifest and sidecar parsing, which
+#   one wins, and that a converted file uses them
+import json
+import os
+import shutil
+import pytest
+from emco.batch import DEFAULT_PARAMS, convertFile, main as batchMain, normalizeParams, readManifest, readSidecar, resolveParams
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+DXF_PATH = os.path.join(TESTS, 'Test DXF files', 'testLinear.dxf')
+GCODE_DIR = os.path.join(TESTS, 'Test Output Gcode')
+
+MANIFEST = '''file,stock_radius,rough_feed,rough_step,finish_feed,finish_step,use_m3_m5,retract,strategy,max_blocks
+parts/manifest_part.dxf,50,100,10,10,2,no,,,
+sidecar_part.dxf,40.5,80,2.5,20,1,yes,XZ,constant_load,500
+'''
+
+def readGolden(name):
+    with open(os.path.join(GCODE_DIR, name + '.cnc')) as f:
+        return f.read()
+
+def test_manifest_contents(tmp_path):
+    path = tmp_path / 'manifest.csv'
+    path.write_text(MANIFEST)
+    manifest = readManifest(str(path))
+    # Rows are keyed by file name, blank cells are left out
+    assert manifest == {
+        'manifest_part.dxf': {'stock_radius': 50, 'rough_feed': 100, 'rough_step': 10, 'finish_feed': 10,
+                              'finish_step': 2, 'use_m3_m5': False},
+        'sidecar_part.dxf': {'stock_radius': 40.5, 'rough_feed': 80, 'rough_step': 2.5, 'finish_feed': 20,
+                             'finish_step': 1, 'use_m3_m5': True, 'retract': 'xz', 'strategy': 'constant_load',
+                             'max_blocks': 500},
+    }
+    # Feeds stay ints so they format as 100, not 100.0
+    assert isinstance(manifest['manifest_part.dxf']['rough_feed'], int)
+
+def test_bad_values_are_rejected():
+    with pytest.raises(ValueError, match='retract'):
+        normalizeParams({'retract': 'y'})
+    with pytest.raises(ValueError, match='strategy'):
+        normalizeParams({'strategy': 'fastest'})
+    with pytest.raises(ValueError):
+        normalizeParams({'stock_radius': 'fifty'})
+    # Unknown columns are ignored
+    assert normalizeParams({'notes': 'chuck short', 'Stock_Radius ': '25'}) == {'stock_radius': 25}
+
+def test_sidecar_beats_manifest_beats_command_line(tmp_path):
+    dxf = tmp_path / 'part.dxf'
+    shutil.copy(DXF_PATH, dxf)
+    assert readSidecar(str(dxf)) == {}
+    (tmp_path / 'part.json').write_text(json.dumps({'finish_feed': 15, 'use_m3_m5': True, 'comment': 'ignored'}))
+    assert readSidecar(str(dxf)) == {'finish_feed': 15, 'use_m3_m5': True}
+
+    cli = {'stock_radius': 60, 'rough_feed': 90, 'finish_feed': 5, 'finish_step': 1}
+    manifest = {'part.dxf': {'rough_feed': 100, 'finish_feed': 10}}
+    params = resolveParams(str(dxf), cli, manifest)
+    assert params['stock_radius'] == 60
+    assert params['rough_feed'] == 100
+    assert params['finish_feed'] == 15
+    assert params['use_m3_m5'] is True
+    assert params['retract'] == 'none' and params['rough_step'] == 0
+
+    (tmp_path / 'part.json').unlink()
+    with pytest.raises(ValueError, match='stock_radius'):
+        resolveParams(str(dxf), {'rough_feed': 90, 'finish_feed': 5}, {})
+
+def test_batch_uses_manifest_and_sidecar(tmp_path):
+    parts = tmp_path / 'parts'
+    parts.mkdir()
+    shutil.copy(DXF_PATH, parts / 'from_manifest.dxf')
+    shutil.copy(DXF_PATH, parts / 'from_sidecar.dxf')
+    # The golden testLinear settings from the manifest, testSubFullDepth's
+    #   from the sidecar, and a command line that matches neither
+    (tmp_path / 'manifest.csv').write_text('file,stock_radius,rough_feed,rough_step,finish_feed,finish_step\n'
+                                           'from_manifest.dxf,50,100,10,10,2\n'
+                                           'from_sidecar.dxf,50,100,10,10,2\n')
+    (parts / 'from_sidecar.json').write_text(json.dumps({'rough_step': 0, 'finish_feed': 2, 'finish_step': 0}))
+    out = tmp_path / 'out'
+    code = batchMain([str(parts), '-o', str(out), '-j', '1', '-m', str(tmp_path / 'manifest.csv'),
+                      '--stock-radius', '30', '--rough-feed', '50', '--finish-feed', '5'])
+    assert code == 0
+    assert (out / 'from_manifest.cnc').read_text() == readGolden('testLinear')
+    assert (out / 'from_sidecar.cnc').read_text() == readGolden('testSubFullDepth')
+
+def test_profile_is_chained_and_simplified_once(tmp_path):
+    params = dict(DEFAULT_PARAMS, stock_radius=50, rough_feed=100, rough_step=10, finish_feed=10, finish_step=2)
+    result = convertFile(DXF_PATH, params, str(tmp_path), profile='time')
+    assert result['ok'] and result['verified']
+    stages = result['profile']['stages']
+    assert stages['chainSegments']['calls'] == 1
+    assert stages['simplifySegments']['calls'] == 1
+    assert readGolden('testLinear') == (tmp_path / 'testLinear.cnc').read_text()
@@ -0,0 +1,59 @@
+# Throughput benchmarks of the pipeline stages on synthetic profiles from 10
+#   to 100k segments. Needs pytest-benchmark:
+#     python -m pytest tests/test_benchmark.py --benchmark-only --benchmark-autosave
+#     python -m pytest tests/test_benchmark.py --benchmark-only --benchmark-compare --benchmark-compare-fail=median:25%
+#   saves a baseline, then fails when a stage got more than 25% slower than it
+import importlib.util
+import pytest
+from benchmarks import bench_pipeline
+from emco.core import parse_dxf_file, sortParsedData, generate_program_from_dxf
+from emco.synthetic import writeProfileDxf
+
+SIZES = (10, 100, 1000, 10000, 100000)
+
+needs_benchmark = pytest.mark.skipif(importlib.util.find_spec('pytest_benchmark') is None,
+                                     reason='pytest-benchmark is not installed')
+
+@pytest.fixture(scope='module')
+def profiles(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('profiles')
+    paths = {}
+    for size in SIZES:
+        paths[size] = str(directory / f'synthetic_{size}.dxf')
+        writeProfileDxf(paths[size], size)
+    return paths
+
+# Big profiles take seconds a run, so they get fewer
+def rounds(size):
+    return 1 if size >= 100000 else 3 if size >= 10000 else 10
+
+def test_harness_runs(capsys):
+    assert bench_pipeline.main(['--sizes', '10', '--repeat', '1']) == 0
+    assert 'segments' in capsys.readouterr().out
+
+@needs_benchmark
+@pytest.mark.parametrize('size', SIZES)
+def test_parse(benchmark, profiles, size):
+    entities = benchmark.pedantic(parse_dxf_file, (profiles[size],), rounds=rounds(size))
+    assert len(entities) == size
+
+@needs_benchmark
+@pytest.mark.parametrize('size', SIZES)
+def test_sort(benchmark, profiles, size):
+    entities = parse_dxf_file(profiles[size])
+    assert len(benchmark.pedantic(sortParsedData, (entities,), rounds=rounds(size))) == size
+
+@needs_benchmark
+@pytest.mark.parametrize('size', SIZES)
+def test_generate(benchmark, profiles, size):
+    entities = parse_dxf_file(profiles[size])
+    program = benchmark.pedantic(generate_program_from_dxf, (entities, 0, 0, 0, 0, *bench_pipeline.PARAMS),
+                                 rounds=rounds(size))
+    assert len(program) > size
+
+@needs_benchmark
+@pytest.mark.parametrize('size', SIZES)
+def test_render(benchmark, profiles, size):
+    program = generate_program_from_dxf(parse_dxf_file(profiles[size]), 0, 0, 0, 0, *bench_pipeline.PARAMS)
+    text = benchmark.pedantic(program.render, rounds=rounds(size))
+    assert text.startswith('%\n')
@@ -0,0 +1,122 @@
+# Checks emco.cache: repeat reads are served from memory or disk, edited files
+#   are parsed again, and callers get copies they can change
+import json
+import os
+import shutil
+import pytest
+import emco.cache
+from emco.cache import CACHE_VERSION, ParsedDXFCache
+from emco.core import parse_dxf_file
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+DXF_DIR = os.path.join(TESTS, 'Test DXF files')
+
+@pytest.fixture
+def parses(monkeypatch):
+    # Counts real parses, the cache looks the parser up when it misses
+    calls = []
+    def counted(file_path, layers=None):
+        calls.append(file_path)
+        return parse_dxf_file(file_path, layers)
+    monkeypatch.setattr(emco.cache, 'parse_dxf_file', counted)
+    return calls
+
+@pytest.fixture
+def part(tmp_path):
+    path = tmp_path / 'part.dxf'
+    shutil.copy(os.path.join(DXF_DIR, 'testLinear.dxf'), path)
+    return str(path)
+
+def test_hit_and_miss(part, parses):
+    cache = ParsedDXFCache()
+    first = cache.get(part)
+    second = cache.get(part)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert len(parses) == 1
+    assert first == second == parse_dxf_file(part)
+    # Copies, sorting or flipping one doesn't reach the cache
+    first[0]['start_point'] = (1.0, 1.0)
+    assert cache.get(part) == second
+
+def test_new_mtime_same_content_is_a_hit(part, parses):
+    cache = ParsedDXFCache()
+    cache.get(part)
+    stat = os.stat(part)
+    os.utime(part, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    cache.get(part)
+    # Re-hashed, but the content and so the key are the same
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert len(parses) == 1
+
+def test_changed_content_is_a_miss(part, parses):
+    cache = ParsedDXFCache()
+    before = cache.get(part)
+    shutil.copy(os.path.join(DXF_DIR, 'testNegDXF.dxf'), part)
+    stat = os.stat(part)
+    os.utime(part, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    after = cache.get(part)
+    assert (cache.hits, cache.misses) == (0, 2)
+    assert len(parses) == 2
+    assert after != before
+    assert after == parse_dxf_file(os.path.join(DXF_DIR, 'testNegDXF.dxf'))
+
+def test_layers_are_part_of_the_key(part, parses):
+    cache = ParsedDXFCache()
+    cache.get(part)
+    cache.get(part, layers=['0'])
+    cache.get(part, layers=['0', '0'])
+    assert (cache.hits, cache.misses) == (1, 2)
+
+def test_least_recently_used_is_dropped(tmp_path, parses):
+    cache = ParsedDXFCache(max_entries=1)
+    paths = []
+    for name in ('testLinear.dxf', 'testNegDXF.dxf'):
+        paths.append(str(tmp_path / name))
+        shutil.copy(os.path.join(DXF_DIR, name), paths[-1])
+    cache.get(paths[0])
+    cache.get(paths[1])
+    cache.get(paths[0])
+    assert (cache.hits, cache.misses) == (0, 3)
+
+def test_disk_cache_survives_a_new_process(part, tmp_path, parses):
+    cache_dir = str(tmp_path / 'cache')
+    expected = ParsedDXFCache(cache_dir=cache_dir).get(part)
+    files = os.listdir(cache_dir)
+    assert len(files) == 1 and files[0].endswith('.json')
+
+    # A fresh cache, like another batch worker, reads the entry back with its tuples
+    entities = ParsedDXFCache(cache_dir=cache_dir).get(part)
+    assert entities == expected
+    assert isinstance(entities[0]['start_point'], tuple)
+    assert len(parses) == 1
+
+    # Entries from another cache version are parsed again
+    entry = os.path.join(cache_dir, files[0])
+    with open(entry) as f:
+        data = json.load(f)
+    data['version'] = CACHE_VERSION - 1
+    with open(entry, 'w') as f:
+        json.dump(data, f)
+    assert ParsedDXFCache(cache_dir=cache_dir).get(part) == expected
+    assert len(parses) == 2
+
+def test_pipeline_checks_the_file_once_per_get(part, monkeypatch):
+    from emco.cache import default_cache
+    from emco.pipeline import Pipeline
+    calls = []
+    hash_file = default_cache.fileHash
+    def counted(file_path):
+        calls.append(file_path)
+        return hash_file(file_path)
+    monkeypatch.setattr(default_cache, 'fileHash', counted)
+    pipeline = Pipeline(file_path=part, stock_radius=50, rough_feed=100, rough_step=10, finish_feed=10, finish_step=2)
+    pipeline.staleStages('programs')
+    assert len(calls) == 1
+    # Parsing reads through the cache, which checks the file itself
+    del calls[:]
+    pipeline.get('programs')
+    assert len(calls) == 2
+    del calls[:]
+    pipeline.set(rough_feed=120)
+    pipeline.get('programs')
+    assert len(calls) == 1
@@ -0,0 +1,93 @@
+# Checks emco.chain puts shuffled, reversed and noisy segments back in cutting
+#   order, reports gaps and branches, and stays linear in the segment count
+import math
+import random
+import time
+import pytest
+from emco.chain import chainSegments, reverseSegment
+
+def line(start_point, end_point):
+    return {'type': 'LINE', 'start_point': start_point, 'end_point': end_point}
+
+# count short lines stepping left from X0 along a wavy profile, shuffled, some
+#   drawn backwards and every joint off by up to noise
+def shuffledProfile(count, noise=0.0, seed=1):
+    rng = random.Random(seed)
+    points = [(-i * 0.05, 10.0 + 2.0 * math.sin(i * 0.01)) for i in range(count + 1)]
+    segments = []
+    for i in range(count):
+        end_point = (points[i + 1][0] + rng.uniform(-noise, noise), points[i + 1][1] + rng.uniform(-noise, noise))
+        segment = line(points[i], end_point)
+        if i and rng.random() < 0.3:
+            segment = reverseSegment(segment)
+        segments.append(segment)
+    rng.shuffle(segments)
+    return points, segments
+
+def assertConnected(segments):
+    for a, b in zip(segments, segments[1:]):
+        assert a['end_point'] == b['start_point']
+
+def test_reversed_segments_are_turned_round():
+    points, segments = shuffledProfile(200)
+    result = chainSegments(segments)
+    assert len(result.segments) == 200
+    assert result.reversed_count > 0
+    assert not result.warnings()
+    assertConnected(result.segments)
+    # Cut from X0 along the profile, whichever way each line was drawn
+    assert [segment['start_point'] for segment in result.segments] == points[:-1]
+    assert result.segments[-1]['end_point'] == points[-1]
+
+def test_reversed_arc_changes_direction():
+    arc = {'type': 'ARC', 'center_point': (-5.0, 0.0), 'radius': 5.0, 'start_angle': 90.0, 'end_angle': 180.0,
+           'start_point': (-10.0, 0.0), 'end_point': (-5.0, 5.0), 'direction': "cw"}
+    result = chainSegments([arc, line((0.0, 5.0), (-5.0, 5.0))])
+    assert result.reversed_count == 1
+    assert result.segments[1]['start_point'] == (-5.0, 5.0)
+    assert result.segments[1]['direction'] == "ccw"
+
+def test_endpoints_within_tolerance_join():
+    points, segments = shuffledProfile(500, noise=0.004)
+    result = chainSegments(segments)
+    assert len(result.segments) == 500
+    assert not result.gaps and not result.unused
+    # Each start is snapped onto the previous end, so no noise is left between moves
+    assertConnected(result.segments)
+    assert result.segments[0]['start_point'] == (0.0, 10.0)
+
+def test_gap_is_reported():
+    segments = [line((0.0, 10.0), (-5.0, 10.0)), line((-5.0, 10.0), (-5.0, 5.0)), line((-5.5, 5.0), (-10.0, 5.0))]
+    result = chainSegments(segments)
+    assert len(result.segments) == 2
+    assert result.unused == [segments[2]]
+    end_point, nearest, distance = result.gaps[0]
+    assert end_point == (-5.0, 5.0) and nearest == (-5.5, 5.0)
+    assert distance == pytest.approx(0.5)
+    assert 'profile stops at' in result.warnings()[0]
+
+def test_branch_is_reported():
+    segments = [line((0.0, 10.0), (-5.0, 10.0)), line((-5.0, 10.0), (-10.0, 10.0)), line((-5.0, 10.0), (-5.0, 0.0))]
+    result = chainSegments(segments)
+    assert result.branches == [((-5.0, 10.0), 2)]
+    assert len(result.unused) == 1
+    assert any('took the first' in message for message in result.warnings())
+
+def test_no_start_at_x0():
+    with pytest.raises(ValueError):
+        chainSegments([line((-1.0, 10.0), (-5.0, 10.0))])
+
+def bestTime(segments):
+    best = None
+    for _ in range(3):
+        start = time.perf_counter()
+        chainSegments(segments)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def test_chaining_scales_linearly():
+    small = shuffledProfile(5000, noise=0.002)[1]
+    large = shuffledProfile(20000, noise=0.002)[1]
+    # 4x the segments, comparing every endpoint with every other would take 16x
+    assert bestTime(large) < 8 * bestTime(small)
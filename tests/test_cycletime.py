@@ -0,0 +1,35 @@
+# Checks emco.cycletime splits a program into its cutting passes, with the
+#   start block retract charged to other_time instead of a pass of its own
+import os
+import pytest
+from emco.core import parse_dxf_file, generate_programs_from_dxf
+from emco.cycletime import estimateProgram
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+DXF_PATH = os.path.join(TESTS, 'Test DXF files', 'testNegDXF.dxf')
+DEPTHS = [-10.0, -20.0, -30.0, -40.0, -42.0, -44.0]
+
+def estimate(retract_x, max_blocks=1000):
+    programs = generate_programs_from_dxf(parse_dxf_file(DXF_PATH), 1, retract_x, 0, 0, 50, 100, 10, 2, 2,
+                                          max_blocks=max_blocks)
+    return len(programs), estimateProgram([program.render() for program in programs], 50)
+
+def test_retract_is_other_time():
+    _, plain = estimate(0)
+    _, retract = estimate(1)
+    # 5 roughing passes and the finish pass either way
+    assert [round(p.depth, 2) for p in retract.passes] == DEPTHS
+    assert len(plain.passes) == len(retract.passes)
+    for p in retract.passes:
+        assert p.feed_time > 0 and p.removed > 0
+    # 0.5mm out and back at the rapid rate
+    assert plain.other_time == 0
+    assert retract.other_time == pytest.approx(1 / 700 * 60)
+    assert retract.removed() == pytest.approx(plain.removed())
+
+def test_split_job_has_no_extra_passes():
+    programs, split = estimate(1, max_blocks=30)
+    assert programs > 1
+    assert [round(p.depth, 2) for p in split.passes] == DEPTHS
+    # Every chained program retracts once
+    assert split.other_time == pytest.approx(programs / 700 * 60)
@@ -0,0 +1,54 @@
+# Checks the Qt free parts of the GUI's G-code editor, the column spans the
+#   highlighter colours and the line range an edit replaces
+import glob
+import os
+from emco.blocks import Block, MCODE, blockSpans, changedLines, parseProgram
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+GOLDEN = sorted(glob.glob(os.path.join(TESTS, 'Test Output Gcode', '*.cnc')))
+
+def spanText(line):
+    return [(line[start:start + length], column) for start, length, column in blockSpans(line)]
+
+def test_block_columns():
+    assert spanText('    00 01 -1000  00000 100') == [('00', 'number'), ('01', 'gcode'), ('-1000', 'x'),
+                                                    ('00000', 'z'), ('100', 'feed')]
+    assert spanText('   123M99 I0000 K00500') == [('123', 'number'), ('M99', 'mcode'), ('I0000', 'i'), ('K00500', 'k')]
+    assert spanText('    01 25             L023') == [('01', 'number'), ('25', 'gcode'), ('L023', 'label')]
+    assert spanText('   1000 00  0410 -00287') == [('1000', 'number'), ('00', 'gcode'), ('0410', 'x'), ('-00287', 'z')]
+    for line in ('%', '   M', '', 'not a block'):
+        assert blockSpans(line) == []
+
+def test_every_golden_block_is_highlighted():
+    for path in GOLDEN:
+        with open(path) as f:
+            for line in f.read().splitlines():
+                spans = blockSpans(line)
+                if line.strip()[:1].isdigit():
+                    # The whole block is covered, nothing but spaces between columns
+                    covered = set()
+                    for start, length, column in spans:
+                        covered.update(range(start, start + length))
+                    assert {i for i, c in enumerate(line) if c != ' '} == covered, line
+
+def test_changed_lines_round_trip():
+    cases = [(['a', 'b', 'c'], ['a', 'x', 'c']), (['a', 'b'], ['a', 'b', 'c']), (['a', 'b', 'c'], ['a', 'c']),
+             ([''], ['a', 'b', '']), (['a', 'b', ''], ['']), (['a'], ['b']), (['a', 'a'], ['a', 'a', 'a'])]
+    for old, new in cases:
+        first, old_stop, new_stop = changedLines(old, new)
+        assert old_stop > first and new_stop > first
+        assert old[:first] + new[first:new_stop] + old[old_stop:] == new
+    assert changedLines(['a', 'b'], ['a', 'b']) is None
+
+def test_insert_only_replaces_the_tail():
+    with open(GOLDEN[0]) as f:
+        text = f.read()
+    program = parseProgram(text)
+    index = program.indexByNumber()
+    number = sorted(index)[len(index) // 2]
+    program.edit(insert={index[number]: [Block(MCODE, 0)]})
+    old_lines = text.split('\n')
+    first, old_stop, new_stop = changedLines(old_lines, program.render().split('\n'))
+    # The % and header lines at least are left alone
+    assert first > 0
+    assert new_stop == old_stop + 1
@@ -0,0 +1,132 @@
+# Checks emco.fitting: arcs are split where they cross a quadrant boundary,
+#   polyline bulges turn into arcs and fitted lines and arcs stay on the points
+#   they were fitted to
+import math
+import ezdxf
+import numpy as np
+import pytest
+from emco.fitting import FIT_TOLERANCE, arcEntity, bulgeArc, fitPoints, polylineEntities, splitQuadrants
+from emco.roughing import arcSweep
+
+# Snapping ends and centers to the 0.01mm grid on top of the fit tolerance
+GRID_ERROR = 0.005
+
+# True when the arc stays in the quadrant of its middle, so unsigned M99 I/K
+#   describe it. Snapping the center to the 0.01mm grid can put an end a
+#   hundredth over an axis through it
+def insideOneQuadrant(arc):
+    start_angle, sweep = arcSweep(arc)
+    if abs(sweep) > math.pi / 2 + 0.02 / arc['radius']:
+        return False
+    middle = start_angle + sweep / 2
+    sign_x = np.sign(round(math.cos(middle), 9))
+    sign_y = np.sign(round(math.sin(middle), 9))
+    for point in (arc['start_point'], arc['end_point']):
+        offset_x = point[0] - arc['center_point'][0]
+        offset_y = point[1] - arc['center_point'][1]
+        if offset_x * sign_x < -0.01 - 1e-9 or offset_y * sign_y < -0.01 - 1e-9:
+            return False
+    return True
+
+def assertConnected(entities):
+    for a, b in zip(entities, entities[1:]):
+        assert a['end_point'] == b['start_point']
+
+# Distance from point to the nearest of the fitted entities
+def distanceTo(entities, point):
+    best = float('inf')
+    for entity in entities:
+        if entity['type'] == 'LINE':
+            a = np.array(entity['start_point'])
+            b = np.array(entity['end_point'])
+            t = np.clip(np.dot(point - a, b - a) / np.dot(b - a, b - a), 0, 1)
+            distance = np.hypot(*(point - (a + t * (b - a))))
+        else:
+            start_angle, sweep = arcSweep(entity)
+            offset = point - np.array(entity['center_point'])
+            angle = (math.atan2(offset[1], offset[0]) - start_angle) * (1 if sweep > 0 else -1) % (2 * math.pi)
+            if angle <= abs(sweep):
+                # The machine's arc runs from end to end around the center,
+                #   the rounded radius isn't written out
+                center = np.array(entity['center_point'])
+                radius = (np.hypot(*(np.array(entity['start_point']) - center)) +
+                          np.hypot(*(np.array(entity['end_point']) - center))) / 2
+                distance = abs(np.hypot(*offset) - radius)
+            else:
+                distance = min(np.hypot(*(point - np.array(entity['start_point']))),
+                               np.hypot(*(point - np.array(entity['end_point']))))
+        best = min(best, distance)
+    return best
+
+def test_half_circle_splits_at_the_axis():
+    # Counterclockwise from (0, 10) over the top of a circle at (-10, 10)
+    arc = arcEntity((-10.0, 10.0), 10.0, (0.0, 10.0), (-20.0, 10.0), True)
+    pieces = splitQuadrants(arc)
+    assert len(pieces) == 2
+    assert pieces[0]['start_point'] == (0.0, 10.0)
+    assert pieces[0]['end_point'] == (-10.0, 20.0)
+    assert pieces[1]['end_point'] == (-20.0, 10.0)
+    assertConnected(pieces)
+    for piece in pieces:
+        assert piece['direction'] == arc['direction']
+        assert insideOneQuadrant(piece)
+        assert abs(arcSweep(piece)[1]) == pytest.approx(math.pi / 2)
+
+def test_arc_inside_a_quadrant_is_kept():
+    arc = arcEntity((0.0, 0.0), 10.0, (10.0, 0.0), (0.0, 10.0), True)
+    assert splitQuadrants(arc) == [arc]
+
+def test_clockwise_arc_over_three_quadrants():
+    arc = arcEntity((0.0, 0.0), 5.0, (0.0, 5.0), (-5.0, 0.0), False)
+    pieces = splitQuadrants(arc)
+    assert len(pieces) == 3
+    assert sum(arcSweep(piece)[1] for piece in pieces) == pytest.approx(-3 * math.pi / 2)
+    assertConnected(pieces)
+    assert all(insideOneQuadrant(piece) for piece in pieces)
+
+def test_bulge_is_an_arc():
+    # A bulge of 1 is a half circle, positive turns counterclockwise
+    arc = bulgeArc((0.0, 0.0), (-4.0, 0.0), 1)
+    assert arc['center_point'] == (-2.0, 0.0)
+    assert arc['radius'] == 2.0
+    assert arcSweep(arc)[1] == pytest.approx(math.pi)
+    assert arc['direction'] == "cw"
+    # tan(22.5 degrees) bulges a quarter circle the other way
+    arc = bulgeArc((0.0, 0.0), (-2.0, -2.0), -math.tan(math.pi / 8))
+    assert arc['center_point'] == (-2.0, 0.0)
+    assert arcSweep(arc)[1] == pytest.approx(-math.pi / 2)
+
+def test_polyline_bulges_become_split_arcs():
+    doc = ezdxf.new()
+    polyline = doc.modelspace().add_lwpolyline([(0, 10, 0, 0, 0), (-5, 10, 0, 0, 1), (-15, 10, 0, 0, 0), (-20, 10, 0, 0, 0)],
+                                               format='xyseb')
+    entities = polylineEntities(polyline)
+    assert [entity['type'] for entity in entities] == ['LINE', 'ARC', 'ARC', 'LINE']
+    assertConnected(entities)
+    assert entities[0]['start_point'] == (0.0, 10.0)
+    assert entities[-1]['end_point'] == (-20.0, 10.0)
+    for arc in entities[1:3]:
+        assert arc['center_point'] == (-10.0, 10.0) and arc['radius'] == 5.0
+        assert insideOneQuadrant(arc)
+    # The half circle goes over the top
+    assert entities[1]['end_point'] == (-10.0, 15.0)
+
+def test_collinear_points_fit_one_line():
+    points = [(-i * 0.1, 5.0) for i in range(101)]
+    assert fitPoints(points) == [{'type': 'LINE', 'start_point': (0.0, 5.0), 'end_point': (-10.0, 5.0)}]
+
+def test_fitted_output_stays_on_the_points():
+    # A line, a flattened quarter circle and a wave, like a spline export
+    points = [(-i * 0.5, 20.0) for i in range(10)]
+    points += [(-5 - 8 * math.sin(a), 12 + 8 * math.cos(a)) for a in np.linspace(0, math.pi / 2, 200)]
+    points += [(-13 - i * 0.05, 12 + 0.5 * math.sin(i * 0.05)) for i in range(1, 400)]
+    entities = fitPoints(points)
+    assert len(entities) < len(points) / 10
+    assert any(entity['type'] == 'ARC' for entity in entities)
+    assertConnected(entities)
+    assert entities[0]['start_point'] == (0.0, 20.0)
+    for entity in entities:
+        if entity['type'] == 'ARC':
+            assert insideOneQuadrant(entity)
+    for point in np.array(points):
+        assert distanceTo(entities, point) <= FIT_TOLERANCE + GRID_ERROR
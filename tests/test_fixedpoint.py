@@ -0,0 +1,70 @@
+# Checks emco.fixedpoint: rounding to hundredths the way coordinates are
+#   written, and that emitted programs bring the tool back where it started
+import itertools
+import os
+import numpy as np
+import pytest
+from emco.blocks import MOTION, CALL
+from emco.core import parse_dxf_file, generate_programs_from_dxf, machineHundredths, prepareProfile
+from emco.fixedpoint import profileDrift, programClosure, toHundredths
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+DXF_DIR = os.path.join(TESTS, 'Test DXF files')
+
+# mm -> hundredths, halves round away from zero the way they're written
+ROUNDING = [
+    (0, 0), (0.004, 0), (0.005, 1), (0.006, 1), (0.145, 15), (1.005, 101), (2.675, 268), (12.345, 1235),
+    (-0.004, 0), (-0.005, -1), (-0.145, -15), (-1.005, -101), (-2.675, -268), (-12.344, -1234), (44.87, 4487),
+]
+
+@pytest.mark.parametrize('mm, hundredths', ROUNDING)
+def test_to_hundredths(mm, hundredths):
+    assert toHundredths(mm) == hundredths
+    assert isinstance(toHundredths(mm), int)
+
+def test_to_hundredths_arrays_match_scalars():
+    values = np.array([mm for mm, _ in ROUNDING])
+    rounded = toHundredths(values)
+    assert rounded.dtype == np.int64
+    assert rounded.tolist() == [hundredths for _, hundredths in ROUNDING]
+
+def test_programs_close():
+    entities = parse_dxf_file(os.path.join(DXF_DIR, 'testg02hemishpere.dxf'))
+    modes = itertools.product(('constant', 'constant_load', 'constant_volume'), ('subroutine', 'clipped'), (0, 1))
+    for strategy, roughing, retract in modes:
+        programs = generate_programs_from_dxf(entities, 1, retract, 0, 0, 50.37, 100, 3.3, 10, 0.7, strategy, roughing)
+        assert len(programs) == 1
+        assert programClosure(programs[0]) == (0, 0), (strategy, roughing, retract)
+
+def test_split_programs_each_close():
+    entities = parse_dxf_file(os.path.join(DXF_DIR, 'testNegDXF.dxf'))
+    programs = generate_programs_from_dxf(entities, 1, 1, 0, 0, 50, 100, 2, 10, 2, max_blocks=40)
+    assert len(programs) > 1
+    assert all(programClosure(program) == (0, 0) for program in programs)
+
+def test_broken_move_shows_up():
+    entities = parse_dxf_file(os.path.join(DXF_DIR, 'testLinear.dxf'))
+    program = generate_programs_from_dxf(entities, 0, 0, 0, 0, 50, 100, 10, 10, 2)[0]
+    # The subroutine runs once per pass, so a hundredth off in it adds up
+    calls = sum(1 for block in program.blocks if block.kind == CALL)
+    subroutine = program.blocks.index(program.labels[next(iter(program.labels))])
+    move = next(block for block in program.blocks[subroutine:] if block.kind == MOTION)
+    move.z += 1
+    assert programClosure(program) == (0, calls)
+
+def test_drift_report_takes_closure_from_the_programs():
+    profile = prepareProfile(parse_dxf_file(os.path.join(DXF_DIR, 'testg02hemishpere.dxf')))
+    start_x, start_z = machineHundredths(profile[0]['start_point'], 50)
+    programs = generate_programs_from_dxf(profile, 0, 0, 0, 0, 50, 100, 10, 10, 2, max_blocks=30)
+    assert len(programs) > 1
+    report = profileDrift(profile, 50, start_x, start_z, programs)
+    assert report.ok() and report.closure == (0, 0)
+    assert report.segments == len(profile) and report.max_rounding < 0.005
+
+    # One X move off in the last program's finish pass
+    move = next(block for block in reversed(programs[-1].blocks) if block.kind == MOTION and block.feed == 10)
+    move.x -= 3
+    report = profileDrift(profile, 50, start_x, start_z, programs)
+    assert not report.ok()
+    assert report.closure == (-3, 0)
+    assert 'closure -3/0' in report.summary()
@@ -0,0 +1,68 @@
+# Regenerates every golden program in "Test Output Gcode" from its DXF in
+#   "Test DXF files" and diffs it, through each of the ways programs get made:
+#   the core functions the batch converter uses and the GUI's pipeline
+import difflib
+import os
+import pytest
+from emco.core import parse_dxf_file, generate_gcode_from_dxf, generate_programs_from_dxf
+from emco.fixedpoint import programClosure
+from emco.pipeline import Pipeline
+from emco.simulate import verifyProgram
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+DXF_DIR = os.path.join(TESTS, 'Test DXF files')
+GCODE_DIR = os.path.join(TESTS, 'Test Output Gcode')
+
+# Golden file -> (DXF, (stock radius, rough feed, rough step, finish feed, finish step))
+GOLDEN = {
+    'testLinear': ('testLinear.dxf', (50, 100, 10, 10, 2)),
+    'testSubStepover': ('testLinear.dxf', (50, 100, 10, 10, 2)),
+    'testSubFullDepth': ('testLinear.dxf', (50, 100, 0, 2, 0)),
+    'testNegDXF': ('testNegDXF.dxf', (50, 100, 10, 2, 2)),
+    'testVerticalLines1': ('testVerticalLines1.dxf', (50, 100, 10, 10, 2)),
+    'testVerticalLines2': ('testVerticalLines2.dxf', (50, 100, 10, 10, 2)),
+    'testg02hemisphere': ('testg02hemishpere.dxf', (50, 100, 10, 10, 2)),
+    'testg03hemisphere': ('testg03Ghemishpere.dxf', (50, 100, 10, 10, 2)),
+}
+
+def readGolden(name):
+    with open(os.path.join(GCODE_DIR, name + '.cnc')) as f:
+        return f.read()
+
+def assertSame(expected, actual, name):
+    if expected != actual:
+        diff = difflib.unified_diff(expected.splitlines(), actual.splitlines(), name + '.cnc', 'generated', lineterm='')
+        pytest.fail('\n'.join(diff))
+
+def test_every_golden_file_is_covered():
+    names = {os.path.splitext(name)[0] for name in os.listdir(GCODE_DIR) if name.endswith('.cnc')}
+    assert names == set(GOLDEN)
+
+@pytest.mark.parametrize('name', sorted(GOLDEN))
+def test_core(name):
+    dxf, params = GOLDEN[name]
+    entities = parse_dxf_file(os.path.join(DXF_DIR, dxf))
+    assertSame(readGolden(name), ''.join(generate_gcode_from_dxf(entities, 0, 0, 0, 0, *params)), name)
+
+@pytest.mark.parametrize('name', sorted(GOLDEN))
+def test_split_programs(name):
+    dxf, params = GOLDEN[name]
+    entities = parse_dxf_file(os.path.join(DXF_DIR, dxf))
+    programs = generate_programs_from_dxf(entities, 0, 0, 0, 0, *params)
+    assert len(programs) == 1
+    assert programClosure(programs[0]) == (0, 0)
+    assertSame(readGolden(name), programs[0].render(), name)
+
+@pytest.mark.parametrize('name', sorted(GOLDEN))
+def test_pipeline(name):
+    dxf, (stock_radius, rough_feed, rough_step, finish_feed, finish_step) = GOLDEN[name]
+    pipeline = Pipeline(file_path=os.path.join(DXF_DIR, dxf), stock_radius=stock_radius, rough_feed=rough_feed,
+                        rough_step=rough_step, finish_feed=finish_feed, finish_step=finish_step)
+    assertSame(readGolden(name), ''.join(pipeline.get('programs')), name)
+
+@pytest.mark.parametrize('name', sorted(GOLDEN))
+def test_backplot(name):
+    dxf, params = GOLDEN[name]
+    entities = parse_dxf_file(os.path.join(DXF_DIR, dxf))
+    report = verifyProgram(readGolden(name), entities, params[0])
+    assert report.ok(), report.summary()
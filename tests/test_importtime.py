@@ -0,0 +1,56 @@
+# Import time of the conversion core, measured with python -X importtime in a
+#   fresh interpreter. The budgets are a few times what the imports take on a
+#   laptop, so they only trip when a heavy dependency starts loading eagerly.
+#   ezdxf and Qt must not load until a file is read or a window is shown
+import os
+import subprocess
+import sys
+import pytest
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+# Cumulative import time budget per module in microseconds
+BUDGETS = {
+    'emco.core': 400_000,
+    'emco.batch': 500_000,
+    'emco.worker': 100_000,
+}
+# Modules only the GUI or file reading need
+DEFERRED = ('ezdxf', 'PyQt5', 'qdarktheme')
+
+# {module: cumulative microseconds} of everything importing statement loads
+def importTimes(statement):
+    env = dict(os.environ, PYTHONPATH=SRC)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement], env=env, cwd=SRC,
+                            capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+@pytest.mark.parametrize('module', sorted(BUDGETS))
+def test_import_budget(module):
+    best = min(importTimes(f'import {module}')[module] for _ in range(3))
+    assert best <= BUDGETS[module], f'{module} took {best / 1000:.0f} ms to import'
+
+@pytest.mark.parametrize('module', ['emco', 'emco.core', 'emco.batch', 'emco.pipeline'])
+def test_core_defers_gui_and_dxf_reader(module):
+    loaded = {name.split('.')[0] for name in importTimes(f'import {module}')}
+    assert not loaded & set(DEFERRED)
+
+@pytest.mark.parametrize('module', ['emco.worker', 'emco.profiling', 'emco.blocks'])
+def test_light_modules_skip_numpy(module):
+    assert 'numpy' not in importTimes(f'import {module}')
+
+def test_package_names_load_core_on_use():
+    times = importTimes("import emco, sys; assert 'emco.core' not in sys.modules; "
+                        "emco.parse_dxf_file; assert 'emco.core' in sys.modules")
+    assert 'ezdxf' not in times
+
+def test_gui_imports_before_dxf_reader():
+    pytest.importorskip('PyQt5')
+    pytest.importorskip('qdarktheme')
+    assert 'ezdxf' not in importTimes('import EmcoProcessor')
@@ -0,0 +1,77 @@
+# Checks emco.passplan on its own: the constant strategy against the original
+#   stepdown loop, and the shape of the constant load and volume plans
+import itertools
+import numpy as np
+import pytest
+from emco.passplan import planPasses, ROUGH, FINISH_STEP
+
+# The stepdown loop from before the planner, the X offset of every roughing call
+def baselineOffsets(depth, roughStep, finishStep):
+    number_of_steps = int(depth / roughStep)
+    if finishStep != 0:
+        if (depth % roughStep) / finishStep > 1:
+            number_of_steps += 1
+    offsets = []
+    step_num = 1
+    while step_num - 1 != number_of_steps:
+        startXOffset = 0
+        if depth - ((step_num - 1) * roughStep) > roughStep:
+            startXOffset = depth - (step_num * roughStep)
+        else:
+            stockLeft = depth - ((step_num - 1) * roughStep)
+            if stockLeft > finishStep:
+                startXOffset = stockLeft - (stockLeft - finishStep)
+        offsets.append(startXOffset)
+        step_num += 1
+    return offsets
+
+def test_constant_matches_the_baseline_loop():
+    depths = (0.5, 2, 7.3, 10, 23, 30, 44.87)
+    for depth, roughStep, finishStep in itertools.product(depths, (0.7, 2, 5, 10), (0, 0.5, 2, 2.5)):
+        plan = planPasses(50, depth, roughStep, finishStep)
+        assert plan.offsets.tolist() == baselineOffsets(depth, roughStep, finishStep), (depth, roughStep, finishStep)
+        assert set(plan.kinds.tolist()) <= {ROUGH, FINISH_STEP}
+        assert plan.finish
+
+def test_constant_load_splits_the_depth_evenly():
+    # 21mm of roughing in 5mm steps is 4.2 passes, so 5 passes of 4.2mm
+    plan = planPasses(50, 23, 5, 2, 'constant_load')
+    assert len(plan) == 5
+    assert plan.cutDepths() == pytest.approx([4.2] * 5)
+    assert plan.offsets[-1] == pytest.approx(2)
+    assert np.all(plan.kinds == ROUGH)
+
+def test_constant_volume_removes_equal_areas():
+    plan = planPasses(50, 40, 5, 2, 'constant_volume')
+    radii = np.concatenate(([50], plan.passRadii()))
+    areas = radii[:-1] ** 2 - radii[1:] ** 2
+    assert areas == pytest.approx(np.full(len(plan), areas[0]))
+    assert plan.offsets[-1] == pytest.approx(2)
+    assert plan.cutDepths().max() <= 5 + 1e-9
+    # Deeper passes as the radius shrinks, and one pass fewer would go over roughStep
+    assert np.all(np.diff(plan.cutDepths()) > 0)
+    fewer = np.sqrt(50 ** 2 - areas.sum() * np.arange(1, len(plan)) / (len(plan) - 1))
+    assert (-np.diff(np.concatenate(([50], fewer)))).max() > 5
+
+def test_constant_volume_near_the_axis():
+    # Roughing down to 0.5mm from the axis the last passes are the deepest,
+    #   the count comes straight from the area
+    plan = planPasses(50, 50, 1, 0.5, 'constant_volume')
+    assert len(plan) == 1250
+    assert plan.cutDepths().max() <= 1 + 1e-9
+    assert plan.passRadii()[-1] == pytest.approx(0.5)
+
+def test_depth_inside_the_finishing_allowance():
+    for strategy in ('constant', 'constant_load', 'constant_volume'):
+        plan = planPasses(50, 1.5, 5, 2, strategy)
+        # No pass above the stock surface, the finish pass cuts it all
+        assert np.all(plan.offsets < 1.5)
+        assert plan.finish
+
+def test_bad_arguments():
+    with pytest.raises(ValueError):
+        planPasses(50, 10, 2, 1, 'deepest')
+    with pytest.raises(ValueError):
+        planPasses(50, 10, -2, 1)
+    plan = planPasses(50, 10, 0, 2)
+    assert plan.offsets.tolist() == [0] and not plan.finish
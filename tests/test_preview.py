@@ -0,0 +1,109 @@
+# Checks the GUI preview geometry in emco.preview: every entity becomes
+#   segments that meet where the entities do, and zoomed out levels stay
+#   connected while collapsing to about a line per pixel
+import math
+import os
+import numpy as np
+from emco.core import parse_dxf_file, calculate_drawing_extents
+from emco.pipeline import Pipeline
+from emco.preview import (ARC_TOLERANCE, PREVIEW_SIZE, previewScale, previewSegments, decimateSegments, sceneBounds,
+                          toolpathOverlay, FINISH, ROUGH, RAPID)
+from emco.simulate import runPrograms, segmentDistance
+from emco.synthetic import writeProfileDxf
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+DXF_DIR = os.path.join(TESTS, 'Test DXF files')
+
+def test_arcs_follow_the_circle():
+    entities = parse_dxf_file(os.path.join(DXF_DIR, 'testg02hemishpere.dxf'))
+    extents = calculate_drawing_extents(entities)
+    scale = previewScale(extents)
+    segments = previewSegments(entities, scale)
+    assert len(segments) > len(entities)
+    for entity in entities:
+        if entity['type'] != 'ARC':
+            continue
+        center = np.array([entity['center_point'][0], -entity['center_point'][1]]) * scale
+        radius = entity['radius'] * scale
+        chords = segments[np.all(np.abs(np.hypot(segments[:, 0::2] - center[0], segments[:, 1::2] - center[1]) - radius) < 1e-6, axis=1)]
+        assert len(chords)
+        middle = (chords[:, :2] + chords[:, 2:]) / 2
+        assert np.all(radius - np.hypot(*(middle - center).T) <= ARC_TOLERANCE + 1e-9)
+
+    x, y, width, height = sceneBounds(extents, scale)
+    assert math.isclose(max(width, height), PREVIEW_SIZE)
+    assert np.all(segments[:, 0::2] >= x - 1e-6) and np.all(segments[:, 1::2] >= y - 1e-6)
+
+# Number of separate pieces the segments make up
+def components(segments):
+    parent = {}
+    def find(point):
+        parent.setdefault(point, point)
+        while parent[point] != point:
+            parent[point] = parent[parent[point]]
+            point = parent[point]
+        return point
+    for x0, y0, x1, y1 in segments.tolist():
+        parent[find((x0, y0))] = find((x1, y1))
+    return len({find(point) for point in parent})
+
+def test_decimated_levels_stay_connected(tmp_path):
+    file_path = writeProfileDxf(str(tmp_path / 'profile.dxf'), 5000, noise=0)
+    entities = parse_dxf_file(file_path)
+    scale = previewScale(calculate_drawing_extents(entities))
+    segments = previewSegments(entities, scale)
+    for cell in (0.25, 1.0, 4.0):
+        decimated = decimateSegments(segments, cell)
+        assert len(decimated) < len(segments)
+        # About one line per cell along the profile
+        assert len(decimated) <= 4 * PREVIEW_SIZE / cell
+        assert components(decimated) == 1
+
+# The GUI's overlay: one entry per pass, the finish pass on the drawn profile
+#   whichever quadrant the drawing is in
+def test_toolpath_overlay():
+    for name, mirror in (('testg02hemishpere.dxf', False), ('testNegDXF.dxf', True)):
+        pipeline = Pipeline(file_path=os.path.join(DXF_DIR, name), stock_radius=50, rough_feed=100, rough_step=10,
+                            finish_feed=10, finish_step=2)
+        entities = pipeline.get('parsed')
+        scale = previewScale(calculate_drawing_extents(entities))
+        toolpath = runPrograms(pipeline.get('programs'))
+        overlay = toolpathOverlay(toolpath, 50, scale, pipeline.get('plan').finish, mirror)
+
+        passes = [entry for entry in overlay if entry.index >= 0]
+        assert [entry.index for entry in passes] == list(range(int(toolpath.pass_index.max()) + 1))
+        assert [entry.kind for entry in passes] == [ROUGH] * (len(passes) - 1) + [FINISH]
+        assert all(entry.kind == RAPID for entry in overlay if entry.index < 0)
+        assert sum(len(entry.feeds) + len(entry.rapids) for entry in overlay) >= len(toolpath)
+
+        # Finish moves below the stock surface follow the profile
+        profile = previewSegments(entities, scale)
+        finish = passes[-1].feeds
+        surface = -50 * scale if not mirror else 50 * scale
+        inside = (np.abs(finish[:, 1] - surface) > 1e-6) & (np.abs(finish[:, 3] - surface) > 1e-6)
+        cutting = (finish[inside, :2] + finish[inside, 2:]) / 2
+        assert len(cutting)
+        assert segmentDistance(cutting, profile[:, :2], profile[:, 2:]).max() < 1e-6
+
+# A start block retract is a rapid out and back before the first pass, it
+#   goes with the moves outside any pass and pass 0 is the first roughing pass
+def test_toolpath_overlay_with_retract():
+    overlays = {}
+    for retract in ('none', 'xz'):
+        pipeline = Pipeline(file_path=os.path.join(DXF_DIR, 'testg02hemishpere.dxf'), stock_radius=50, rough_feed=100,
+                            rough_step=10, finish_feed=10, finish_step=2, use_m3_m5=True, retract=retract)
+        scale = previewScale(calculate_drawing_extents(pipeline.get('parsed')))
+        toolpath = runPrograms(pipeline.get('programs'))
+        overlays[retract] = toolpathOverlay(toolpath, 50, scale, pipeline.get('plan').finish)
+
+    overlay = overlays['xz']
+    assert overlay[0].index == -1 and overlay[0].kind == RAPID
+    assert len(overlay[0].rapids) >= 2 and not len(overlay[0].feeds)
+    passes = [entry for entry in overlay if entry.index >= 0]
+    assert passes[0].index == 0 and passes[0].kind == ROUGH and len(passes[0].feeds)
+    assert all(len(entry.feeds) for entry in passes)
+    # The same passes as without the retract
+    plain = [entry for entry in overlays['none'] if entry.index >= 0]
+    assert len(plain) == len(passes)
+    for a, b in zip(plain, passes):
+        assert np.array_equal(a.feeds, b.feeds)
@@ -0,0 +1,71 @@
+# Checks the emco.profiling hooks record the pipeline without changing what
+#   it writes, and that batch --profile-json reports every file
+import json
+import os
+from emco.batch import main as batchMain
+from emco.core import parse_dxf_file, generate_gcode_from_dxf, generate_program_from_dxf
+from emco.profiling import Profiler, default_profiler
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+DXF_DIR = os.path.join(TESTS, 'Test DXF files')
+GCODE_DIR = os.path.join(TESTS, 'Test Output Gcode')
+
+def test_stages_and_counters():
+    default_profiler.reset()
+    default_profiler.enable()
+    try:
+        entities = parse_dxf_file(os.path.join(DXF_DIR, 'testLinear.dxf'))
+        text = ''.join(generate_gcode_from_dxf(entities, 0, 0, 0, 0, 50, 100, 10, 10, 2))
+    finally:
+        default_profiler.disable()
+    with open(os.path.join(GCODE_DIR, 'testLinear.cnc')) as f:
+        assert text == f.read()
+    snapshot = default_profiler.snapshot()
+    for name in ('parse_dxf_file', 'sortParsedData', 'flipDXFOverX', 'generate_gcode_from_dxf', 'Program.formatLines'):
+        assert snapshot['stages'][name]['calls'] >= 1, name
+    assert snapshot['counters']['entities'] == len(entities)
+    assert snapshot['counters']['blocks'] == generate_program_from_dxf(entities, 0, 0, 0, 0, 50, 100, 10, 10, 2).blockNum
+    json.dumps(snapshot)
+
+def test_disabled_records_nothing():
+    profiler = Profiler()
+    with profiler.stage('nothing'):
+        profiler.count('things')
+    assert profiler.snapshot()['stages'] == {} and profiler.snapshot()['counters'] == {}
+
+def test_nested_memory_peaks():
+    profiler = Profiler()
+    profiler.enable(memory=True)
+    try:
+        with profiler.stage('outer'):
+            with profiler.stage('inner'):
+                data = bytearray(4_000_000)
+                del data
+            small = bytearray(1000)
+    finally:
+        profiler.disable()
+    stages = profiler.snapshot()['stages']
+    assert stages['inner']['peak'] >= 4_000_000
+    # The inner peak counts towards the outer stage even though it was freed
+    assert stages['outer']['peak'] >= 4_000_000
+    assert small
+
+def test_merge():
+    a = Profiler()
+    a.record('stage', 0.5)
+    a.counters['blocks'] = 3
+    b = Profiler()
+    b.merge(a.snapshot())
+    b.merge(a.snapshot())
+    assert b.stages['stage'].calls == 2 and b.stages['stage'].total == 1.0 and b.counters['blocks'] == 6
+
+def test_batch_profile_json(tmp_path):
+    report_path = tmp_path / 'profile.json'
+    code = batchMain([DXF_DIR, '-o', str(tmp_path), '-j', '1', '--stock-radius', '50', '--rough-feed', '100',
+                      '--rough-step', '10', '--finish-feed', '10', '--finish-step', '2',
+                      '--profile-json', str(report_path)])
+    assert code == 0
+    report = json.loads(report_path.read_text())
+    assert len(report['files']) == len([name for name in os.listdir(DXF_DIR) if name.endswith('.dxf')])
+    assert report['stages']['load']['calls'] == len(report['files'])
+    assert report['counters']['programs'] == len(report['files'])
@@ -0,0 +1,56 @@
+# Checks emco.roughing.clipBelow keeps only the parts of the profile below a
+#   roughing pass, cutting lines and arcs exactly where they cross it
+import math
+import pytest
+from emco.roughing import arcSweep, clipBelow
+
+def line(start_point, end_point):
+    return {'type': 'LINE', 'start_point': start_point, 'end_point': end_point}
+
+# Half circle over the top of (-10, 10), counterclockwise in the sketch, which
+#   the parsed direction calls "cw"
+HUMP = {'type': 'ARC', 'center_point': (-10.0, 10.0), 'radius': 5.0, 'start_angle': 0.0, 'end_angle': 180.0,
+        'start_point': (-5.0, 10.0), 'end_point': (-15.0, 10.0), 'direction': "cw"}
+PROFILE = [line((0.0, 10.0), (-5.0, 10.0)), HUMP, line((-15.0, 10.0), (-20.0, 10.0))]
+
+def assertOnArc(piece, arc):
+    for key in ('center_point', 'radius', 'direction'):
+        assert piece[key] == arc[key]
+    for point in (piece['start_point'], piece['end_point']):
+        assert math.dist(point, arc['center_point']) == pytest.approx(arc['radius'], abs=0.01)
+
+def test_arc_crossing_the_pass_is_cut_at_the_level():
+    runs = clipBelow(PROFILE, 12)
+    # The hump sticks out through the pass, leaving a run either side of it
+    assert len(runs) == 2
+    first, second = runs
+    assert first[0] == PROFILE[0] and second[-1] == PROFILE[2]
+    crossing = math.sqrt(5 ** 2 - 2 ** 2)
+    assert first[1]['start_point'] == (-5.0, 10.0)
+    assert first[1]['end_point'] == (round(-10 + crossing, 2), 12)
+    assert second[0]['start_point'] == (round(-10 - crossing, 2), 12)
+    assert second[0]['end_point'] == (-15.0, 10.0)
+    for piece in (first[1], second[0]):
+        assertOnArc(piece, HUMP)
+        # Each piece keeps the hump's sense and stays short of its top
+        assert 0 < arcSweep(piece)[1] < math.pi / 2
+
+def test_arc_crossing_once():
+    quarter = dict(HUMP, end_point=(-10.0, 15.0), end_angle=90.0)
+    runs = clipBelow([line((0.0, 10.0), (-5.0, 10.0)), quarter], 12)
+    assert len(runs) == 1
+    assert len(runs[0]) == 2
+    assert runs[0][1]['end_point'] == (round(-10 + math.sqrt(21), 2), 12)
+    assertOnArc(runs[0][1], quarter)
+
+def test_pass_above_or_below_the_arc():
+    # Above the hump everything cuts, under the flats nothing does
+    runs = clipBelow(PROFILE, 16)
+    assert runs == [PROFILE]
+    assert clipBelow(PROFILE, 10) == []
+    assert clipBelow(PROFILE, 9) == []
+
+def test_ends_on_the_level_are_not_cut():
+    # Touching the level at its ends keeps the line whole
+    runs = clipBelow([line((0.0, 12.0), (-5.0, 8.0)), line((-5.0, 8.0), (-10.0, 12.0))], 12)
+    assert runs == [[line((0.0, 12.0), (-5.0, 8.0)), line((-5.0, 8.0), (-10.0, 12.0))]]
@@ -0,0 +1,47 @@
+# Checks emco.simplify merges what it should and that long collinear runs cost
+#   the same per segment as short ones
+import time
+from emco.simplify import simplifySegments
+
+def line(start_point, end_point):
+    return {'type': 'LINE', 'start_point': start_point, 'end_point': end_point}
+
+# count short lines along sketch X at height y, every point within 0.004 of y
+def straightRun(count, y=10.0):
+    points = [(round(-i * 0.1, 2), round(y + (0.004 if i % 3 == 1 else 0), 3)) for i in range(count + 1)]
+    return [line(a, b) for a, b in zip(points, points[1:])]
+
+def test_collinear_run_merges_into_one_line():
+    result = simplifySegments(straightRun(500))
+    assert len(result.segments) == 1
+    assert result.lines_merged == 499
+    assert result.segments[0]['start_point'] == (0.0, 10.0)
+    assert result.segments[0]['end_point'] == (-50.0, 10.0)
+
+def test_corner_and_drift_start_a_new_line():
+    segments = [line((0.0, 0.0), (-1.0, 0.0)), line((-1.0, 0.0), (-2.0, 0.0)), line((-2.0, 0.0), (-2.0, 1.0))]
+    assert len(simplifySegments(segments).segments) == 2
+    # Drifting 0.01 per mm leaves the first line's tolerance after a while
+    drift = [(-float(i), round(i * 0.01, 2)) for i in range(6)]
+    drift += [(-5.0 - i, 0.05) for i in range(1, 6)]
+    assert len(simplifySegments([line(a, b) for a, b in zip(drift, drift[1:])]).segments) == 2
+
+def test_overshoot_is_not_merged():
+    segments = [line((0.0, 0.0), (-2.0, 0.0)), line((-2.0, 0.0), (-1.0, 0.0))]
+    assert len(simplifySegments(segments).segments) == 2
+
+def bestTime(segments):
+    best = None
+    for _ in range(3):
+        start = time.perf_counter()
+        simplifySegments(segments)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def test_long_runs_merge_in_linear_time():
+    small = straightRun(5000)
+    large = straightRun(20000)
+    assert len(simplifySegments(large).segments) == 1
+    # 4x the segments, quadratic merging would take about 16x as long
+    assert bestTime(large) < 8 * bestTime(small)
@@ -0,0 +1,83 @@
+# Checks how emco.simulate numbers passes: the start block retract is a rapid
+#   only trip away from the start point and stays outside every pass. Then
+#   hand edits golden programs to check verifyToolpath reports each fault
+import os
+import numpy as np
+from emco.core import parse_dxf_file, generate_programs_from_dxf
+from emco.simulate import runPrograms, verifyProgram
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+DXF_DIR = os.path.join(TESTS, 'Test DXF files')
+GCODE_DIR = os.path.join(TESTS, 'Test Output Gcode')
+DXF_PATH = os.path.join(DXF_DIR, 'testg02hemishpere.dxf')
+
+def backplot(use_m3_m5, retract_x, retract_z, retract_xz):
+    programs = generate_programs_from_dxf(parse_dxf_file(DXF_PATH), use_m3_m5, retract_x, retract_z, retract_xz,
+                                          50, 100, 10, 10, 2)
+    return runPrograms([program.render() for program in programs])
+
+def test_retract_is_not_a_pass():
+    plain = backplot(0, 0, 0, 0)
+    for retract in ((1, 1, 0, 0), (0, 0, 1, 0), (1, 0, 0, 1)):
+        toolpath = backplot(*retract)
+        assert toolpath.pass_index.max() == plain.pass_index.max()
+        # The retract moves come first, they're rapids outside any pass
+        outside = np.nonzero(toolpath.pass_index < 0)[0]
+        assert len(outside) >= 2
+        assert np.all(toolpath.opcode[outside] == 0)
+        first = np.nonzero(toolpath.pass_index == 0)[0]
+        assert outside[0] < first[0]
+        assert np.any(toolpath.opcode[first] != 0)
+
+def test_every_pass_cuts():
+    toolpath = backplot(1, 0, 0, 1)
+    for index in range(int(toolpath.pass_index.max()) + 1):
+        assert np.any(toolpath.opcode[toolpath.pass_index == index] != 0)
+
+# Verifies a golden program with some of its blocks rewritten. blocks maps a
+#   block number to the line's new text after the number
+def verifyEdited(name, dxf, blocks):
+    with open(os.path.join(GCODE_DIR, name + '.cnc')) as f:
+        lines = f.read().splitlines(keepends=True)
+    for i, line in enumerate(lines):
+        head = line[:6]
+        if head.strip().isdigit() and int(head) in blocks:
+            lines[i] = head + blocks.pop(int(head)) + '\n'
+    assert not blocks
+    return verifyProgram(''.join(lines), parse_dxf_file(os.path.join(DXF_DIR, dxf)), 50)
+
+def test_finish_pass_too_deep_gouges():
+    # Finish pass moved in 0.5mm, and its retract out by the same
+    report = verifyEdited('testg02hemisphere', 'testg02hemishpere.dxf',
+                          {22: ' 01 -4450  00000 010', 29: ' 00  4450  00000'})
+    assert not report.ok()
+    assert report.gouges and all(22 <= block <= 28 for _, block, _, _, _ in report.gouges)
+    assert abs(report.max_gouge - 0.5) < 0.01
+    assert 'gouging moves' in report.summary()
+
+def test_rapid_through_the_part():
+    # Retracting Z before X drags the tool back through the bump at Z-2.87
+    report = verifyEdited('testLinear', 'testLinear.dxf', {18: ' 00  0000  04574', 19: ' 00  3000  00000'})
+    assert not report.ok()
+    assert [rapid[:2] for rapid in report.rapids] == [(0, 18)]
+    assert not report.gouges and not report.arcs and not report.leftover
+
+def test_bad_arc_center():
+    # M99 I off by 3mm, the G02 before it can't go around any center
+    report = verifyEdited('testg02hemisphere', 'testg02hemishpere.dxf', {25: 'M99 I0300 K00500'})
+    assert not report.ok()
+    assert report.arcs == [(0, 24)]
+    assert 'bad M99 center' in report.summary()
+
+def test_finish_pass_too_shallow_leaves_stock():
+    report = verifyEdited('testLinear', 'testLinear.dxf', {14: ' 01 -2950  00000 010', 18: ' 00  2950  00000'})
+    assert not report.ok()
+    assert report.leftover and abs(report.max_leftover - 0.5) < 0.01
+    assert not report.gouges and not report.rapids and not report.arcs
+
+def test_finish_move_as_rapid_leaves_stock():
+    # A G00 doesn't cut, so the part of the profile it runs along is left
+    report = verifyEdited('testLinear', 'testLinear.dxf', {15: ' 00  0410 -00287'})
+    assert not report.ok()
+    assert report.leftover and report.max_leftover > 1
+    assert not report.gouges and not report.rapids
@@ -0,0 +1,117 @@
+# Checks emco.core.splitProgram: long jobs become chained programs that each
+#   fit max_blocks, hand over at the start point and together move the tool
+#   exactly like the unsplit program
+import os
+import numpy as np
+import pytest
+from emco.blocks import CALL, MCODE, MOTION
+from emco.core import parse_dxf_file, generate_programs_from_dxf
+from emco.fixedpoint import programClosure
+from emco.simulate import runProgram, runPrograms, verifyToolpath
+from emco.synthetic import writeProfileDxf
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+DXF_DIR = os.path.join(TESTS, 'Test DXF files')
+
+def generate(name, max_blocks, retract=0, roughStep=10, roughing='subroutine'):
+    entities = parse_dxf_file(os.path.join(DXF_DIR, name))
+    return generate_programs_from_dxf(entities, retract, retract, 0, 0, 50, 100, roughStep, 10, 2,
+                                      roughing=roughing, max_blocks=max_blocks)
+
+# M codes of the main program, up to M30
+def mainMcodes(program):
+    mcodes = []
+    for block in program.blocks:
+        if block.kind == MCODE:
+            mcodes.append(block.opcode)
+            if block.opcode == 30:
+                break
+    return mcodes
+
+# File, roughing mode and max_blocks that split into 2 to 6 programs
+SPLITS = [('testLinear.dxf', 'subroutine', 15), ('testLinear.dxf', 'subroutine', 20),
+          ('testg02hemishpere.dxf', 'subroutine', 25), ('testg02hemishpere.dxf', 'subroutine', 30),
+          ('testg02hemishpere.dxf', 'clipped', 15), ('testg02hemishpere.dxf', 'clipped', 25),
+          ('testNegDXF.dxf', 'clipped', 20)]
+
+@pytest.mark.parametrize('name, roughing, max_blocks', SPLITS)
+def test_split_matches_the_whole_program(name, roughing, max_blocks):
+    whole = generate(name, 1000, roughing=roughing)
+    assert len(whole) == 1
+    programs = generate(name, max_blocks, roughing=roughing)
+    assert len(programs) > 1
+
+    for program in programs:
+        assert program.blockNum - program.start <= max_blocks
+        # Each program is complete and hands over with the tool back at the
+        #   start point, where the next one begins
+        assert mainMcodes(program)[-1] == 30
+        assert programClosure(program) == (0, 0)
+    # The finish pass at finishFeed is only in the last program
+    finish_feeds = [sum(1 for block in program.blocks if block.kind == MOTION and block.feed == 10)
+                    for program in programs]
+    assert all(count == 0 for count in finish_feeds[:-1]) and finish_feeds[-1] > 0
+
+    # Run one after the other they make the same moves as the whole program
+    expected = runProgram(whole[0].render())
+    split = runPrograms([program.render() for program in programs])
+    assert len(split) == len(expected)
+    for column in ('opcode', 'start', 'end', 'feed', 'pass_index'):
+        assert np.array_equal(getattr(split, column), getattr(expected, column)), column
+    assert np.allclose(split.center, expected.center, equal_nan=True)
+    assert split.program.max() == len(programs) - 1
+
+def test_split_with_retract_repeats_only_the_start_blocks():
+    whole = runProgram(generate('testNegDXF.dxf', 1000, retract=1)[0].render())
+    programs = generate('testNegDXF.dxf', 30, retract=1)
+    assert len(programs) > 1
+    split = runPrograms([program.render() for program in programs])
+    # Every program starts with its own M03 and retract, the passes are the same
+    assert all(mainMcodes(program)[0] == 3 for program in programs)
+    cutting = split.pass_index >= 0
+    assert np.array_equal(split.end[cutting], whole.end[whole.pass_index >= 0])
+    assert np.array_equal(split.pass_index[cutting], whole.pass_index[whole.pass_index >= 0])
+
+def test_small_job_is_not_split():
+    programs = generate('testLinear.dxf', 1000)
+    assert len(programs) == 1
+
+def test_max_blocks_too_small_for_the_profile():
+    # Start blocks and finish pass alone need 9 blocks
+    with pytest.raises(ValueError, match='without any roughing passes'):
+        generate('testLinear.dxf', 8)
+
+def test_finish_pass_gets_its_own_program():
+    # Start blocks, subroutine and finish pass need 15 blocks together
+    programs = generate('testLinear.dxf', 14)
+    last = programs[-1]
+    assert not any(block.kind == CALL for block in last.blocks)
+    assert 17 not in [block.opcode for block in last.blocks if block.kind == MCODE]
+    assert any(block.kind == MOTION and block.feed == 10 for block in last.blocks)
+
+def test_long_profile_splits_with_subroutine_roughing(tmp_path):
+    # The subroutine and the finish pass are about 550 blocks each, so they
+    #   can't share a program of 1000
+    file_path = writeProfileDxf(str(tmp_path / 'long.dxf'), 500)
+    entities = parse_dxf_file(file_path)
+    programs = generate_programs_from_dxf(entities, 0, 0, 0, 0, 25, 100, 1, 50, 0.5,
+                                          roughing='subroutine', max_blocks=1000)
+    assert len(programs) > 1
+    for program in programs:
+        assert program.blockNum - program.start <= 1000
+        assert programClosure(program) == (0, 0)
+        # Only programs that call the subroutine carry a copy of it
+        calls = any(block.kind == CALL for block in program.blocks)
+        returns = 17 in [block.opcode for block in program.blocks if block.kind == MCODE]
+        assert calls == returns
+    assert not any(block.kind == CALL for block in programs[-1].blocks)
+
+    toolpath = runPrograms([program.render() for program in programs])
+    report = verifyToolpath(toolpath, entities, 25)
+    assert report.ok(), report.summary()
+
+def test_max_blocks_too_small_for_one_pass():
+    # Cutting in one pass has no finish pass, the single pass doesn't fit
+    with pytest.raises(ValueError, match='Roughing pass 1 needs'):
+        generate('testLinear.dxf', 12, roughStep=0)
+    assert len(generate('testLinear.dxf', 13, roughStep=0)) == 1
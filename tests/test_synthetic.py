@@ -0,0 +1,35 @@
+# Checks emco.synthetic: a generated file with every kind of CAD noise turned
+#   on still parses and chains back into exactly the segments it was made with
+import pytest
+from emco.chain import chainSegments
+from emco.core import parse_dxf_file
+from emco.synthetic import PROFILE_LAYER, buildProfile, writeProfileDxf
+
+SEGMENTS = 400
+
+@pytest.mark.parametrize('quadrant', (2, 3))
+def test_noisy_profile_chains_back(tmp_path, quadrant):
+    file_path = writeProfileDxf(str(tmp_path / 'noisy.dxf'), SEGMENTS, noise=0.004, reversed_ratio=0.5,
+                                quadrant=quadrant, clutter=200)
+    entities = parse_dxf_file(file_path, layers=[PROFILE_LAYER])
+    assert len(entities) == SEGMENTS
+    chained = chainSegments(entities)
+    assert len(chained.segments) == SEGMENTS
+    assert not chained.gaps and not chained.branches and not chained.unused
+    assert chained.reversed_count > 0
+    # The chain starts at X0 and stays on the quadrant's side of the axis
+    assert chained.segments[0]['start_point'][0] == 0
+    sign = 1 if quadrant == 2 else -1
+    assert all(sign * segment['end_point'][1] > 0 for segment in chained.segments)
+
+def test_clutter_is_not_profile(tmp_path):
+    file_path = writeProfileDxf(str(tmp_path / 'clutter.dxf'), 50, clutter=300)
+    # Text, circles and points are never read as profile, whatever the layer
+    assert len(parse_dxf_file(file_path)) == 50
+
+def test_build_profile_is_repeatable():
+    first = buildProfile(100, noise=0.004, reversed_ratio=0.5, quadrant=3, seed=7)
+    assert first == buildProfile(100, noise=0.004, reversed_ratio=0.5, quadrant=3, seed=7)
+    assert first != buildProfile(100, noise=0.004, reversed_ratio=0.5, quadrant=3, seed=8)
+    assert len(first) == 100
+    assert any(entity[0] == 'ARC' for entity in first)
@@ -0,0 +1,88 @@
+# Checks emco.worker runs jobs one at a time, collapses queued jobs of a kind
+#   into the latest and cancels through the Pipeline's stage listener
+import os
+import threading
+from emco.pipeline import Pipeline
+from emco.worker import JobRunner, DONE, CANCELLED, FAILED
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+DXF_PATH = os.path.join(TESTS, 'Test DXF files', 'testLinear.dxf')
+
+class Recorder:
+
+    def __init__(self):
+        self.finished = []
+        self.progress = []
+        self.done = threading.Event()
+
+    def onProgress(self, job, stage, done, total):
+        self.progress.append((job.number, stage, done, total))
+
+    def onFinished(self, job, status, value):
+        self.finished.append((job.number, status, value))
+
+def test_queued_jobs_collapse_to_the_latest():
+    recorder = Recorder()
+    runner = JobRunner(recorder.onProgress, recorder.onFinished)
+    release = threading.Event()
+    try:
+        blocker = runner.submit('open', lambda job: release.wait(5))
+        first = runner.submit('generate', lambda job, value: value, 1)
+        second = runner.submit('generate', lambda job, value: value, 2)
+        third = runner.submit('generate', lambda job, value: value, 3)
+        release.set()
+        third.future.result()
+    finally:
+        runner.shutdown()
+    statuses = {number: (status, value) for number, status, value in recorder.finished}
+    assert statuses[blocker.number] == (DONE, True)
+    assert statuses[first.number][0] == CANCELLED and statuses[second.number][0] == CANCELLED
+    assert statuses[third.number] == (DONE, 3)
+    assert not runner.busy()
+
+def test_pipeline_progress_and_cancel():
+    recorder = Recorder()
+    runner = JobRunner(recorder.onProgress, recorder.onFinished)
+    pipeline = Pipeline(file_path=DXF_PATH, stock_radius=50, rough_feed=100, rough_step=10, finish_feed=10, finish_step=2)
+
+    def generate(job, cancel_at=None):
+        stages = pipeline.staleStages('programs')
+        def listener(stage):
+            if stage == cancel_at:
+                job.cancel()
+            job.progress(stage, stages.index(stage), len(stages))
+        pipeline.listener = listener
+        try:
+            return pipeline.get('programs')
+        finally:
+            pipeline.listener = None
+
+    try:
+        runner.submit('generate', generate, 'plan').future.result()
+        runner.submit('generate', generate).future.result()
+        runner.submit('generate', lambda job: 1 / 0).future.result()
+    finally:
+        runner.shutdown()
+    (_, cancelled, _), (_, done, programs), (_, failed, message) = recorder.finished
+    assert cancelled == CANCELLED and done == DONE and failed == FAILED
+    assert message.startswith('ZeroDivisionError')
+    with open(os.path.join(TESTS, 'Test Output Gcode', 'testLinear.cnc')) as f:
+        assert ''.join(programs) == f.read()
+    # The cancelled run stopped before plan, the next one picked up from there
+    first_run = [stage for number, stage, _, _ in recorder.progress if number == 1]
+    second_run = [stage for number, stage, _, _ in recorder.progress if number == 2]
+    assert first_run[-1] == 'flipped'
+    assert second_run[0] == 'plan' and second_run[-1] == 'programs'
+
+def test_quiet_jobs_keep_their_flag():
+    recorder = Recorder()
+    runner = JobRunner(recorder.onProgress, recorder.onFinished)
+    try:
+        loud = runner.submit('generate', lambda job: 1 / 0)
+        loud.future.result()
+        quiet = runner.submit('generate', lambda job: 1 / 0, quiet=True)
+        quiet.future.result()
+    finally:
+        runner.shutdown()
+    assert [status for _, status, _ in recorder.finished] == [FAILED, FAILED]
+    assert not loud.quiet and quiet.quiet